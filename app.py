@@ -1,10 +1,26 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import joblib
+import os
+import tempfile
 import time
-import plotly.graph_objects as go
-import plotly.express as px
+
+from dysphagia import figures
+from dysphagia.assets import MAX_IMAGE_WIDTH, image_bytes
+from dysphagia.audit import AUDIT_DIR, AUDIT_ENV, AuditLog, summarize as summarize_audit
+from dysphagia.batch import OUTPUT_COLUMNS, detect_format, run_batch
+from dysphagia.artifact import read_meta
+from dysphagia.features import (
+    FEATURE_BOUNDS, FEATURE_CODES, FEATURE_DEFAULTS, FEATURES_LR, FEATURES_RF, MODEL_FEATURES, compute_bmi,
+)
+from dysphagia.lookup import load_tables
+from dysphagia.cache import PredictionCache
+from dysphagia.drift import REFERENCE_ENV, DriftMonitor, load_reference
+from dysphagia.evaluate import EVALUATION_DIR, REPORT_FILE, load_report
+from dysphagia.neighbors import META_FILE as NEIGHBORS_META, NEIGHBORS_DIR, NeighborIndex
+from dysphagia.registry import REGISTRY_DIR, ModelWatcher
+from dysphagia.scoring import DEFAULT_INTERVAL, Scorer, records_to_columns
+from dysphagia.telemetry import PROFILE_ENV, TELEMETRY, span, trace
 
 # ================= 1. 页面配置 =================
 st.set_page_config(
@@ -137,85 +153,138 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ================= 4. 特征定义 (严格按照提供的顺序) =================
-
-# 逻辑回归 (10个特征)
-FEATURES_LR = [
-    'chewing',               # 1. 咀嚼障碍
-    'choking',               # 2. 呛咳史
-    'number_of_teeth',       # 3. 牙齿数量
-    'eating',                # 4. 进食情况
-    'age',                   # 5. 年龄
-    'weight',                # 6. 体重
-    'number_of_drug_types',  # 7. 药物种类数
-    'MMSE',                  # 8. 认知功能
-    'BMI',                   # 9. BMI
-    'frail'                  # 10. 衰弱状态
-]
-
-# 随机森林 (14个特征)
-FEATURES_RF = [
-    'chewing',               # 1
-    'choking',               # 2
-    'number_of_teeth',       # 3
-    'eating',                # 4
-    'age',                   # 5
-    'weight',                # 6
-    'number_of_drug_types',  # 7
-    'MMSE',                  # 8
-    'BMI',                   # 9
-    'frail',                 # 10
-    'kangningyao',           # 11. 抗凝药
-    'hight',                 # 12. 身高 (注意变量名是 hight)
-    'CVD',                   # 13. 脑血管疾病
-    'number_of_diseases'     # 14. 疾病种类数
-]
-
-# ================= 5. 工具函数 =================
-
-def manual_standardization(df):
-    """仅对逻辑回归中已知的连续变量进行标准化"""
-    # 注意：如果 number_of_drug_types 等新变量需要标准化，请在此处添加对应的 mean/std
-    df_scaled = df.copy()
-    stats_config = {
-        'number_of_teeth': {'mean': 18.0,  'std': 9.299115},
-        'weight':          {'mean': 60.0,  'std': 9.572267},
-        'BMI':             {'mean': 23.0,  'std': 3.310996},
-        'age':             {'mean': 75.0,  'std': 7.154127}
-        # 如果需要对 number_of_drug_types 进行标准化，请取消注释并填入数值
-        # 'number_of_drug_types': {'mean': X.X, 'std': Y.Y},
-    }
-    for col, stats in stats_config.items():
-        if col in df_scaled.columns:
-            df_scaled[col] = (df_scaled[col] - stats['mean']) / stats['std']
-    return df_scaled
+# ================= 4. 模型加载 (特征定义与工具函数见 dysphagia/) =================
+
+@st.cache_resource
+def load_scorer():
+    # 无界面评分核心 (dysphagia/scoring.py)，与批量/命令行共用同一套预测逻辑
+    # risk_table/ 存在时随机森林直接查表 (python -m dysphagia build-table 生成)
+    # registry/ 存在时 (python -m dysphagia registry publish 发布) 以仓库中的当前版本为准，
+    # 并由 get_model_watcher() 在后台热更新；其次是 artifacts/ 中的导出文件 (python -m dysphagia export)，
+    # 两者都没有 (或已过期) 的模型才反序列化 pickle
+    registry = REGISTRY_DIR if os.path.isdir(REGISTRY_DIR) else None
+    return Scorer.load(tables=load_tables(), registry=registry)
+
+@st.cache_resource
+def get_model_watcher():
+    # 每个进程一个轮询线程；新版本校验通过后原子地换入 load_scorer() 返回的同一个 Scorer
+    return ModelWatcher(load_scorer(), REGISTRY_DIR).start()
+
+@st.cache_resource
+def load_importances(model_name, source, version):
+    # 全局重要性 (逻辑回归 coef_ / 随机森林 feature_importances_)，每个模型版本只提取一次：
+    # 模型目录 (artifacts/ 或 registry/) 读 meta.json，从 pickle 加载的模型由 Scorer 在编译前提取
+    if source and os.path.isdir(source):
+        importances = read_meta(source).get('feature_importances')
+        if importances is not None:
+            return np.asarray(importances, dtype=np.float64)
+    return load_scorer().importances.get(model_name)
 
 @st.cache_resource
-def load_models():
-    models = {}
+def importance_figure(model_name, source, version):
+    return figures.importance_figure(load_importances(model_name, source, version), model_name)
+
+@st.cache_resource
+def load_image(name, width=MAX_IMAGE_WIDTH):
+    # assets/ 图片只读取、缩放、编码一次 (传路径给 st.image 时每次重跑都要重新处理整张原图)
+    return image_bytes(name, width)
+
+@st.cache_resource(max_entries=1024)
+def gauge_figure(prob_bucket, threshold):
+    # 按 0.1% 分桶缓存 (仪表盘与风险卡片都只显示一位小数)
+    return figures.gauge_figure(prob_bucket / 1000, threshold)
+
+@st.cache_resource(max_entries=256)
+def explanation_figure(model_name, version, patient):
+    # patient 为 (特征, 取值) 元组；解释计算与图表一起缓存，切换页签重跑时不再重建
+    # version 为模型版本，热更新后不会命中旧模型的解释
+    explanation = load_scorer().explain_records([dict(patient)], model_name)[0]
+    return figures.explanation_figure(explanation, model_name)
+
+def evaluation_mtime():
     try:
-        models['Logistic Regression'] = joblib.load("logistic_model.pkl")
-    except:
-        models['Logistic Regression'] = None
+        return os.path.getmtime(os.path.join(EVALUATION_DIR, REPORT_FILE))
+    except OSError:
+        return None
+
+@st.cache_resource
+def load_evaluation(mtime):
+    # evaluation/ 由 python -m dysphagia evaluate 生成；mtime 变化 (重新评估) 时重新读取
+    return None if mtime is None else load_report(EVALUATION_DIR)
+
+@st.cache_resource(max_entries=256)
+def evaluation_figure(kind, mtime, model_name=None, threshold=None):
+    curves, report = load_evaluation(mtime)
+    if kind == 'confusion':
+        return figures.confusion_figure(curves[model_name].confusion(threshold), model_name)
+    if kind == 'roc':
+        return figures.roc_figure(curves, {name: threshold if name == model_name else
+                                           report['models'][name]['metrics']['Threshold'] for name in curves})
+    if kind == 'calibration':
+        return figures.calibration_figure(curves)
+    return figures.metrics_figure(report)
+
+def neighbors_mtime():
     try:
-        models['Random Forest'] = joblib.load("random_forest_model.pkl")
-    except:
-        models['Random Forest'] = None
-    return models
+        return os.path.getmtime(os.path.join(NEIGHBORS_DIR, NEIGHBORS_META))
+    except OSError:
+        return None
+
+@st.cache_resource
+def load_neighbor_index(mtime):
+    # neighbors/ 由 python -m dysphagia build-neighbors 生成 (内存映射，所有会话共享)；重建后重新加载
+    return None if mtime is None else NeighborIndex.load(NEIGHBORS_DIR)
 
-models = load_models()
+@st.cache_resource
+def get_audit_log():
+    # 每次诊断的特征、模型版本、概率与耗时记入审计日志 (DYSPHAGIA_AUDIT=<目录>，默认 audit/，
+    # 设为空字符串关闭)；请求路径只入队，后台线程批量写入
+    directory = os.environ.get(AUDIT_ENV, AUDIT_DIR)
+    return AuditLog(directory, 'app').start() if directory else None
+
+@st.cache_resource
+def get_drift_monitor():
+    # 所有会话共享的人群漂移统计 (诊断与批量筛查的每个患者)；参考分布默认取自 STATS_CONFIG，
+    # DYSPHAGIA_DRIFT_REFERENCE=<文件> 时使用 python -m dysphagia drift 保存的参考队列统计
+    path = os.environ.get(REFERENCE_ENV)
+    return DriftMonitor(load_reference(path) if path else None)
+
+@st.cache_resource
+def get_prediction_cache():
+    # 所有会话共享；键包含模型文件哈希，重复筛查和页面重跑直接命中
+    return PredictionCache()
+
+scorer = load_scorer()
+if os.path.isdir(REGISTRY_DIR):
+    get_model_watcher()
+if scorer.stale_tables:
+    st.warning(f"⚠️ Lookup table for {scorer.stale_tables} does not match the model file and is ignored. Please rebuild it.")
 
 # ================= 6. 主界面 =================
 
 try:
-    st.image("assets/banner.png", use_container_width=True)
+    st.image(load_image("banner.png"), use_container_width=True)
 except:
     st.markdown("""<div style="background: linear-gradient(90deg, #1e3a8a 0%, #4361ee 100%); padding: 30px; border-radius: 12px; color: white; text-align: center; margin-bottom: 25px;"><h1>Dysphagia Prediction System</h1></div>""", unsafe_allow_html=True)
 
 # ================= 7. 侧边栏输入 (更新控件) =================
+# 取值范围、默认值与分类编码来自 dysphagia/features.py，与批量/服务的 schema 校验一致
+
+def number_field(container, label, name):
+    min_value, max_value, step = FEATURE_BOUNDS[name]
+    return container.number_input(label, min_value=min_value, max_value=max_value,
+                                  value=FEATURE_DEFAULTS[name], step=step)
+
+def code_field(container, label, name, horizontal=False):
+    codes = FEATURE_CODES[name]
+    options = list(codes)
+    if horizontal:
+        return container.radio(label, options, index=options.index(FEATURE_DEFAULTS[name]),
+                               format_func=codes.get, horizontal=True)
+    return container.selectbox(label, options, index=options.index(FEATURE_DEFAULTS[name]), format_func=codes.get)
 with st.sidebar:
     try:
-        st.image("assets/logo.png", width=180)
+        st.image(load_image("logo.png", 180), width=180)
     except:
         st.markdown("## 🏥 AI Med Assist")
     
@@ -227,20 +296,22 @@ with st.sidebar:
         index=1
     )
     is_rf = selected_model_name == "Random Forest"
+    # 对比模式：两个模型在同一个特征矩阵上同时评分，结果并排显示
+    compare_models = st.checkbox("⚖️ Compare both models (双模型对比)")
     
     with st.form("main_form"):
         # --- 1. 身体测量与基本信息 ---
         st.markdown("### 1. Basic Info (基本信息)")
         col1, col2 = st.columns(2)
-        age = col1.number_input("Age (年龄)", min_value=20, max_value=120, value=75, step=1)
+        age = number_field(col1, "Age (年龄)", 'age')
         # Height 即使LR不用，也需要用来计算BMI
-        hight = col2.number_input("Height (cm)", min_value=100, max_value=220, value=160, step=1)
+        hight = number_field(col2, "Height (cm)", 'hight')
         
         col3, col4 = st.columns(2)
-        weight = col3.number_input("Weight (kg)", min_value=30.0, max_value=150.0, value=60.0, step=0.5)
+        weight = number_field(col3, "Weight (kg)", 'weight')
         
         # 自动计算 BMI
-        bmi_val = weight / ((hight / 100) ** 2)
+        bmi_val = compute_bmi(weight, hight)
         BMI = bmi_val
         col4.markdown(f"<div style='padding-top:35px; color:#4361ee; font-weight:bold;'>BMI: {bmi_val:.1f}</div>", unsafe_allow_html=True)
 
@@ -249,41 +320,28 @@ with st.sidebar:
         st.markdown("### 2. Oral & Feeding (口腔与进食)")
         
         # 咀嚼 (Chewing)
-        chewing = st.radio(
-            "1. Chewing Difficulty (咀嚼障碍)", 
-            [0, 1], 
-            format_func=lambda x: "0: 无 (No)" if x==0 else "1: 有 (Yes)",
-            horizontal=True
-        )
+        chewing = code_field(st, "1. Chewing Difficulty (咀嚼障碍)", 'chewing', horizontal=True)
 
         # 呛咳 (Choking)
-        choking = st.radio(
-            "2. Choking History (呛咳史)", 
-            [0, 1], 
-            format_func=lambda x: "0: 无 (No)" if x==0 else "1: 有 (Yes)",
-            horizontal=True
-        )
+        choking = code_field(st, "2. Choking History (呛咳史)", 'choking', horizontal=True)
 
         c_oral1, c_oral2 = st.columns(2)
         # 牙齿数量
-        number_of_teeth = c_oral1.number_input("3. Teeth Count (牙齿数量)", min_value=0, max_value=32, value=20, step=1)
+        number_of_teeth = number_field(c_oral1, "3. Teeth Count (牙齿数量)", 'number_of_teeth')
         
         # 进食情况
-        eat_map = {0: "0: 良好", 1: "1: 一般", 2: "2: 差"}
-        eating = c_oral2.selectbox("4. Eating Status (进食情况)", [0, 1, 2], format_func=lambda x: eat_map[x])
+        eating = code_field(c_oral2, "4. Eating Status (进食情况)", 'eating')
 
         # --- 3. 临床状态 (MMSE/衰弱/药物) ---
         st.markdown("---")
         st.markdown("### 3. Clinical Status (临床状态)")
         
-        mmse_map = {0:"0: 正常", 1:"1: 轻度障碍", 2:"2: 中度障碍"} # 无重度(3)
-        MMSE = st.selectbox("MMSE (认知功能)", [0, 1, 2], format_func=lambda x: mmse_map[x])
+        MMSE = code_field(st, "MMSE (认知功能)", 'MMSE')
 
-        frail_map = {0: "0: 无衰弱", 1: "1: 衰弱前期", 2: "2: 衰弱"}
-        frail = st.selectbox("Frailty (衰弱状态)", [0, 1, 2], format_func=lambda x: frail_map[x])
+        frail = code_field(st, "Frailty (衰弱状态)", 'frail')
         
         # 药物种类数 (LR 和 RF 都用)
-        number_of_drug_types = st.number_input("Drugs Count (长期服用药物种类数)", min_value=0, max_value=20, value=3, step=1)
+        number_of_drug_types = number_field(st, "Drugs Count (长期服用药物种类数)", 'number_of_drug_types')
 
         # --- 4. 随机森林专属特征 (11-14) ---
         kangningyao = 0
@@ -295,126 +353,139 @@ with st.sidebar:
             st.markdown("### 4. History (病史 - RF模型专用)")
             
             # 11. 抗凝药
-            kangningyao = st.radio(
-                "Anticoagulant Use (抗凝药)", 
-                [0, 1], 
-                format_func=lambda x: "0: 无 (No)" if x==0 else "1: 有 (Yes)",
-                horizontal=True
-            )
+            kangningyao = code_field(st, "Anticoagulant Use (抗凝药)", 'kangningyao', horizontal=True)
             
             # 13. 脑血管疾病
-            CVD = st.radio(
-                "CVD (脑血管疾病)", 
-                [0, 1], 
-                format_func=lambda x: "0: 无 (No)" if x==0 else "1: 有 (Yes)",
-                horizontal=True
-            )
+            CVD = code_field(st, "CVD (脑血管疾病)", 'CVD', horizontal=True)
             
             # 14. 疾病种类数
-            number_of_diseases = st.number_input("Diseases Count (疾病种类数)", min_value=0, max_value=20, value=2, step=1)
+            number_of_diseases = number_field(st, "Diseases Count (疾病种类数)", 'number_of_diseases')
             
             # 12. hight 已在上方输入
 
+        # --- 判定阈值 (筛查时可按 ROC 曲线选择更高灵敏度的阈值) ---
+        st.markdown("---")
+        threshold = st.slider("⚖️ Decision Threshold (判定阈值)", min_value=0.05, max_value=0.95,
+                              value=float(scorer.thresholds[selected_model_name]), step=0.01)
+
         st.markdown("---")
         submit_btn = st.form_submit_button("🚀 Run Prediction")
 
 # ================= 8. 主内容区 (Tabs) =================
 
-tab_diagnosis, tab_explain, tab_about = st.tabs(["🩺 AI Diagnosis", "📊 Analysis", "ℹ️ About"])
+# 诊断页默认隐藏，URL 加 ?diagnostics=1 才显示
+show_diagnostics = st.query_params.get("diagnostics") == "1"
+tab_names = ["🩺 AI Diagnosis", "📊 Analysis", "📁 Batch Screening", "ℹ️ About"]
+if show_diagnostics:
+    tab_names.append("🛠️ Diagnostics")
+tab_diagnosis, tab_explain, tab_batch, tab_about, *tab_extra = st.tabs(tab_names)
+def compare_panel(results, threshold):
+    # results 为 Scorer.predict_models 对单个患者的结果 {模型名称: {'probability': [p], ...}}
+    st.markdown("### ⚖️ Model Comparison (双模型对比)")
+    columns = st.columns(len(results))
+    for col, (name, result) in zip(columns, results.items()):
+        p = float(result['probability'][0])
+        with col:
+            st.markdown(f"**{name}**")
+            st.plotly_chart(gauge_figure(round(p * 1000), threshold), use_container_width=True, key=f"compare_{name}")
+            ci_text = (f" · tree vote interval {result['ci_low'][0]*100:.1f}% – {result['ci_high'][0]*100:.1f}%"
+                       if 'ci_low' in result else "")
+            risk = "⚠️ High Risk (高风险)" if result['label'][0] else "✅ Low Risk (低风险)"
+            st.markdown(f"{risk} · {p*100:.1f}%{ci_text}")
+    if len(results) == 2:
+        (a, ra), (b, rb) = results.items()
+        diff = abs(float(ra['probability'][0]) - float(rb['probability'][0]))
+        if ra['label'][0] == rb['label'][0]:
+            st.success(f"✅ Both models agree (两个模型判定一致) · |Δp| = {diff*100:.1f} pts")
+        else:
+            st.warning(f"⚠️ Models disagree at threshold {threshold:.2f} (两个模型判定不一致) · "
+                       f"|Δp| = {diff*100:.1f} pts — consider clinical assessment (建议临床评估)")
+
+def similar_patients_panel(index, patient, k=5):
+    # 参考队列中特征最接近的 k 个患者及其结局 (KD 树精确检索，见 dysphagia/neighbors.py)
+    st.markdown("### 👥 Similar Patients (相似患者)")
+    neighbors = index.neighbor_records(records_to_columns([patient]), k)[0]
+    table = pd.DataFrame([{'Row (行号)': n['row'], 'Distance (距离)': round(n['distance'], 3),
+                           'Outcome (结局)': {None: "—", 1: "Dysphagia (吞咽障碍)", 0: "No (无)"}[n['outcome']],
+                           **n['features']} for n in neighbors])
+    st.dataframe(table, hide_index=True, use_container_width=True)
+    known = [n['outcome'] for n in neighbors if n['outcome'] is not None]
+    if known:
+        st.caption(f"{sum(known)} of {len(known)} similar patients had dysphagia "
+                   f"({len(known)} 个相似患者中 {sum(known)} 个有吞咽障碍) · reference cohort of {len(index)} patients")
+
 # ------ 1. 诊断 (修复版：自动识别 pipeline 键) ------
 with tab_diagnosis:
     if submit_btn:
-        # 1. 获取加载的对象
-        loaded_object = models[selected_model_name]
-        
-        if loaded_object is None:
-            st.error(f"❌ Error: Model file for {selected_model_name} not found.")
-        else:
-            # ================== 核心修复开始 ==================
-            model = None
-            # 检查加载的是不是字典
-            if isinstance(loaded_object, dict):
-                # 你的报错显示键名是 'pipeline'，所以把它放在第一个
-                possible_keys = ['pipeline', 'model', 'classifier', 'clf', 'estimator']
-                for key in possible_keys:
-                    if key in loaded_object:
-                        model = loaded_object[key]
-                        st.success(f"✅ Successfully loaded model from key: '{key}'") # 提示用户加载成功
-                        break
-                
-                # 如果还是找不到
-                if model is None:
-                    st.error(f"❌ Error: Could not find model in dictionary. Keys found: {list(loaded_object.keys())}")
-                    st.stop()
+        # 每次预测记为一个 trace，各阶段耗时见诊断页 (?diagnostics=1)
+        profile_dir = (os.environ.get(PROFILE_ENV) or "profiles") if st.session_state.get("profile_enabled") else None
+        with trace('diagnosis', profile_dir=profile_dir, model=selected_model_name):
+            # 1. 模型已由 load_scorer() 加载并解包 (字典中按 'pipeline' 等常见键名取出)
+            if selected_model_name in scorer.errors:
+                # 如 pipeline 里已包含 StandardScaler，再做 manual_standardization 会二次标准化；只停用该模型
+                st.error(f"❌ Model Error ({selected_model_name}): {scorer.errors[selected_model_name]}")
+            elif not scorer.available(selected_model_name):
+                st.error(f"❌ Error: Model file for {selected_model_name} not found.")
             else:
-                # 如果不是字典，直接使用
-                model = loaded_object
-            # ================== 核心修复结束 ==================
-
-            # 2. 准备数据
-            full_data = {
-                'chewing': chewing, 
-                'choking': choking,
-                'number_of_teeth': number_of_teeth, 
-                'eating': eating, 
-                'age': age, 
-                'weight': weight,
-                'number_of_drug_types': number_of_drug_types,
-                'MMSE': MMSE,
-                'BMI': BMI, 
-                'frail': frail, 
-                'kangningyao': kangningyao,
-                'hight': hight,
-                'CVD': CVD,
-                'number_of_diseases': number_of_diseases
-            }
-            raw_df = pd.DataFrame([full_data])
+                model_key = scorer.keys.get(selected_model_name)
+                if model_key is not None:
+                    st.success(f"✅ Successfully loaded model from key: '{model_key}'") # 提示用户加载成功
+
+                # 2. 准备数据
+                with span('features'):
+                    full_data = {
+                        'chewing': chewing, 
+                        'choking': choking,
+                        'number_of_teeth': number_of_teeth, 
+                        'eating': eating, 
+                        'age': age, 
+                        'weight': weight,
+                        'number_of_drug_types': number_of_drug_types,
+                        'MMSE': MMSE,
+                        'BMI': BMI, 
+                        'frail': frail, 
+                        'kangningyao': kangningyao,
+                        'hight': hight,
+                        'CVD': CVD,
+                        'number_of_diseases': number_of_diseases
+                    }
             
-            try:
-                # 3. 数据预处理
-                if not is_rf:
-                    # 逻辑回归：取前10个特征
-                    input_df = raw_df.reindex(columns=FEATURES_LR)
-                    # 注意：如果你的 'pipeline' 里已经包含了 StandardScaler，
-                    # 这里的 manual_standardization 可能会导致二次标准化。
-                    # 如果预测结果非常奇怪（比如全是0或1），请尝试注释掉下面这一行：
-                    final_input = manual_standardization(input_df) 
-                else:
-                    # 随机森林：取14个特征
-                    input_df = raw_df.reindex(columns=FEATURES_RF)
-                    final_input = input_df
+                try:
+                    # 3. 数据预处理 + 4. 进行预测
+                    # 逻辑回归取前10个特征并做 manual_standardization，随机森林取14个特征
+                    # 一次遍历得到概率、标签 (按判定阈值) 与随机森林各树投票区间
+                    started = time.perf_counter()
+                    result = scorer.predict_records([full_data], selected_model_name, threshold=threshold,
+                                                    interval=DEFAULT_INTERVAL if is_rf else None,
+                                                    cache=get_prediction_cache())[0]
+                    prob_pos = result['probability']
+                    audit_log = get_audit_log()
+                    if audit_log is not None:
+                        audit_log.log(selected_model_name, scorer.versions.get(selected_model_name), full_data,
+                                      prob_pos, result['label'], threshold, time.perf_counter() - started)
+                    # 逻辑回归模式下随机森林专属特征是占位的 0，不计入漂移统计
+                    get_drift_monitor().observe({col: full_data[col] for col in MODEL_FEATURES[selected_model_name]},
+                                                {selected_model_name: prob_pos})
+                    st.session_state["last_patient"] = full_data
                 
-                # 4. 进行预测
-                prediction = model.predict(final_input)[0]
+                    # 5. 显示结果
+                    st.markdown(f"### Diagnosis Result: {selected_model_name}")
+                    col_res1, col_res2 = st.columns([1, 1.5])
+                    with col_res1:
+                        with span('gauge'):
+                            st.plotly_chart(gauge_figure(round(prob_pos * 1000), threshold), use_container_width=True)
                 
-                if hasattr(model, 'predict_proba'):
-                    prob_pos = model.predict_proba(final_input)[0][1]
-                else:
-                    prob_pos = float(prediction)
-                
-                # 5. 显示结果
-                st.markdown(f"### Diagnosis Result: {selected_model_name}")
-                col_res1, col_res2 = st.columns([1, 1.5])
-                with col_res1:
-                    fig = go.Figure(go.Indicator(
-                        mode = "gauge+number",
-                        value = prob_pos * 100,
-                        number = {'suffix': "%", 'font': {'color': "#000000"}},
-                        title = {'text': "Dysphagia Risk", 'font': {'color': "#000000"}},
-                        gauge = {
-                            'axis': {'range': [None, 100]},
-                            'bar': {'color': "#ef233c" if prob_pos > 0.5 else "#2a9d8f"}
-                        }
-                    ))
-                    fig.update_layout(height=280, margin=dict(t=30,b=10), paper_bgcolor="rgba(0,0,0,0)")
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                with col_res2:
-                    if prob_pos > 0.5:
-                        st.markdown(f"""
+                    with col_res2:
+                        # 区间行 (仅随机森林)
+                        ci_text = ""
+                        if result['ci'] is not None:
+                            ci_text = (f"<p>Tree vote {DEFAULT_INTERVAL:.0%} interval (各树投票区间): "
+                                       f"{result['ci'][0]*100:.1f}% – {result['ci'][1]*100:.1f}%</p>")
+                        if result['label'] == 1:
+                            st.markdown(f"""
 <div class="css-card" style="border-left: 6px solid #ef233c; background-color: #fff5f5;">
     <h2 style="color: #ef233c !important; margin-top:0;">⚠️ High Risk Detected (高风险)</h2>
-    <p style="font-size: 1.1em;">Probability: <strong>{prob_pos*100:.1f}%</strong></p>
+    <p style="font-size: 1.1em;">Probability: <strong>{prob_pos*100:.1f}%</strong> (threshold {threshold*100:.0f}%)</p>{ci_text}
     <hr>
     <p><strong>🚨 建议与干预：</strong></p>
     <ul style="line-height: 1.6;">
@@ -424,11 +495,11 @@ with tab_diagnosis:
     </ul>
 </div>
 """, unsafe_allow_html=True)
-                    else:
-                        st.markdown(f"""
+                        else:
+                            st.markdown(f"""
 <div class="css-card" style="border-left: 6px solid #2a9d8f; background-color: #f0fdf4;">
     <h2 style="color: #2a9d8f !important; margin-top:0;">✅ Low Risk (低风险)</h2>
-    <p style="font-size: 1.1em;">Probability: <strong>{prob_pos*100:.1f}%</strong></p>
+    <p style="font-size: 1.1em;">Probability: <strong>{prob_pos*100:.1f}%</strong> (threshold {threshold*100:.0f}%)</p>{ci_text}
     <hr>
     <p><strong>💡 维持建议：</strong></p>
     <ul style="line-height: 1.6;">
@@ -439,9 +510,22 @@ with tab_diagnosis:
 </div>
 """, unsafe_allow_html=True)
 
-            except Exception as e:
-                st.error(f"Analysis Error: {e}")
-                st.write("Input Data Columns:", final_input.columns.tolist())
+                    if compare_models:
+                        with span('compare'):
+                            both = scorer.predict_models(records_to_columns([full_data]),
+                                                         [name for name in MODEL_FEATURES if scorer.available(name)],
+                                                         {name: threshold for name in MODEL_FEATURES},
+                                                         interval=DEFAULT_INTERVAL)
+                        compare_panel(both, threshold)
+
+                    neighbor_index = load_neighbor_index(neighbors_mtime())
+                    if neighbor_index is not None:
+                        with span('neighbors'):
+                            similar_patients_panel(neighbor_index, full_data)
+
+                except Exception as e:
+                    st.error(f"Analysis Error: {e}")
+                    st.write("Input Data Columns:", FEATURES_RF if is_rf else FEATURES_LR)
     else:
         st.info("👈 请在左侧输入数据并点击 'Run Prediction'")
 # ------ 2. 分析 ------
@@ -449,79 +533,24 @@ with tab_diagnosis:
 with tab_explain:
     st.markdown("### 🔍 Feature Importance")
     
-    # 1. 获取加载的对象
-    loaded_object = models[selected_model_name]
-    
-    # 2. 提取真正的模型 (关键修复步骤)
-    model = None
-    if loaded_object is not None:
-        if isinstance(loaded_object, dict):
-            # 优先查找 'pipeline'，因为你的报错显示键名是这个
-            if 'pipeline' in loaded_object:
-                model = loaded_object['pipeline']
-            else:
-                # 如果不是 pipeline，尝试找其他常见的键
-                for key in ['model', 'clf', 'classifier', 'estimator']:
-                    if key in loaded_object:
-                        model = loaded_object[key]
-                        break
-        else:
-            # 如果不是字典，说明它本身就是模型
-            model = loaded_object
-
-    # 3. 开始绘图
-    if model:
+    # 重要性与图表按模型版本缓存，重跑时不再重新提取
+    importance_key = (selected_model_name, scorer.sources.get(selected_model_name),
+                      scorer.versions.get(selected_model_name))
+    if selected_model_name in scorer.models:
         try:
-            importances = None
-            
-            # --- A. 获取特征重要性数值 ---
-            # 尝试从 Pipeline 中获取最后一步的分类器
-            if hasattr(model, 'named_steps') and 'clf' in model.named_steps:
-                classifier = model.named_steps['clf']
-            elif hasattr(model, 'steps'):
-                # 如果没有名为 'clf' 的步骤，取最后一步
-                classifier = model.steps[-1][1]
-            else:
-                # 如果不是 Pipeline，直接就是分类器
-                classifier = model
-
-            # 根据模型类型提取系数
-            if not is_rf:
-                # === 逻辑回归 (Logistic Regression) ===
-                if hasattr(classifier, 'coef_'):
-                    importances = classifier.coef_[0]
-                else:
+            importances = load_importances(*importance_key)
+            feature_names = FEATURES_RF if is_rf else FEATURES_LR
+            if importances is None:
+                if not is_rf:
                     st.warning("⚠️ 无法从逻辑回归模型中提取系数 (coef_)")
-                
-                feature_names = FEATURES_LR # 10个特征
-                color_scale = 'RdBu_r'
-            else:
-                # === 随机森林 (Random Forest) ===
-                if hasattr(classifier, 'feature_importances_'):
-                    importances = classifier.feature_importances_
                 else:
                     st.warning("⚠️ 无法从随机森林模型中提取重要性 (feature_importances_)")
-                
-                feature_names = FEATURES_RF # 14个特征
-                color_scale = 'Viridis'
-
-            # --- B. 生成图表 ---
-            if importances is not None:
-                # 检查特征数量是否匹配
-                if len(importances) == len(feature_names):
-                    df_imp = pd.DataFrame({'Feature': feature_names, 'Value': importances})
-                    df_imp['AbsValue'] = df_imp['Value'].abs()
-                    df_imp = df_imp.sort_values(by='AbsValue', ascending=True)
-
-                    fig_bar = px.bar(df_imp, x='Value', y='Feature', orientation='h',
-                                     title=f"Feature Contribution ({selected_model_name})",
-                                     color='Value', color_continuous_scale=color_scale)
-                    fig_bar.update_layout(font=dict(color="black"), plot_bgcolor="rgba(0,0,0,0)")
-                    st.plotly_chart(fig_bar, use_container_width=True)
-                else:
-                    st.error(f"❌ 特征数量不匹配: 模型有 {len(importances)} 个系数，但定义的列表有 {len(feature_names)} 个。")
-                    st.write("模型期望的特征数:", len(importances))
-                    st.write("当前列表:", feature_names)
+            elif len(importances) == len(feature_names):
+                st.plotly_chart(importance_figure(*importance_key), use_container_width=True)
+            else:
+                st.error(f"❌ 特征数量不匹配: 模型有 {len(importances)} 个系数，但定义的列表有 {len(feature_names)} 个。")
+                st.write("模型期望的特征数:", len(importances))
+                st.write("当前列表:", feature_names)
 
         except Exception as e:
             st.error(f"❌ 绘图错误: {e}")
@@ -529,31 +558,181 @@ with tab_explain:
     else:
         st.warning("无法加载模型对象，请检查 .pkl 文件。")
 
-    st.divider()
-    
-    # --- 图片显示部分 (保持不变) ---
-    c1, c2 = st.columns(2)
-    with c1:
-        st.markdown("**Confusion Matrix**")
-        img_name = "Test_CM_Logistic.png" if not is_rf else "Test_CM_RandomForest.png"
+    # --- 个体解释：最近一次 Run Prediction 的患者 ---
+    st.markdown("### 🧑‍⚕️ Patient Explanation (个体解释)")
+    last_patient = st.session_state.get("last_patient")
+    if last_patient is None:
+        st.info("👈 点击 'Run Prediction' 后显示该患者每个特征对风险的贡献")
+    else:
         try:
-            st.image(f"assets/{img_name}", use_container_width=True)
-        except:
-            st.warning("Missing Image (assets folder)")
-    with c2:
-        st.markdown("**ROC Curve**")
+            st.plotly_chart(explanation_figure(selected_model_name, scorer.versions.get(selected_model_name),
+                                               tuple(sorted(last_patient.items()))),
+                            use_container_width=True)
+        except (ValueError, RuntimeError) as e:
+            st.info(f"Explanation unavailable (无法解释): {e}")
+
+    st.divider()
+
+    evaluation = load_evaluation(evaluation_mtime())
+    if evaluation is not None and selected_model_name in evaluation[0]:
+        # --- 在自己的标注数据上的评估 (python -m dysphagia evaluate 生成)，混淆矩阵随判定阈值重算 ---
+        curves, report = evaluation
+        entry = report['models'][selected_model_name]
+        st.caption(f"Evaluated on {report.get('rows', entry['n'])} labelled rows from "
+                   f"{os.path.basename(report.get('source', EVALUATION_DIR))} (标注数据评估)")
+        c1, c2 = st.columns(2)
+        with c1:
+            st.plotly_chart(evaluation_figure('confusion', evaluation_mtime(), selected_model_name, threshold),
+                            use_container_width=True)
+            (tn, fp), (fn, tp) = curves[selected_model_name].confusion(threshold)
+            st.markdown(f"Sensitivity (灵敏度) **{tp / max(tp + fn, 1):.3f}** · "
+                        f"Specificity (特异度) **{tn / max(tn + fp, 1):.3f}** at threshold {threshold:.2f}")
+            targets = {t: v for t, v in entry['thresholds_for_sensitivity'].items() if v is not None}
+            if targets:
+                st.caption("Thresholds for target sensitivity (目标灵敏度对应阈值): " +
+                           ", ".join(f"≥{float(t):.0%} → {v:.3f}" for t, v in targets.items()))
+        with c2:
+            st.plotly_chart(evaluation_figure('roc', evaluation_mtime(), selected_model_name, threshold),
+                            use_container_width=True)
+        c3, c4 = st.columns(2)
+        with c3:
+            st.plotly_chart(evaluation_figure('metrics', evaluation_mtime()), use_container_width=True)
+        with c4:
+            st.plotly_chart(evaluation_figure('calibration', evaluation_mtime()), use_container_width=True)
+    else:
+        # --- 训练时的测试集图片 (未运行 evaluate 时) ---
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown("**Confusion Matrix**")
+            img_name = "Test_CM_Logistic.png" if not is_rf else "Test_CM_RandomForest.png"
+            try:
+                st.image(load_image(img_name), use_container_width=True)
+            except:
+                st.warning("Missing Image (assets folder)")
+        with c2:
+            st.markdown("**ROC Curve**")
+            try:
+                st.image(load_image("Test_ROC_Comparison.png"), use_container_width=True)
+            except:
+                st.warning("Missing Image (assets folder)")
+
+        st.markdown("**Metrics Comparison**")
         try:
-            st.image("assets/Test_ROC_Comparison.png", use_container_width=True)
+            st.image(load_image("Test_Metrics_Comparison.png"), use_container_width=True)
         except:
-            st.warning("Missing Image (assets folder)")
-            
-    st.markdown("**Metrics Comparison**")
-    try:
-        st.image("assets/Test_Metrics_Comparison.png", use_container_width=True)
-    except:
-        st.warning("Missing Image")
+            st.warning("Missing Image")
 
     st.markdown(HTML_ANALYSIS_REPORT, unsafe_allow_html=True)
-# ------ 3. 关于 ------
+# ------ 3. 批量筛查 ------
+# 批量结果格式 -> (文件后缀, MIME 类型)
+DOWNLOAD_FORMATS = {'csv': (".csv", "text/csv"), 'parquet': (".parquet", "application/vnd.apache.parquet")}
+
+# fragment：批量页的控件只重跑本面板，不触发整页重跑 (也不会清掉诊断结果)
+@st.fragment
+def batch_panel(default_model):
+    st.markdown("### 📁 Batch Screening (批量筛查)")
+    st.caption("上传 CSV/Parquet 文件 (列名与模型特征一致，可用 height 代替 hight；BMI 由 weight/hight 自动计算)，分块向量化校验与评分。")
+    batch_file = st.file_uploader("Cohort File (队列文件)", type=["csv", "parquet"])
+    batch_models = st.multiselect("Models (模型)", list(OUTPUT_COLUMNS), default=[default_model],
+                                  help="Select both to score them together and report agreement (选择两个模型时输出一致性统计)")
+    batch_explain = st.checkbox("Add per-feature contributions (附加特征贡献列)")
+    neighbor_index = load_neighbor_index(neighbors_mtime())
+    batch_neighbors = neighbor_index is not None and st.checkbox(
+        "Add similar-patient columns (附加相似患者列)", help="nn_positive_rate, nn_distance, nn_rows (k = 5)")
+    if batch_file is not None and batch_models and st.button("🚀 Run Batch Scoring"):
+        progress_text = st.empty()
+        # 结果与上传文件格式相同 (Parquet 上传得到 Parquet 结果)
+        out_fmt = detect_format(batch_file.name)
+        try:
+            with tempfile.NamedTemporaryFile(suffix=DOWNLOAD_FORMATS[out_fmt][0]) as out:
+                stats = run_batch(
+                    batch_file, out.name, batch_models, scorer,
+                    progress=lambda rows, sec: progress_text.text(f"{rows} rows scored ..."),
+                    explain=batch_explain, neighbors=neighbor_index if batch_neighbors else None,
+                    drift=get_drift_monitor(),
+                )
+                progress_text.empty()
+                st.success(f"✅ Scored {stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec)")
+                if stats['invalid']:
+                    st.warning("⚠️ Invalid values scored as missing (无效取值按缺失处理): " +
+                               ", ".join(f"{col} × {n}" for col, n in stats['invalid'].items()))
+                if stats['agreement']:
+                    agreement = stats['agreement']
+                    a, b = agreement['models']
+                    st.markdown("**Model agreement (双模型一致性)**")
+                    m1, m2, m3, m4 = st.columns(4)
+                    m1.metric("Label agreement (一致率)", f"{agreement['agreement_rate']:.1%}")
+                    m2.metric("Cohen's κ", f"{agreement['kappa']:.3f}")
+                    m3.metric("Mean |Δp|", f"{agreement['mean_abs_diff']:.3f}")
+                    m4.metric("Correlation (相关)", f"{agreement['correlation']:.3f}")
+                    st.caption(f"Both high risk {agreement['both_positive']} · both low risk {agreement['both_negative']} · "
+                               f"only {a} high {agreement['only_a']} · only {b} high {agreement['only_b']}")
+                with open(out.name, "rb") as f:
+                    results = f.read()
+                suffix, mime = DOWNLOAD_FORMATS[out_fmt]
+                st.download_button("⬇️ Download Results", results, file_name=f"dysphagia_scores{suffix}", mime=mime)
+        except Exception as e:
+            st.error(f"Batch Error: {e}")
+
+with tab_batch:
+    batch_panel(selected_model_name)
+# ------ 4. 关于 ------
 with tab_about:
-    st.markdown(HTML_ABOUT_SYSTEM, unsafe_allow_html=True)
\ No newline at end of file
+    st.markdown(HTML_ABOUT_SYSTEM, unsafe_allow_html=True)
+# ------ 5. 诊断 (隐藏) ------
+def drift_panel(monitor):
+    # 诊断与批量筛查评分过的患者相对参考分布的漂移 (PSI ≥ 0.1 轻度，≥ 0.25 显著)
+    st.markdown("**Population drift (人群漂移)**")
+    report = monitor.report()
+    st.caption(f"{report['rows']} patients since {time.strftime('%Y-%m-%d %H:%M', time.localtime(report['since']))} · "
+               f"reference: {report['reference']}")
+    if not report['rows']:
+        st.info("No patients scored yet (尚无评分记录)")
+        return
+    columns = ['count', 'missing', 'mean', 'std', 'ref_mean', 'ref_std', 'shift', 'psi', 'status']
+    table = pd.DataFrame([{'column': row.get('feature') or row.get('model'), **row}
+                          for row in report['features'] + report['scores']])
+    alerts = table[table['status'].isin(['moderate', 'major'])]
+    if len(alerts):
+        st.warning("⚠️ Drift detected (检测到分布漂移): " +
+                   ", ".join(f"{row.column} PSI {row.psi:.2f}" for row in alerts.itertuples()))
+    st.dataframe(table[['column'] + columns], hide_index=True, use_container_width=True)
+    name = st.selectbox("Distribution (分布)", list(table['column']), key="drift_column")
+    st.plotly_chart(figures.drift_figure(*monitor.histogram(name), name), use_container_width=True)
+    st.button("Reset drift statistics (重置)", on_click=monitor.reset)
+
+@st.fragment
+def diagnostics_panel():
+    st.markdown("### 🛠️ Prediction Diagnostics (预测耗时诊断)")
+    st.toggle("cProfile each prediction (剖析每次预测)", key="profile_enabled",
+              help=f"Profiles are written to ${PROFILE_ENV} or ./profiles")
+    recent = TELEMETRY.recent_traces(50)
+    if recent:
+        st.markdown("**Recent requests (最近请求, ms)**")
+        rows = [{'trace': t['trace'], 'model': t.get('model'), 'total': t['total_ms'], **t['stages_ms']}
+                for t in reversed(recent)]
+        st.dataframe(pd.DataFrame(rows), use_container_width=True)
+        st.markdown("**Aggregated stages (阶段汇总)**")
+        st.dataframe(pd.DataFrame(TELEMETRY.snapshot()), use_container_width=True)
+        last_profile = next((t['profile'] for t in reversed(recent) if t['profile']), None)
+        if last_profile:
+            with st.expander(f"Last profile: {last_profile}"):
+                st.code(open(last_profile).read())
+    else:
+        st.info("No predictions traced yet (尚无预测记录)")
+    with st.expander("Prometheus metrics"):
+        st.code(TELEMETRY.prometheus())
+    audit_log = get_audit_log()
+    if audit_log is not None:
+        st.markdown("**Audit log (审计日志)**")
+        st.caption(f"{audit_log.directory}/ · written {audit_log.written} · pending {audit_log.stats()['pending']} · "
+                   f"dropped {audit_log.dropped} · write errors {audit_log.errors}")
+        audit_summary = summarize_audit(audit_log.directory, by='version')
+        if audit_summary:
+            st.dataframe(pd.DataFrame(audit_summary).drop(columns=['first', 'last']), hide_index=True,
+                         use_container_width=True)
+    drift_panel(get_drift_monitor())
+
+if show_diagnostics:
+    with tab_extra[0]:
+        diagnostics_panel()
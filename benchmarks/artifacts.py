@@ -0,0 +1,81 @@
+"""pickle 与 .npy 模型文件 (artifact.py) 的加载耗时和内存对比
+
+    python benchmarks/artifacts.py [--repeat 3] [--workers 4]
+
+每次测量都在全新子进程中执行 Scorer.load()，记录耗时、加载后的 RSS 以及是否导入了
+scikit-learn。--workers 个进程同时映射同一份导出文件时，映射页位于共享页缓存，
+按比例分摊的 PSS 远小于各自的 RSS 之和。两种方式的评分结果不一致时以非零状态退出。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import PATIENT, ROOT
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+from dysphagia.scoring import Scorer
+scorer = Scorer.load(artifact_dir=sys.argv[1])
+t1 = time.perf_counter()
+patient = json.loads(sys.argv[2])
+scores = {name: scorer.score_records([patient], name)[0] for name in scorer.models}
+memory = {}
+for line in open('/proc/self/smaps_rollup'):
+    key, _, value = line.partition(':')
+    if key in ('Rss', 'Pss'):
+        memory[key] = int(value.split()[0])
+print(json.dumps({'load': t1 - t0, 'rss_kb': memory.get('Rss'), 'pss_kb': memory.get('Pss'),
+                  'sklearn': 'sklearn' in sys.modules, 'scores': scores}), flush=True)
+sys.stdin.read()  # 保持进程存活，便于同时测量多个工作进程
+"""
+
+
+def measure(artifact_dir, workers=1):
+    """同时启动 workers 个子进程加载模型，全部就绪后读取各自的结果"""
+    procs = [subprocess.Popen([sys.executable, "-c", _PROBE, artifact_dir, json.dumps(PATIENT)],
+                              cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for _ in range(workers)]
+    results = [json.loads(proc.stdout.readline()) for proc in procs]
+    for proc in procs:
+        proc.communicate("")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        export_dir = os.path.join(tmp, "artifacts")
+        subprocess.run([sys.executable, "-m", "dysphagia", "export", "--output", export_dir],
+                       cwd=ROOT, check=True, capture_output=True)
+        # 不存在的目录 -> 全部回退到 pickle
+        modes = {'pickle': os.path.join(tmp, "missing"), 'artifact': export_dir}
+
+        summary = {}
+        for mode, directory in modes.items():
+            runs = [measure(directory)[0] for _ in range(args.repeat)]
+            best = min(runs, key=lambda run: run['load'])
+            shared = measure(directory, args.workers)
+            summary[mode] = best
+            print(f"{mode:<9} load {best['load'] * 1000:8.1f} ms   RSS {best['rss_kb'] / 1024:6.1f} MB   "
+                  f"sklearn imported: {best['sklearn']}   "
+                  f"{args.workers} workers: RSS sum {sum(r['rss_kb'] for r in shared) / 1024:6.1f} MB, "
+                  f"PSS sum {sum(r['pss_kb'] for r in shared) / 1024:6.1f} MB")
+
+    pickle_scores, artifact_scores = summary['pickle']['scores'], summary['artifact']['scores']
+    max_error = max(abs(pickle_scores[name] - artifact_scores[name]) for name in pickle_scores)
+    print(f"parity: max |p_pickle - p_artifact| = {max_error:.2e}")
+    print(f"speedup: load {summary['pickle']['load'] / summary['artifact']['load']:.1f}x, "
+          f"RSS {summary['pickle']['rss_kb'] / summary['artifact']['rss_kb']:.1f}x smaller")
+    return 0 if set(pickle_scores) == set(artifact_scores) and max_error < 1e-12 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
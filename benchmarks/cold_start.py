@@ -0,0 +1,69 @@
+"""冷启动时间预算：在全新的子进程中测量评分核心的导入、模型加载和命令行端到端耗时
+
+    python benchmarks/cold_start.py [--repeat 3]
+
+任一阶段 (取多次中的最小值) 超出 BUDGETS 时以非零状态退出。
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from common import PATIENT, ROOT
+
+# 阶段 -> 秒
+BUDGETS = {
+    'import': 0.25,
+    'load': 1.0,
+    'cli': 1.0,
+}
+
+# 导入评分核心时不得带入的 UI / 数据框依赖 (scikit-learn 反序列化时自行导入 pandas，不计在内)
+FORBIDDEN_MODULES = ['streamlit', 'plotly', 'matplotlib', 'pandas']
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import dysphagia.scoring
+t1 = time.perf_counter()
+forbidden = [m for m in %r if m in sys.modules]
+dysphagia.scoring.Scorer.load()
+t2 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'load': t2 - t1, 'forbidden': forbidden}))
+"""
+
+
+def measure_once():
+    probe = subprocess.run([sys.executable, "-c", _PROBE % FORBIDDEN_MODULES],
+                           cwd=ROOT, capture_output=True, text=True, check=True)
+    result = json.loads(probe.stdout)
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "dysphagia", "score"], cwd=ROOT, input=json.dumps(PATIENT),
+                   capture_output=True, text=True, check=True)
+    result['cli'] = time.perf_counter() - start
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    runs = [measure_once() for _ in range(args.repeat)]
+    failed = False
+    for stage, budget in BUDGETS.items():
+        best = min(run[stage] for run in runs)
+        ok = best <= budget
+        failed |= not ok
+        print(f"{stage:<8} {best * 1000:8.1f} ms  (budget {budget * 1000:.0f} ms)  {'OK' if ok else 'OVER'}")
+    forbidden = sorted({m for run in runs for m in run['forbidden']})
+    if forbidden:
+        failed = True
+        print(f"scoring core imported UI/dataframe modules: {forbidden}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+"""基准脚本共用的合成患者数据 (取值范围与侧边栏控件的 min_value/max_value 一致)"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from dysphagia.features import FEATURE_DEFAULTS, sample_patients  # noqa: E402
+
+# 侧边栏表单的默认值
+PATIENT = dict(FEATURE_DEFAULTS)
+
+
+def synthetic_patients(n, seed=0):
+    """在控件取值范围内均匀生成 n 名患者，返回 {特征: numpy 数组}"""
+    return sample_patients(n, seed)
@@ -0,0 +1,94 @@
+"""逐患者解释 (explain.py) 的精确性检查与耗时
+
+    python benchmarks/explain.py [--rows 100000] [--exact-rows 5]
+
+随机森林：对前 --exact-rows 行直接在 sklearn 树上枚举特征子集计算 Shapley 值，与查表
+结果对比；两个模型都检查 base + 贡献之和是否等于模型输出。误差超过 TOLERANCE 时以非零
+状态退出。
+"""
+import argparse
+import itertools
+import math
+import sys
+import time
+import warnings
+
+from common import synthetic_patients
+from forest import best_of
+
+import numpy as np
+
+from dysphagia.features import unwrap_model
+from dysphagia.models import load_models
+from dysphagia.scoring import Scorer
+
+TOLERANCE = 1e-12
+
+
+def _expected(tree, x, subset, node=0):
+    """path-dependent 定义：subset 外的特征按训练样本比例加权两个子树"""
+    left, right = tree.children_left[node], tree.children_right[node]
+    if left < 0:
+        counts = tree.value[node, 0]
+        return counts[1] / counts.sum()
+    if tree.feature[node] in subset:
+        return _expected(tree, x, subset, left if x[tree.feature[node]] <= tree.threshold[node] else right)
+    cover = tree.weighted_n_node_samples
+    return (cover[left] * _expected(tree, x, subset, left)
+            + cover[right] * _expected(tree, x, subset, right)) / cover[node]
+
+
+def brute_force_shap(forest, x):
+    phi = np.zeros(len(x))
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        used = sorted(set(tree.feature[tree.feature >= 0]))
+        m = len(used)
+        for i in used:
+            others = [f for f in used if f != i]
+            for k in range(m):
+                weight = math.factorial(k) * math.factorial(m - k - 1) / math.factorial(m)
+                for subset in itertools.combinations(others, k):
+                    phi[i] += weight * (_expected(tree, x, set(subset) | {i}) - _expected(tree, x, set(subset)))
+    return phi / len(forest.estimators_)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--exact-rows", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    warnings.simplefilter('ignore', UserWarning)
+
+    scorer = Scorer.load()
+    columns = synthetic_patients(args.rows)
+    failed = False
+    for name in scorer.models:
+        start = time.perf_counter()
+        explainer = scorer.explainer(name)
+        build = time.perf_counter() - start
+        X = scorer.matrix(columns, name)
+        phi = explainer.explain(X)
+        model = scorer.model(name)
+        output = model.predict_proba(X)[:, 1] if explainer.space == 'probability' else model.decision_function(X)
+        additivity = float(np.abs(explainer.expected_value + phi.sum(axis=1) - output).max())
+        failed |= additivity > TOLERANCE
+        seconds = best_of(lambda: explainer.explain(X), args.repeat)
+        single = best_of(lambda: explainer.explain(X[:1]), args.repeat * 100)
+        print(f"{name}: build {build * 1000:.1f} ms, {args.rows} rows {seconds * 1000:.1f} ms, "
+              f"single row {single * 1000:.3f} ms, max |base + sum(phi) - output| = {additivity:.2e}")
+
+    if 'Random Forest' in scorer.models:
+        pipeline, _ = unwrap_model(load_models()['Random Forest'])
+        X = scorer.matrix(columns, 'Random Forest')[:args.exact_rows]
+        X_tree = pipeline[:-1].transform(X).astype(np.float32)
+        reference = np.array([brute_force_shap(pipeline[-1], x) for x in X_tree])
+        error = float(np.abs(reference - scorer.explainer('Random Forest').explain(X)).max())
+        failed |= error > TOLERANCE
+        print(f"Random Forest: max |phi_bruteforce - phi| over {args.exact_rows} rows = {error:.2e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""展平随机森林 (FlatForest) 与 sklearn 的一致性检查和延迟对比
+
+    python benchmarks/forest.py [--rows 100000]
+
+概率最大误差超过 TOLERANCE、预测标签不一致，或 --rows 行批量评分比 sklearn 慢时以非零状态退出。
+"""
+import argparse
+import time
+import warnings
+
+from common import PATIENT, synthetic_patients
+
+import numpy as np
+import pandas as pd
+
+from dysphagia.features import FEATURES_RF, compute_bmi, unwrap_model
+from dysphagia.forest import FlatForest
+from dysphagia.models import load_models
+from dysphagia.scoring import feature_matrix
+
+MODEL = 'Random Forest'
+TOLERANCE = 1e-12
+
+
+def best_of(fn, repeat):
+    """返回 repeat 次中最快一次的秒数"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    warnings.simplefilter('ignore', UserWarning)
+
+    pipeline, _ = unwrap_model(load_models()[MODEL])
+    flat = FlatForest.from_model(pipeline)
+
+    X = feature_matrix(synthetic_patients(args.rows), MODEL)
+    X[::101, 3] = np.nan  # 覆盖 SimpleImputer 的填充路径
+    expected = pipeline.predict_proba(X)[:, 1]
+    actual = flat.predict_proba(X)[:, 1]
+    max_error = float(np.abs(expected - actual).max())
+    labels_match = bool((pipeline.predict(X) == flat.predict(X)).all())
+    print(f"parity: max |p_sklearn - p_flat| = {max_error:.2e}, labels match: {labels_match}")
+
+    # 与 app.py 原有单患者路径一致：DataFrame -> reindex -> predict + predict_proba
+    full_data = dict(PATIENT, BMI=compute_bmi(PATIENT['weight'], PATIENT['hight']))
+
+    def current_path():
+        final_input = pd.DataFrame([full_data]).reindex(columns=FEATURES_RF)
+        pipeline.predict(final_input)
+        pipeline.predict_proba(final_input)
+
+    x1 = feature_matrix({k: [v] for k, v in PATIENT.items()}, MODEL)
+    n = 100
+    rows = [
+        ("single row, pandas + sklearn (current)", best_of(lambda: [current_path() for _ in range(n)], args.repeat) / n),
+        ("single row, numpy + sklearn", best_of(lambda: [pipeline.predict_proba(x1) for _ in range(n)], args.repeat) / n),
+        ("single row, FlatForest", best_of(lambda: [flat.predict_proba(x1) for _ in range(n)], args.repeat) / n),
+        (f"{args.rows} rows, sklearn", best_of(lambda: pipeline.predict_proba(X), args.repeat)),
+        (f"{args.rows} rows, FlatForest", best_of(lambda: flat.predict_proba(X), args.repeat)),
+    ]
+    for label, seconds in rows:
+        print(f"{label:<42} {seconds * 1000:10.3f} ms")
+    speedup = rows[3][1] / rows[4][1]
+    print(f"batch speedup over sklearn: {speedup:.2f}x")
+    return 0 if max_error <= TOLERANCE and labels_match and speedup >= 1 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,71 @@
+"""逻辑回归快速路径 (FusedLogistic) 与 pandas + sklearn 路径的一致性检查和延迟对比
+
+    python benchmarks/linear.py [--rows 100000]
+
+概率最大误差超过 TOLERANCE 时以非零状态退出。
+"""
+import argparse
+import warnings
+
+from common import PATIENT, synthetic_patients
+
+import numpy as np
+import pandas as pd
+
+from dysphagia.features import FEATURES_LR, compute_bmi, manual_standardization, unwrap_model
+from dysphagia.linear import FusedLogistic
+from dysphagia.models import load_models
+from dysphagia.scoring import feature_matrix
+
+from forest import best_of
+
+MODEL = 'Logistic Regression'
+TOLERANCE = 1e-12
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    warnings.simplefilter('ignore', UserWarning)
+
+    pipeline, _ = unwrap_model(load_models()[MODEL])
+    fused = FusedLogistic.from_model(pipeline)
+
+    columns = synthetic_patients(args.rows)
+    df = pd.DataFrame(columns)
+    df['BMI'] = compute_bmi(df['weight'], df['hight'])
+    X_raw = feature_matrix(columns, MODEL, standardize=False)
+    X_raw[::101, 2] = np.nan  # 覆盖 SimpleImputer 的填充路径
+    df.loc[::101, 'number_of_teeth'] = np.nan
+
+    expected = pipeline.predict_proba(manual_standardization(df[FEATURES_LR]))[:, 1]
+    actual = fused.predict_proba(X_raw)[:, 1]
+    max_error = float(np.abs(expected - actual).max())
+    print(f"parity: max |p_sklearn - p_fused| = {max_error:.2e}")
+
+    # 与 app.py 原有单患者路径一致：DataFrame -> reindex -> manual_standardization -> predict + predict_proba
+    full_data = dict(PATIENT, BMI=compute_bmi(PATIENT['weight'], PATIENT['hight']))
+
+    def current_path():
+        final_input = manual_standardization(pd.DataFrame([full_data]).reindex(columns=FEATURES_LR))
+        pipeline.predict(final_input)
+        pipeline.predict_proba(final_input)
+
+    x1 = feature_matrix({k: [v] for k, v in PATIENT.items()}, MODEL, standardize=False)
+    n = 100
+    rows = [
+        ("single row, pandas + sklearn (current)", best_of(lambda: [current_path() for _ in range(n)], args.repeat) / n),
+        ("single row, FusedLogistic", best_of(lambda: [fused.predict_proba(x1) for _ in range(n)], args.repeat) / n),
+        (f"{args.rows} rows, pandas + sklearn",
+         best_of(lambda: pipeline.predict_proba(manual_standardization(df[FEATURES_LR])), args.repeat)),
+        (f"{args.rows} rows, FusedLogistic", best_of(lambda: fused.predict_proba(X_raw), args.repeat)),
+    ]
+    for label, seconds in rows:
+        print(f"{label:<42} {seconds * 1000:10.3f} ms")
+    return 0 if max_error <= TOLERANCE else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,75 @@
+"""HTTP 推理服务压测：对比关闭微批 (max_batch=1) 与默认微批的吞吐和延迟
+
+    python benchmarks/service_load.py [--clients 64] [--requests 50]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from common import PATIENT
+
+from dysphagia.scoring import Scorer
+from dysphagia.service import DEFAULT_MAX_BATCH, InferenceService
+
+
+async def client(port, n_requests, model):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps({'model': model, 'features': PATIENT}).encode()
+    request = (f"POST /predict HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+    for _ in range(n_requests):
+        writer.write(request)
+        await writer.drain()
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line == b'\r\n':
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        await reader.readexactly(length)
+    writer.close()
+
+
+async def run_load(scorer, max_batch, clients, n_requests, model):
+    service = InferenceService(scorer, max_batch=max_batch)
+    started = asyncio.get_running_loop().create_future()
+    server_task = asyncio.create_task(service.serve(port=0, ready=started.set_result))
+    server = await started
+    port = server.sockets[0].getsockname()[1]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, n_requests, model) for _ in range(clients)))
+    seconds = time.perf_counter() - start
+    server_task.cancel()
+    try:
+        await server_task
+    except asyncio.CancelledError:
+        pass
+
+    snapshot = service.metrics.snapshot()
+    return {
+        'max_batch': max_batch,
+        'requests_per_sec': clients * n_requests / seconds,
+        'p50_ms': snapshot['latency_ms']['p50'],
+        'p99_ms': snapshot['latency_ms']['p99'],
+        'mean_batch_size': snapshot['mean_batch_size'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per client")
+    parser.add_argument("--model", default='Random Forest')
+    args = parser.parse_args(argv)
+
+    scorer = Scorer.load()
+    for max_batch in (1, DEFAULT_MAX_BATCH):
+        result = asyncio.run(run_load(scorer, max_batch, args.clients, args.requests, args.model))
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
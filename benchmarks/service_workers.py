@@ -0,0 +1,124 @@
+"""预派生多进程服务压测：吞吐随工作进程数的变化，以及每个工作进程的内存开销
+
+    python benchmarks/service_workers.py [--workers 1 2 4] [--clients 64] [--requests 50]
+
+对每个工作进程数启动一次 `python -m dysphagia serve --workers N`，由 --client-procs 个
+压测进程发送单患者请求。内存取自 /proc/<pid>/smaps_rollup：RSS 含与父进程共享的
+模型页面，USS (私有页面) 才是每多一个工作进程真正增加的内存。
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from common import ROOT
+from service_load import client
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _memory_kb(pid):
+    """{'Rss', 'Pss', 'Uss'}，单位 KB"""
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                memory[key] = int(value.split()[0])
+    memory['Uss'] = memory.pop('Private_Clean') + memory.pop('Private_Dirty')
+    return memory
+
+
+def _children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def _wait_ready(port, workers, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with status {server.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).read()
+            if workers == 1 or len(_children(server.pid)) == workers:
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("server did not become ready")
+
+
+def _client_proc(port, clients, n_requests, model):
+    async def main():
+        await asyncio.gather(*(client(port, n_requests, model) for _ in range(clients)))
+    asyncio.run(main())
+
+
+def run_load(port, client_procs, clients, n_requests, model):
+    procs = [multiprocessing.Process(target=_client_proc, args=(port, clients // client_procs, n_requests, model))
+             for _ in range(client_procs)]
+    start = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    seconds = time.perf_counter() - start
+    return (clients // client_procs) * client_procs * n_requests / seconds
+
+
+def measure(workers, args):
+    port = _free_port()
+    command = [sys.executable, "-m", "dysphagia", "serve", "--port", str(port), "--workers", str(workers)]
+    server = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+    try:
+        _wait_ready(port, workers, server)
+        throughput = run_load(port, args.client_procs, args.clients, args.requests, args.model)
+        # 单进程模式下服务进程本身就是工作进程
+        worker_pids = _children(server.pid) if workers > 1 else [server.pid]
+        memory = [_memory_kb(pid) for pid in worker_pids]
+        parent = _memory_kb(server.pid) if workers > 1 else None
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=10)
+    return {
+        'workers': workers,
+        'requests_per_sec': throughput,
+        'worker_rss_mb': sum(m['Rss'] for m in memory) / len(memory) / 1024,
+        'worker_uss_mb': sum(m['Uss'] for m in memory) / len(memory) / 1024,
+        'total_pss_mb': (sum(m['Pss'] for m in memory) + (parent['Pss'] if parent else 0)) / 1024,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=64, help="Concurrent connections in total")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per connection")
+    parser.add_argument("--client-procs", type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help="Load generator processes")
+    parser.add_argument("--model", default='Random Forest')
+    args = parser.parse_args(argv)
+
+    print(f"{os.cpu_count()} CPUs, {args.client_procs} load generator processes")
+    baseline = None
+    for workers in args.workers:
+        result = measure(workers, args)
+        baseline = baseline or result['requests_per_sec']
+        result['scaling'] = result['requests_per_sec'] / baseline
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
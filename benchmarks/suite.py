@@ -0,0 +1,304 @@
+"""基准测试套件：模型加载、单患者、批量、内存峰值、输入校验、离线评估、相似患者检索、审计日志、漂移监测与界面图表，结果输出为 JSON
+
+    python benchmarks/suite.py --output bench.json
+    python benchmarks/suite.py --baseline bench.json [--threshold 1.25]
+
+合成患者在侧边栏控件的取值范围内生成 (common.synthetic_patients)，随机种子固定。
+给定 --baseline 时逐项与上次结果比较：耗时/内存变大或吞吐变小超过 --threshold 倍
+即视为回归，以非零状态退出。升级 scikit-learn 或更换模型文件前后各跑一次即可对比。
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+from common import PATIENT, ROOT, synthetic_patients
+
+BATCH_SIZES = [1, 100, 10_000, 1_000_000]
+QUICK_BATCH_SIZES = [1, 100, 10_000]
+
+DEFAULT_THRESHOLD = 1.25
+
+# 相似患者检索基准的参考队列与批量查询规模
+NEIGHBOR_REFERENCE = 200_000
+NEIGHBOR_QUERIES = 10_000
+
+_COLD_LOAD = """
+import time
+t0 = time.perf_counter()
+from dysphagia.models import load_models
+load_models()
+print(time.perf_counter() - t0)
+"""
+
+
+def median_time(fn, repeat, number=1):
+    """repeat 轮、每轮调用 number 次，返回单次调用耗时的中位数 (秒)"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return statistics.median(times)
+
+
+class Results:
+    def __init__(self):
+        self.results = {}
+
+    def add(self, name, value, unit, better='lower'):
+        self.results[name] = {'value': value, 'unit': unit, 'better': better}
+        print(f"{name:<40} {value:14.6g} {unit}", file=sys.stderr)
+
+
+def bench_load(results, repeat):
+    from dysphagia.models import load_models
+
+    cold = [float(subprocess.run([sys.executable, "-c", _COLD_LOAD], cwd=ROOT, capture_output=True,
+                                 text=True, check=True).stdout) for _ in range(repeat)]
+    results.add('load_models.cold', statistics.median(cold), 's')
+    load_models()
+    results.add('load_models.warm', median_time(load_models, repeat), 's')
+
+
+def bench_single_row(results, models, scorer, repeat):
+    import pandas as pd
+
+    from dysphagia.features import MODEL_FEATURES, compute_bmi, manual_standardization, unwrap_model
+
+    full_data = dict(PATIENT, BMI=compute_bmi(PATIENT['weight'], PATIENT['hight']))
+    for name, features in MODEL_FEATURES.items():
+        pipeline, _ = unwrap_model(models[name])
+
+        # 重构前 app.py 的单患者路径：DataFrame -> reindex -> (标准化) -> predict_proba
+        def pandas_path():
+            final_input = pd.DataFrame([full_data]).reindex(columns=features)
+            if name == 'Logistic Regression':
+                final_input = manual_standardization(final_input)
+            pipeline.predict_proba(final_input)
+
+        key = name.lower().replace(' ', '_')
+        results.add(f'single_row.pandas.{key}', median_time(pandas_path, repeat, 20), 's')
+        results.add(f'single_row.scorer.{key}',
+                    median_time(lambda: scorer.score_records([full_data], name), repeat, 200), 's')
+
+
+def bench_batch(results, scorer, sizes, repeat):
+    from dysphagia.features import MODEL_FEATURES
+
+    columns = synthetic_patients(max(sizes))
+    for name in MODEL_FEATURES:
+        key = name.lower().replace(' ', '_')
+        for n in sizes:
+            subset = {col: values[:n] for col, values in columns.items()}
+            number = max(1, 10_000 // n)
+            seconds = median_time(lambda: scorer.score_columns(subset, name), repeat, number)
+            results.add(f'batch.{key}.{n}', n / seconds, 'rows/s', better='higher')
+
+        # 最大批量的 Python 堆峰值 (numpy 的分配也计入 tracemalloc)
+        subset = {col: values[:max(sizes)] for col, values in columns.items()}
+        tracemalloc.start()
+        scorer.score_columns(subset, name)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.add(f'memory.batch_peak.{key}.{max(sizes)}', peak / 2 ** 20, 'MB')
+
+    # 两个模型共用一个特征矩阵同时评分 (对比模式 / 批量的两列输出)
+    for n in sizes:
+        subset = {col: values[:n] for col, values in columns.items()}
+        number = max(1, 10_000 // n)
+        seconds = median_time(lambda: scorer.predict_models(subset), repeat, number)
+        results.add(f'batch.both_models.{n}', n / seconds, 'rows/s', better='higher')
+
+
+def bench_validation(results, sizes, repeat):
+    from dysphagia.schema import validate_columns, validate_record
+
+    # 整列 schema 校验 (批量/服务入口)，与逐条校验的单条耗时对比
+    n = max(sizes)
+    columns = synthetic_patients(n)
+    results.add(f'validate.columns.{n}', median_time(lambda: validate_columns(columns), repeat), 's')
+    results.add('validate.record', median_time(lambda: validate_record(PATIENT, 'Random Forest'), repeat, 1000), 's')
+
+
+def bench_evaluation(results, scorer, sizes, repeat):
+    import numpy as np
+
+    from dysphagia.evaluate import Curve, bootstrap
+
+    # 标签按随机森林概率抽样；排序一次后任意阈值的混淆矩阵是一次二分查找
+    n = max(sizes)
+    p = scorer.score_columns(synthetic_patients(n), 'Random Forest')
+    y = (np.random.default_rng(0).random(n) < p).astype(np.int8)
+    results.add(f'evaluate.curve.{n}', median_time(lambda: Curve.from_scores(y, p), repeat), 's')
+    curve = Curve.from_scores(y, p)
+    results.add('evaluate.confusion', median_time(lambda: curve.confusion(0.42), repeat, 1000), 's')
+    reps = 20
+    results.add(f'evaluate.bootstrap.{n}', median_time(lambda: bootstrap(y, p, 0.5, reps), 1) / reps, 's')
+
+
+def bench_neighbors(results, repeat):
+    from dysphagia.neighbors import NeighborIndex
+
+    # 参考队列与查询患者取自同一分布；批量查询整批向量化 (结果按每个患者计)
+    reference = synthetic_patients(NEIGHBOR_REFERENCE)
+    results.add(f'neighbors.build.{NEIGHBOR_REFERENCE}', median_time(lambda: NeighborIndex.build(reference), 1), 's')
+    index = NeighborIndex.build(reference)
+    results.add('neighbors.single', median_time(lambda: index.neighbors(PATIENT), repeat, 20), 's')
+    queries = synthetic_patients(NEIGHBOR_QUERIES, seed=1)
+    results.add(f'neighbors.batch.{NEIGHBOR_QUERIES}',
+                median_time(lambda: index.query(queries), repeat) / NEIGHBOR_QUERIES, 's')
+
+
+def bench_audit(results, sizes, repeat):
+    import tempfile
+
+    import numpy as np
+
+    from dysphagia.audit import AuditLog, summarize
+
+    # log() 是请求路径上的开销 (只入队)；flush 与 summarize 在后台线程 / 离线运行
+    n = max(sizes)
+    columns = synthetic_patients(n)
+    p = np.random.default_rng(0).random(n)
+    with tempfile.TemporaryDirectory() as directory:
+        audit = AuditLog(directory, 'service', max_pending=n + 1000)
+        results.add('audit.log', median_time(lambda: audit.log('Random Forest', 'v1', PATIENT, 0.42, 0, 0.5, 0.001),
+                                             repeat, 1000), 's')
+        audit.flush()
+        audit.log_columns('Random Forest', 'v1', columns, p, (p > 0.5).astype(np.int8), 0.5, 0.01)
+        start = time.perf_counter()
+        audit.flush()
+        results.add(f'audit.flush.{n}', n / (time.perf_counter() - start), 'rows/s',
+                    better='higher')
+        audit.close()
+        results.add(f'audit.summarize.{n}', median_time(lambda: summarize(directory, 'version'), repeat), 's')
+
+
+def bench_drift(results, sizes, repeat):
+    import numpy as np
+
+    from dysphagia.drift import DriftMonitor
+
+    # observe() 在单患者请求路径上；update() 为批量筛查与 /predict/batch 的整批更新
+    monitor = DriftMonitor()
+    results.add('drift.observe', median_time(lambda: monitor.observe(PATIENT, {'Random Forest': 0.42}),
+                                             repeat, 1000), 's')
+    for n in sizes:
+        columns = synthetic_patients(n)
+        p = {'Random Forest': np.random.default_rng(0).random(n)}
+        seconds = median_time(lambda: monitor.update(columns, p), repeat)
+        results.add(f'drift.update.{n}', n / seconds, 'rows/s', better='higher')
+
+
+def bench_figures(results, models, scorer, repeat):
+    from dysphagia import figures
+    from dysphagia.explain import global_importances
+
+    # st.plotly_chart 会把图表序列化为 JSON，计入构建时间
+    results.add('figure.gauge', median_time(lambda: figures.gauge_figure(0.42).to_json(), repeat, 5), 's')
+    for name, loaded_object in models.items():
+        key = name.lower().replace(' ', '_')
+        importances = global_importances(loaded_object)
+        results.add(f'figure.importance.{key}',
+                    median_time(lambda: figures.importance_figure(importances, name).to_json(), repeat, 5), 's')
+        explanation = scorer.explain_records([PATIENT], name)[0]
+        results.add(f'figure.explanation.{key}',
+                    median_time(lambda: figures.explanation_figure(explanation, name).to_json(), repeat, 5), 's')
+
+
+def environment():
+    import numpy
+    import sklearn
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(current, baseline, threshold):
+    """返回回归项列表 [(名称, 基线值, 当前值, 倍数)]"""
+    regressions = []
+    for name, result in current.items():
+        old = baseline.get(name)
+        if old is None or not old['value'] or not result['value']:
+            continue
+        if result['better'] == 'higher':
+            ratio = old['value'] / result['value']
+        else:
+            ratio = result['value'] / old['value']
+        print(f"{name:<40} {ratio:6.2f}x {'REGRESSION' if ratio > threshold else ''}", file=sys.stderr)
+        if ratio > threshold:
+            regressions.append((name, old['value'], result['value'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Fail when a metric is this many times worse than the baseline")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help=f"Skip the {BATCH_SIZES[-1]:,}-row batch")
+    args = parser.parse_args(argv)
+    warnings.simplefilter('ignore', UserWarning)
+
+    from dysphagia.models import load_models
+    from dysphagia.scoring import Scorer
+
+    results = Results()
+    bench_load(results, args.repeat)
+    models = load_models()
+    scorer = Scorer(models)
+    bench_single_row(results, models, scorer, args.repeat)
+    bench_batch(results, scorer, QUICK_BATCH_SIZES if args.quick else BATCH_SIZES, args.repeat)
+    bench_validation(results, QUICK_BATCH_SIZES if args.quick else BATCH_SIZES, args.repeat)
+    bench_evaluation(results, scorer, QUICK_BATCH_SIZES if args.quick else BATCH_SIZES, args.repeat)
+    bench_neighbors(results, args.repeat)
+    bench_audit(results, QUICK_BATCH_SIZES if args.quick else BATCH_SIZES, args.repeat)
+    bench_drift(results, QUICK_BATCH_SIZES if args.quick else BATCH_SIZES, args.repeat)
+    bench_figures(results, models, scorer, args.repeat)
+    results.add('memory.max_rss', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 'MB')
+
+    report = {'environment': environment(), 'results': results.results}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results.results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold}x:", file=sys.stderr)
+            for name, old, new, ratio in regressions:
+                print(f"  {name}: {old:.6g} -> {new:.6g} ({ratio:.2f}x)", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
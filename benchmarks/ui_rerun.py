@@ -0,0 +1,60 @@
+"""界面每次重跑的服务端耗时 (streamlit.testing 的 AppTest，不含浏览器渲染与网络)
+
+    python benchmarks/ui_rerun.py [--repeat 10]
+
+场景：
+    rerun     无交互的整页重跑 (侧边栏任一控件变化时的基准开销)
+    submit    点击 Run Prediction (随机森林)
+
+每个场景先预热一次 (模型加载、缓存填充)，再取 --repeat 次的中位数。AppTest 总是
+整页重跑，批量筛查页与诊断页 fragment 内控件的局部重跑不在此测量范围内。
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import warnings
+
+from common import ROOT
+
+APP = f"{ROOT}/app.py"
+
+
+def timed(at, action, repeat):
+    action(at)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action(at)
+        times.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+    return statistics.median(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args(argv)
+    warnings.simplefilter('ignore')
+
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(ROOT)
+    at = AppTest.from_file(APP, default_timeout=120)
+    start = time.perf_counter()
+    at.run()
+    print(f"{'first run':<10} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    scenarios = {
+        'rerun': lambda at: at.run(),
+        'submit': lambda at: at.sidebar.button[0].click().run(),
+    }
+    for name, action in scenarios.items():
+        seconds = timed(at, action, args.repeat)
+        print(f"{name:<10} {seconds * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
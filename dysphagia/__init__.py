@@ -0,0 +1,5 @@
+"""Dysphagia AI (吞咽障碍智能预测) 的无界面评分核心"""
+from .features import (
+    FEATURES_LR, FEATURES_RF, MODEL_FEATURES, STATS_CONFIG,
+    compute_bmi, manual_standardization, unwrap_model,
+)
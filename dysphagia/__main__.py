@@ -0,0 +1,226 @@
+"""命令行入口
+
+    python -m dysphagia score --model "Random Forest" < patients.json
+    python -m dysphagia batch cohort.csv scored.csv
+    python -m dysphagia serve --port 8600
+    python -m dysphagia compile-forest --output random_forest_flat.npz
+    python -m dysphagia build-table --output risk_table
+    python -m dysphagia export --output artifacts
+    python -m dysphagia registry publish --name "Random Forest" retrained_rf.pkl
+    python -m dysphagia evaluate labelled.csv --label dysphagia --output evaluation
+    python -m dysphagia build-neighbors cohort.csv --label dysphagia --output neighbors
+    python -m dysphagia audit summary --by day --since 2026-10-01
+    python -m dysphagia drift training.csv --output drift_reference.json
+
+子命令的依赖 (pandas、pyarrow 等) 只在被调用时才导入。
+"""
+import argparse
+import json
+import sys
+import time
+
+from . import batch, service
+from .features import MODEL_FEATURES
+from .schema import SchemaError, validate_record
+from .scoring import add_model_arguments, scorer_from_args
+
+
+def _score(args):
+    start = time.perf_counter()
+    payload = json.load(open(args.input) if args.input else sys.stdin)
+    records = payload if isinstance(payload, list) else [payload]
+    scorer = scorer_from_args(args)
+    loaded = time.perf_counter()
+    names = args.model or [name for name in MODEL_FEATURES if scorer.available(name)]
+    audit = None
+    if args.audit:
+        from .audit import AuditLog
+        audit = AuditLog(args.audit, 'cli')
+    results = {}
+    try:
+        for name in names:
+            validated = []
+            for i, record in enumerate(records):
+                try:
+                    validated.append(validate_record(record, name))
+                except SchemaError as exc:
+                    raise SystemExit(f"Invalid record {i} for {name}: {exc}") from None
+            # 一次评分得到概率、按 --threshold 的标签与 (随机森林) --interval 投票区间
+            started = time.perf_counter()
+            predictions = scorer.predict_records(validated, name, interval=args.interval)
+            results[name] = [_prediction(prediction) for prediction in predictions]
+            if audit is not None:
+                # 与 AuditLog.log_columns 相同：整批的耗时记入每一条
+                latency = time.perf_counter() - started
+                for record, prediction in zip(validated, predictions):
+                    audit.log(name, scorer.versions.get(name), record, prediction['probability'],
+                              prediction['label'], prediction['threshold'], latency)
+    finally:
+        if audit is not None:
+            audit.close()
+    done = time.perf_counter()
+
+    json.dump(results, sys.stdout)
+    sys.stdout.write("\n")
+    if args.timing:
+        print(f"load {loaded - start:.3f}s, score {done - loaded:.3f}s", file=sys.stderr)
+
+
+def _prediction(prediction):
+    out = {'probability': prediction['probability'], 'label': prediction['label'],
+           'threshold': prediction['threshold']}
+    if prediction['ci'] is not None:
+        out['ci_low'], out['ci_high'] = prediction['ci']
+    return out
+
+
+def _compile_forest(args):
+    from . import forest
+    forest.run(args)
+
+
+def _build_table(args):
+    from . import lookup
+    lookup.run(args)
+
+
+def _export(args):
+    from . import artifact
+    artifact.run(args)
+
+
+def _evaluate(args):
+    from . import evaluate
+    evaluate.run(args)
+
+
+def _build_neighbors(args):
+    from . import neighbors
+    neighbors.run(args)
+
+
+def _audit(args):
+    from . import audit
+    audit.run(args)
+
+
+def _drift(args):
+    from . import drift
+    drift.run(args)
+
+
+def _registry(args):
+    from . import registry
+    registry.run(args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m dysphagia", description="Dysphagia AI scoring (吞咽障碍智能预测)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    score = commands.add_parser("score", help="Score patients given as a JSON object or list")
+    score.add_argument("--input", help="JSON file (default: stdin)")
+    score.add_argument("--model", action="append", choices=list(MODEL_FEATURES),
+                       help="Model to score with (repeatable, default: all)")
+    score.add_argument("--interval", type=float, metavar="LEVEL",
+                       help="Add the Random Forest tree-vote interval (ci_low, ci_high), e.g. 0.9")
+    score.add_argument("--timing", action="store_true", help="Print load/score time to stderr")
+    score.add_argument("--audit", metavar="DIR",
+                       help="Append every prediction (features, model version, probability) to this audit log")
+    add_model_arguments(score)
+    score.set_defaults(func=_score)
+
+    batch_cmd = commands.add_parser("batch", help="Stream a CSV/Parquet cohort file through the models")
+    batch.add_arguments(batch_cmd)
+    batch_cmd.set_defaults(func=batch.run)
+
+    serve_cmd = commands.add_parser("serve", help="Run the local HTTP inference service")
+    service.add_arguments(serve_cmd)
+    serve_cmd.set_defaults(func=service.run)
+
+    forest_cmd = commands.add_parser("compile-forest", help="Flatten the Random Forest into NumPy arrays")
+    forest_cmd.add_argument("--model", default="random_forest_model.pkl", help="Pickled Random Forest")
+    forest_cmd.add_argument("--output", default="random_forest_flat.npz")
+    forest_cmd.set_defaults(func=_compile_forest)
+
+    table_cmd = commands.add_parser("build-table", help="Precompute the Random Forest risk lookup table")
+    table_cmd.add_argument("--model", default="random_forest_model.pkl", help="Pickled Random Forest")
+    table_cmd.add_argument("--output", default="risk_table", help="Directory for table.npy + meta.json")
+    table_cmd.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    table_cmd.add_argument("--validate", type=int, default=100_000, help="Random patients to check against the live model")
+    table_cmd.set_defaults(func=_build_table)
+
+    export_cmd = commands.add_parser("export", help="Export the pickled models as memory-mappable .npy + JSON artifacts")
+    export_cmd.add_argument("--output", default="artifacts", help="Root directory, one subdirectory per model")
+    export_cmd.set_defaults(func=_export)
+
+    evaluate_cmd = commands.add_parser("evaluate", help="Recompute ROC/AUC, confusion matrices, calibration and "
+                                                        "bootstrap CIs on a labelled dataset")
+    evaluate_cmd.add_argument("input", help="Labelled CSV or Parquet file (model features + a 0/1 label column)")
+    evaluate_cmd.add_argument("--label", default="dysphagia", help="Label column (default: dysphagia)")
+    evaluate_cmd.add_argument("--output", default="evaluation", help="Directory for report.json, curves and figures")
+    evaluate_cmd.add_argument("--model", action="append", choices=list(MODEL_FEATURES),
+                              help="Model to evaluate (repeatable, default: all)")
+    evaluate_cmd.add_argument("--bootstrap", type=int, default=1000,
+                              help="Bootstrap resamples for the confidence intervals (0 disables)")
+    evaluate_cmd.add_argument("--level", type=float, default=0.95, help="Confidence level")
+    evaluate_cmd.add_argument("--workers", type=int, default=1, help="Bootstrap worker processes")
+    evaluate_cmd.add_argument("--seed", type=int, default=0)
+    evaluate_cmd.add_argument("--sensitivity", type=float, action="append",
+                              help="Report the threshold reaching this sensitivity (repeatable, default: 0.8/0.9/0.95)")
+    evaluate_cmd.add_argument("--chunksize", type=int)
+    add_model_arguments(evaluate_cmd)
+    evaluate_cmd.set_defaults(func=_evaluate)
+
+    neighbors_cmd = commands.add_parser("build-neighbors", help="Build the similar-patient (k-nearest-neighbor) index "
+                                                               "from a reference cohort")
+    neighbors_cmd.add_argument("input", help="CSV or Parquet reference cohort (Random Forest features)")
+    neighbors_cmd.add_argument("--label", help="Outcome column (0/1) reported for the neighbors, e.g. dysphagia")
+    neighbors_cmd.add_argument("--output", default="neighbors", help="Directory for meta.json + .npy")
+    neighbors_cmd.add_argument("--leaf-size", type=int, default=64, help="Largest number of patients per tree leaf")
+    neighbors_cmd.set_defaults(func=_build_neighbors)
+
+    registry_cmd = commands.add_parser("registry", help="Publish, list or roll back versioned models for hot reload")
+    registry_cmd.add_argument("--registry", default="registry", help="Registry root directory")
+    actions = registry_cmd.add_subparsers(dest="action", required=True)
+    publish_cmd = actions.add_parser("publish", help="Export a pickled model as a new version and make it current")
+    publish_cmd.add_argument("--name", required=True, choices=list(MODEL_FEATURES))
+    publish_cmd.add_argument("model_file", help="Pickled model (same format as the bundled .pkl files)")
+    publish_cmd.add_argument("--no-activate", action="store_true", help="Publish without updating CURRENT")
+    activate_cmd = actions.add_parser("activate", help="Point CURRENT at a published version (e.g. roll back)")
+    activate_cmd.add_argument("--name", required=True, choices=list(MODEL_FEATURES))
+    activate_cmd.add_argument("version")
+    actions.add_parser("list", help="Show published and current versions")
+    registry_cmd.set_defaults(func=_registry)
+
+    audit_cmd = commands.add_parser("audit", help="Summarize or export the screening audit log")
+    audit_cmd.add_argument("--dir", default="audit", help="Audit log directory")
+    audit_actions = audit_cmd.add_subparsers(dest="action", required=True)
+    summary_cmd = audit_actions.add_parser("summary", help="Counts, positive rate, mean probability and latency")
+    summary_cmd.add_argument("--by", default="model", choices=["model", "version", "source", "day", "hour"])
+    summary_cmd.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    audit_export_cmd = audit_actions.add_parser("export", help="Write the matching records to CSV or Parquet")
+    audit_export_cmd.add_argument("output", help="CSV or Parquet file")
+    for action_cmd in (summary_cmd, audit_export_cmd):
+        action_cmd.add_argument("--since", help="Local date/time, e.g. 2026-10-01 or 2026-10-01T08:00")
+        action_cmd.add_argument("--until", help="Local date/time (exclusive)")
+        action_cmd.add_argument("--model", choices=list(MODEL_FEATURES))
+        action_cmd.add_argument("--source", choices=["app", "service", "cli"])
+    audit_cmd.set_defaults(func=_audit)
+
+    drift_cmd = commands.add_parser("drift", help="Compute feature and score distribution statistics for a cohort "
+                                                  "(use the output as --drift-reference) and report drift")
+    drift_cmd.add_argument("input", help="CSV or Parquet cohort file, e.g. the training set")
+    drift_cmd.add_argument("--output", default="drift_reference.json", help="JSON statistics file")
+    drift_cmd.add_argument("--reference", help="Compare against this earlier output (default: STATS_CONFIG)")
+    drift_cmd.add_argument("--model", action="append", choices=list(MODEL_FEATURES),
+                           help="Model whose scores to track (repeatable, default: all)")
+    drift_cmd.add_argument("--chunksize", type=int)
+    drift_cmd.set_defaults(func=_drift)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
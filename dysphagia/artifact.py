@@ -0,0 +1,196 @@
+"""不依赖 pickle 的模型文件格式：JSON 元数据 + .npy 数组，加载时只读内存映射
+
+    python -m dysphagia export --output artifacts
+
+每个模型一个子目录:
+    artifacts/random_forest/        meta.json + feature/threshold/value/impute/left_fraction.npy (FlatForest 的数组)
+    artifacts/logistic_regression/  meta.json + coef/intercept.npy 及各预处理步骤的参数
+
+meta.json 记录格式版本、特征顺序、标准化参数 (STATS_CONFIG)、来源 pickle 的哈希、
+导出时的 scikit-learn 版本、测试集指标、全局特征重要性 (逻辑回归系数 / 随机森林
+feature_importances_，界面直接读取，无需反序列化 pickle) 以及每个数组的 dtype/shape。加载只需要
+numpy：数组用 np.load(mmap_mode='r', allow_pickle=False) 映射，页面在首次访问时
+才读入，多个工作进程映射同一文件时共享操作系统页缓存中的同一份数据。
+
+逻辑回归保存折叠前的原始系数，加载时再由 FusedLogistic.from_params 折叠，
+因此 STATS_CONFIG 的取值以 meta.json 中导出时的记录为准。
+"""
+import json
+import os
+
+import numpy as np
+
+from .features import MODEL_FEATURES, STATS_CONFIG, unwrap_model
+
+META_FILE = "meta.json"
+FORMAT_VERSION = 1
+
+# 默认的导出根目录；模型名称 -> 子目录
+ARTIFACT_DIR = "artifacts"
+ARTIFACT_SUBDIRS = {
+    'Logistic Regression': "logistic_regression",
+    'Random Forest': "random_forest",
+}
+
+
+class ArtifactError(ValueError):
+    """模型文件缺失、版本不支持或内容与 meta.json 不一致"""
+
+
+def _jsonable(value):
+    """把测试集指标中的 numpy 数组 / 标量转成 JSON 可写的类型"""
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return value
+
+
+def _forest_arrays(model):
+    from .forest import FlatForest
+
+    flat = FlatForest.from_model(model)
+    arrays = {'feature': flat.feature, 'threshold': flat.threshold, 'value': flat.value}
+    if flat.impute is not None:
+        arrays['impute'] = flat.impute
+    if flat.left_fraction is not None:
+        arrays['left_fraction'] = flat.left_fraction
+    return 'flat_forest', arrays, {}
+
+
+def _logistic_arrays(model):
+    from .linear import FusedLogistic
+
+    source = FusedLogistic.from_model(model).source
+    arrays = {'coef': source['coef'], 'intercept': np.array([source['intercept']])}
+    steps = []
+    for i, step in enumerate(source['steps']):
+        if step[0] == 'impute':
+            names = [f"step{i}_statistics"]
+        else:
+            names = [f"step{i}_mean", f"step{i}_std"]
+        arrays.update(zip(names, step[1:]))
+        steps.append({'kind': step[0], 'arrays': names})
+    return 'fused_logistic', arrays, {'steps': steps, 'stats': STATS_CONFIG}
+
+
+_EXPORTERS = {
+    'Random Forest': _forest_arrays,
+    'Logistic Regression': _logistic_arrays,
+}
+
+
+def export_model(loaded_object, model_name, directory, source_hash=None):
+    """把 joblib 加载的模型 (或字典) 写成 directory 下的 meta.json + .npy，返回 meta"""
+    import sklearn
+
+    from .explain import global_importances
+    from .scoring import _named_steps
+
+    model, _ = unwrap_model(loaded_object)
+    if model is None:
+        raise ArtifactError(f"No model found in the {model_name} pickle")
+    features = MODEL_FEATURES[model_name]
+    _named_steps(model, features)
+    kind, arrays, extra = _EXPORTERS[model_name](model)
+
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + ".npy"), np.ascontiguousarray(array))
+    metrics = loaded_object.get('metrics_on_test') if isinstance(loaded_object, dict) else None
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'kind': kind,
+        'model_name': model_name,
+        'features': features,
+        'source_hash': source_hash,
+        'sklearn_version': sklearn.__version__,
+        'metrics_on_test': _jsonable(metrics),
+        'feature_importances': _jsonable(global_importances(model)),
+        'arrays': {name: {'dtype': str(array.dtype), 'shape': list(array.shape)} for name, array in arrays.items()},
+        **extra,
+    }
+    # meta.json 最后写入：导出中断时目录不会被当作完整的模型文件
+    with open(os.path.join(directory, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def read_meta(directory):
+    try:
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError) as exc:
+        raise ArtifactError(f"Cannot read {directory}/{META_FILE}: {exc}") from exc
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported artifact format in {directory}: {meta.get('format_version')}")
+    return meta
+
+
+def _load_arrays(directory, meta, mmap=True):
+    arrays = {}
+    for name, spec in meta['arrays'].items():
+        path = os.path.join(directory, name + ".npy")
+        try:
+            array = np.load(path, mmap_mode='r' if mmap else None, allow_pickle=False)
+        except (OSError, ValueError) as exc:
+            raise ArtifactError(f"Cannot load {path}: {exc}") from exc
+        if str(array.dtype) != spec['dtype'] or list(array.shape) != spec['shape']:
+            raise ArtifactError(f"{path} is {array.dtype}{list(array.shape)}, "
+                                f"meta.json expects {spec['dtype']}{spec['shape']}")
+        arrays[name] = array
+    return arrays
+
+
+def load_artifact(directory, mmap=True):
+    """加载一个模型目录，返回 (FlatForest 或 FusedLogistic, meta)"""
+    meta = read_meta(directory)
+    name = meta['model_name']
+    if meta['features'] != MODEL_FEATURES.get(name):
+        raise ArtifactError(f"Artifact features {meta['features']} do not match {name}")
+    arrays = _load_arrays(directory, meta, mmap)
+
+    if meta['kind'] == 'flat_forest':
+        from .forest import FlatForest
+        model = FlatForest(**arrays)
+    elif meta['kind'] == 'fused_logistic':
+        from .linear import FusedLogistic
+        steps = [(step['kind'], *(arrays[a] for a in step['arrays'])) for step in meta['steps']]
+        model = FusedLogistic.from_params(arrays['coef'], arrays['intercept'][0], steps,
+                                          meta['features'], meta['stats'])
+    else:
+        raise ArtifactError(f"Unknown artifact kind in {directory}: {meta['kind']}")
+    return model, meta
+
+
+def load_artifacts(root=ARTIFACT_DIR, versions=None):
+    """加载 root 下存在的模型目录，返回 ({模型名称: 模型}, {模型名称: 来源哈希})
+
+    versions 为 {模型名称: pickle 哈希}；与导出来源不一致的 (过期) 目录跳过，
+    由调用方退回 pickle。
+    """
+    models, hashes = {}, {}
+    for name, subdir in ARTIFACT_SUBDIRS.items():
+        directory = os.path.join(root, subdir)
+        if not os.path.exists(os.path.join(directory, META_FILE)):
+            continue
+        source_hash = read_meta(directory)['source_hash']
+        if (versions or {}).get(name) not in (None, source_hash):
+            continue
+        models[name], _ = load_artifact(directory)
+        hashes[name] = source_hash
+    return models, hashes
+
+
+def run(args):
+    import joblib
+
+    from .models import MODEL_FILES, file_hash
+
+    for name, path in MODEL_FILES.items():
+        directory = os.path.join(args.output, ARTIFACT_SUBDIRS[name])
+        meta = export_model(joblib.load(path), name, directory, file_hash(path))
+        size = sum(os.path.getsize(os.path.join(directory, a + ".npy")) for a in meta['arrays'])
+        print(f"{name}: {path} -> {directory} ({len(meta['arrays'])} arrays, {size / 1024:.0f} KB)")
@@ -0,0 +1,41 @@
+"""界面静态图片的预处理：读一次、缩放到显示宽度、按 st.image 的输出格式编码
+
+st.image 收到文件路径时，每次重跑都会读文件、解码整张图、缩放到显示宽度再重新编码
+(assets/ 中的原图远宽于页面)，一次整页重跑的大部分时间花在这里。image_bytes() 按
+同样的规则一次性生成字节串：RGB 图片编码为 JPEG (quality 90)，带透明通道的编码为
+PNG；宽度不超过显示宽度、格式一致时 st.image 只读图片头，直接使用这些字节。
+app.py 用 st.cache_resource 缓存结果，每个进程每种宽度只处理一次。
+"""
+import io
+import os
+
+ASSET_DIR = "assets"
+
+# st.image 的最大显示宽度 (streamlit.elements.lib.image_utils.MAXIMUM_CONTENT_WIDTH)
+MAX_IMAGE_WIDTH = 2 * 730
+
+JPEG_QUALITY = 90
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def image_bytes(name, width=MAX_IMAGE_WIDTH, directory=ASSET_DIR):
+    """返回缩放到不超过 width 像素宽、编码为 JPEG 或 PNG 的图片字节串
+
+    文件不存在时抛出 FileNotFoundError。
+    """
+    from PIL import Image
+
+    with Image.open(os.path.join(directory, name)) as image:
+        alpha = _has_alpha(image)
+        if image.width > width:
+            # 与 st.image 相同的 BILINEAR 缩放，显示效果不变
+            image = image.resize((width, int(image.height * width / image.width)), resample=Image.BILINEAR)
+        out = io.BytesIO()
+        if alpha:
+            image.save(out, format='PNG', optimize=True)
+        else:
+            image.convert('RGB').save(out, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    return out.getvalue()
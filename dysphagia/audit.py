@@ -0,0 +1,459 @@
+"""筛查审计日志：每次评分的特征、模型版本、概率与耗时，追加写入定宽 NumPy 记录文件
+
+    python -m dysphagia serve --audit audit
+    python -m dysphagia score --audit audit < patients.json
+    python -m dysphagia audit summary --by day --since 2026-10-01
+    python -m dysphagia audit export audit.csv --model "Random Forest"
+
+请求路径只把记录放进内存队列 (log() 不做 I/O；积压超过 max_pending 条时丢弃并计数)，
+后台线程每 flush_interval 秒把积压的记录整批转成 RECORD_DTYPE 结构化数组，一次 write
+追加到当前段文件。段文件 (<来源>-<时间>-<pid>-<序号>.rec) 是没有文件头的原始记录，
+可以一直追加；写满 segment_rows 条后 fsync 并换新文件 (轮转)。每个进程只写自己的段，
+预派生的服务工作进程之间不需要加锁。目录下的 schema.json 记录字段定义，读取时校验。
+每条记录只保存该模型使用的特征，其余特征列为 NaN。
+
+读取时每个段用 np.memmap 只读映射 (进程崩溃时写了一半的最后一条记录按文件长度舍去)，
+筛选与按模型/版本/来源/日期的聚合都是整列运算 (见 summarize)。进程被强制结束时最多
+丢失最近 flush_interval 秒内的记录。
+"""
+import atexit
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from .features import FEATURES_RF, MODEL_FEATURES, compute_bmi
+
+AUDIT_DIR = "audit"
+SCHEMA_FILE = "schema.json"
+SEGMENT_SUFFIX = ".rec"
+FORMAT_VERSION = 1
+
+# 界面使用的审计目录；设为空字符串时界面不记录
+AUDIT_ENV = "DYSPHAGIA_AUDIT"
+
+# 来源与模型按下标存储 (uint8)
+SOURCES = ['app', 'service', 'cli']
+MODEL_NAMES = list(MODEL_FEATURES)
+
+# 8 字节字段在前，其余按大小排列；每条 99 字节
+RECORD_DTYPE = np.dtype(
+    [('time', '<f8'), ('probability', '<f8')]
+    + [(col, '<f4') for col in FEATURES_RF]
+    + [('threshold', '<f4'), ('latency_ms', '<f4'), ('version', 'S16'),
+       ('source', 'u1'), ('model', 'u1'), ('label', 'i1')]
+)
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+SEGMENT_ROWS = 1_000_000
+MAX_PENDING = 100_000
+
+SUMMARY_KEYS = ('model', 'version', 'source', 'day', 'hour')
+
+
+def _schema():
+    return {'format_version': FORMAT_VERSION, 'dtype': [list(field) for field in RECORD_DTYPE.descr],
+            'sources': SOURCES, 'models': MODEL_NAMES}
+
+
+def check_schema(directory):
+    """directory 中的 schema.json 与当前记录格式不一致时抛出 ArtifactError (不存在时不检查)"""
+    from .artifact import ArtifactError
+
+    try:
+        with open(os.path.join(directory, SCHEMA_FILE)) as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as exc:
+        raise ArtifactError(f"Cannot read {directory}/{SCHEMA_FILE}: {exc}") from exc
+    if saved != json.loads(json.dumps(_schema())):
+        raise ArtifactError(f"Audit log in {directory} was written with a different record format")
+
+
+def _write_schema(directory):
+    path = os.path.join(directory, SCHEMA_FILE)
+    if os.path.exists(path):
+        check_schema(directory)
+        return
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(_schema(), f, indent=2)
+    os.replace(tmp, path)
+
+
+def _column(values, n):
+    if values is None:
+        return np.full(n, np.nan)
+    return np.asarray(values, dtype=np.float64)
+
+
+def _model_inputs(model_name, features, bmi):
+    """{特征: 值} 中该模型实际使用的特征；其他特征 (如界面中逻辑回归模式下的占位值) 不记录，
+    读出为 NaN。BMI 缺失时由 weight/hight 推导 (bmi 为推导函数)"""
+    used = {col: features.get(col) for col in MODEL_FEATURES[model_name]}
+    if used.get('BMI') is None and 'BMI' in used and features.get('weight') is not None \
+            and features.get('hight') is not None:
+        used['BMI'] = bmi(features['weight'], features['hight'])
+    return used
+
+
+class AuditLog:
+    """后台批量写入的审计日志；log() / log_columns() 线程安全、不阻塞请求"""
+
+    def __init__(self, directory=AUDIT_DIR, source='service', flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 segment_rows=SEGMENT_ROWS, max_pending=MAX_PENDING, fsync=False, log=None):
+        if source not in SOURCES:
+            raise ValueError(f"Unknown audit source {source!r}, expected one of {SOURCES}")
+        self.directory = directory
+        self.source = source
+        self.flush_interval = flush_interval
+        self.segment_rows = segment_rows
+        self.max_pending = max_pending
+        # 每批写入后是否 fsync (默认只在轮转与关闭时 fsync)
+        self.fsync = fsync
+        self.log_error = log or (lambda message: print(message, file=sys.stderr, flush=True))
+        self.written = 0
+        self.dropped = 0
+        # 因写入失败 (磁盘满等) 丢失的记录条数
+        self.errors = 0
+        self.segments = 0
+        self._pending = collections.deque()
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+        self._file_rows = 0
+        self._path = None
+
+    # ---------- 请求路径 ----------
+
+    def log(self, model_name, version, features, probability, label, threshold, latency):
+        """一次单患者评分；features 为特征字典，latency 为秒 (只入队，转换在后台线程中进行)"""
+        self._put(model_name, version, features, probability, label, threshold, latency, None)
+
+    def log_columns(self, model_name, version, columns, probabilities, labels, threshold, latency):
+        """一批患者 ({特征: 数组})；latency 为整批的耗时，记入每一行"""
+        self._put(model_name, version, columns, probabilities, labels, threshold, latency, len(probabilities))
+
+    def _put(self, model_name, version, columns, probabilities, labels, threshold, latency, n):
+        # n 为 None 表示单条记录 (columns 为特征字典，概率与标签为标量)
+        item = (time.time(), model_name, version, columns, probabilities, labels, threshold, latency, n)
+        rows = 1 if n is None else n
+        with self._lock:
+            if self._pending_rows + rows > self.max_pending:
+                self.dropped += rows
+                return
+            self._pending.append(item)
+            self._pending_rows += rows
+
+    # ---------- 后台写入 ----------
+
+    def _single(self, item):
+        """单条记录 -> 与 RECORD_DTYPE 字段顺序一致的元组"""
+        timestamp, model_name, version, features, probability, label, threshold, latency, _ = item
+        features = _model_inputs(model_name, features, lambda w, h: compute_bmi(float(w), float(h)))
+        values = [features.get(col) for col in FEATURES_RF]
+        return (timestamp, probability, *[np.nan if v is None else v for v in values], threshold,
+                latency * 1000, (version or '').encode()[:16], SOURCES.index(self.source),
+                MODEL_NAMES.index(model_name), label)
+
+    def _records(self, items):
+        n = sum(1 if item[-1] is None else item[-1] for item in items)
+        out = np.zeros(n, RECORD_DTYPE)
+        s = 0
+        singles = []
+        for item in items:
+            if item[-1] is None:
+                singles.append(self._single(item))
+                continue
+            if singles:
+                # 连续的单条记录一次构造，保持入队顺序
+                out[s:s + len(singles)] = np.array(singles, RECORD_DTYPE)
+                s += len(singles)
+                singles = []
+            timestamp, model_name, version, columns, probabilities, labels, threshold, latency, rows = item
+            block = out[s:s + rows]
+            block['time'] = timestamp
+            block['model'] = MODEL_NAMES.index(model_name)
+            block['source'] = SOURCES.index(self.source)
+            block['version'] = (version or '').encode()[:16]
+            block['probability'] = np.asarray(probabilities, dtype=np.float64)
+            block['label'] = np.asarray(labels, dtype=np.int8)
+            block['threshold'] = threshold
+            block['latency_ms'] = latency * 1000
+            columns = _model_inputs(model_name, columns,
+                                    lambda w, h: compute_bmi(_column(w, rows), _column(h, rows)))
+            for col in FEATURES_RF:
+                block[col] = _column(columns.get(col), rows)
+            s += rows
+        if singles:
+            out[s:] = np.array(singles, RECORD_DTYPE)
+        return out
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        _write_schema(self.directory)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        self._path = os.path.join(self.directory,
+                                  f"{self.source}-{stamp}-{os.getpid()}-{self.segments:04d}{SEGMENT_SUFFIX}")
+        self._file = open(self._path, 'ab')
+        self._file_rows = 0
+        self.segments += 1
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def flush(self):
+        """把积压的记录写入段文件，返回写入的条数 (后台线程定期调用)
+
+        写入失败时未写入的记录条数计入 errors，异常照常抛出。
+        """
+        with self._lock:
+            items, self._pending = self._pending, collections.deque()
+            rows, self._pending_rows = self._pending_rows, 0
+        if not items:
+            return 0
+        s = 0
+        try:
+            records = self._records(items)
+            while s < len(records):
+                if self._file is None or self._file_rows >= self.segment_rows:
+                    self._close_segment()
+                    self._open_segment()
+                part = records[s:s + self.segment_rows - self._file_rows]
+                self._file.write(part.tobytes())
+                self._file_rows += len(part)
+                s += len(part)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except Exception:
+            self.errors += rows - s
+            self.written += s
+            raise
+        self.written += len(records)
+        return len(records)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as exc:
+                # 写入失败 (磁盘满等) 不能影响评分；未写入的记录已在 flush() 中计入 errors
+                self.log_error(f"[audit] write failed: {type(exc).__name__}: {exc}")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="dysphagia-audit", daemon=True)
+            self._thread.start()
+            # 正常退出时写完积压的记录
+            atexit.register(self.close)
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        finally:
+            self._close_segment()
+
+    def stats(self):
+        return {'directory': self.directory, 'written': self.written, 'pending': self._pending_rows,
+                'dropped': self.dropped, 'errors': self.errors, 'segment': self._path}
+
+
+# ---------- 读取与聚合 ----------
+
+def segments(directory=AUDIT_DIR):
+    """段文件路径，按文件名 (来源、开始时间) 排序"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+def read_segment(path):
+    """一个段的全部记录 (只读内存映射)；末尾不完整的记录舍去"""
+    n = os.path.getsize(path) // RECORD_DTYPE.itemsize
+    if n == 0:
+        return np.zeros(0, RECORD_DTYPE)
+    return np.memmap(path, RECORD_DTYPE, 'r', shape=(n,))
+
+
+def parse_time(value):
+    """'2026-10-01' / '2026-10-01T08:00' (本地时间) 或 Unix 秒数 -> Unix 秒数"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    from datetime import datetime
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _mask(records, since, until, model, source):
+    mask = np.ones(len(records), dtype=bool)
+    if since is not None:
+        mask &= records['time'] >= since
+    if until is not None:
+        mask &= records['time'] < until
+    if model is not None:
+        mask &= records['model'] == MODEL_NAMES.index(model)
+    if source is not None:
+        mask &= records['source'] == SOURCES.index(source)
+    return mask
+
+
+def iter_records(directory=AUDIT_DIR, since=None, until=None, model=None, source=None, fields=None):
+    """逐段产出满足条件的记录 (结构化数组)；fields 给定时只取这些字段，内存占用按段计"""
+    check_schema(directory)
+    since, until = parse_time(since), parse_time(until)
+    for path in segments(directory):
+        records = read_segment(path)
+        if not len(records):
+            continue
+        mask = _mask(records, since, until, model, source)
+        if not mask.any():
+            continue
+        if fields is None:
+            yield np.asarray(records) if mask.all() else records[mask]
+            continue
+        # 只复制需要的字段 (紧凑排列)，聚合时不搬运特征列
+        out = np.empty(int(mask.sum()), _packed(fields))
+        for name in fields:
+            out[name] = records[name] if len(out) == len(records) else records[name][mask]
+        yield out
+
+
+def _packed(fields):
+    return np.dtype([(name, RECORD_DTYPE[name]) for name in fields])
+
+
+def load_records(directory=AUDIT_DIR, since=None, until=None, model=None, source=None, fields=None):
+    """满足条件的记录合并为一个结构化数组 (参数见 iter_records)"""
+    parts = list(iter_records(directory, since, until, model, source, fields))
+    if parts:
+        return np.concatenate(parts)
+    return np.zeros(0, RECORD_DTYPE if fields is None else _packed(fields))
+
+
+def to_frame(records):
+    """结构化记录 -> DataFrame (来源、模型、版本解码为字符串，时间为本地时间)"""
+    import pandas as pd
+
+    columns = {}
+    for name in records.dtype.names:
+        values = records[name]
+        if name == 'time':
+            values = (pd.to_datetime(values, unit='s', utc=True).tz_convert(None)
+                      + pd.Timedelta(seconds=time.localtime().tm_gmtoff))
+        elif name == 'source':
+            values = np.asarray(SOURCES, dtype=object)[values]
+        elif name == 'model':
+            values = np.asarray(MODEL_NAMES, dtype=object)[values]
+        elif name == 'version':
+            values = np.char.decode(values, 'ascii')
+        columns[name] = values
+    return pd.DataFrame(columns)
+
+
+def _factorize(values):
+    """(唯一值, 每个元素在唯一值中的下标)；先按连续相同的段合并 (日志中同一模型、版本、日期
+    通常连成长段)，只对各段的首个值排序"""
+    if not len(values):
+        return values[:0], np.zeros(0, dtype=np.int64)
+    starts = np.r_[0, np.flatnonzero(values[1:] != values[:-1]) + 1]
+    uniques, run_codes = np.unique(values[starts], return_inverse=True)
+    return uniques, np.repeat(run_codes, np.diff(np.r_[starts, len(values)]))
+
+
+def _group_keys(records, by):
+    """每条记录的组号 (0..组数-1) 与各组键的显示值 [{键: 值}]"""
+    if by in ('model', 'source'):
+        names = MODEL_NAMES if by == 'model' else SOURCES
+        uniques, codes = _factorize(records[by])
+        return codes, [{by: names[value]} for value in uniques.tolist()]
+    if by == 'version':
+        versions, version_codes = _factorize(records['version'])
+        uniques, codes = _factorize(records['model'].astype(np.int64) * len(versions) + version_codes)
+        return codes, [{'model': MODEL_NAMES[value // len(versions)],
+                        'version': versions[value % len(versions)].decode('ascii')} for value in uniques.tolist()]
+    if by in ('day', 'hour'):
+        seconds = 86400 if by == 'day' else 3600
+        # 按本地时间的整天/整点分组
+        offset = time.localtime().tm_gmtoff
+        uniques, codes = _factorize(((records['time'] + offset) // seconds).astype(np.int64))
+        fmt = '%Y-%m-%d' if by == 'day' else '%Y-%m-%d %H:00'
+        return codes, [{by: time.strftime(fmt, time.gmtime(value * seconds))} for value in uniques.tolist()]
+    raise ValueError(f"Unknown grouping {by!r}, expected one of {SUMMARY_KEYS}")
+
+
+def summarize(directory=AUDIT_DIR, by='model', since=None, until=None, model=None, source=None):
+    """按 by 分组的统计 [{键..., rows, positive_rate, mean_probability, latency_p50_ms, latency_p99_ms,
+    first, last}]，按键排序；只读取聚合需要的字段"""
+    fields = ['time', 'model', 'version', 'source', 'probability', 'label', 'latency_ms']
+    records = load_records(directory, since, until, model, source, fields)
+    if not len(records):
+        return []
+    codes, keys = _group_keys(records, by)
+    counts = np.bincount(codes, minlength=len(keys))
+    positives = np.bincount(codes, weights=records['label'], minlength=len(keys))
+    probability = np.bincount(codes, weights=records['probability'], minlength=len(keys))
+    # 组号按组排序 (小整数的稳定排序为基数排序)，各组的耗时分位数与时间范围在组内切片上计算
+    order = None
+    if len(keys) > 1:
+        order = np.argsort(codes.astype(np.uint16) if len(keys) <= 65535 else codes, kind='stable')
+    bounds = np.r_[0, np.cumsum(counts)]
+    summary = []
+    for i, key in enumerate(keys):
+        rows = slice(None) if order is None else order[bounds[i]:bounds[i + 1]]
+        latency = records['latency_ms'][rows]
+        times = records['time'][rows]
+        p50, p99 = np.percentile(latency, [50, 99]).tolist()
+        summary.append({**key, 'rows': int(counts[i]), 'positive_rate': positives[i] / counts[i],
+                        'mean_probability': probability[i] / counts[i], 'latency_p50_ms': p50,
+                        'latency_p99_ms': p99, 'first': float(times.min()), 'last': float(times.max())})
+    return summary
+
+
+def format_summary(rows):
+    lines = []
+    for row in rows:
+        key = " ".join(str(row[k]) for k in ('model', 'version', 'source', 'day', 'hour') if k in row)
+        lines.append(f"{key:<36} {row['rows']:>10} rows  positive {row['positive_rate']:6.1%}  "
+                     f"mean p {row['mean_probability']:.3f}  latency p50 {row['latency_p50_ms']:.2f} ms "
+                     f"p99 {row['latency_p99_ms']:.2f} ms")
+    return "\n".join(lines)
+
+
+def run(args):
+    filters = dict(since=args.since, until=args.until, model=args.model, source=args.source)
+    if args.action == 'summary':
+        start = time.perf_counter()
+        rows = summarize(args.dir, args.by, **filters)
+        if args.json:
+            json.dump(rows, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+        else:
+            print(format_summary(rows) or "No audit records")
+            total = sum(row['rows'] for row in rows)
+            print(f"{total} records summarized in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    else:
+        from .batch import ChunkWriter
+
+        rows = 0
+        with ChunkWriter(args.output) as writer:
+            for records in iter_records(args.dir, **filters):
+                writer.write(to_frame(records))
+                rows += len(records)
+        print(f"Exported {rows} audit records to {args.output}")
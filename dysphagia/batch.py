@@ -0,0 +1,308 @@
+"""批量队列筛查：分块读取 CSV/Parquet，逐块向量化预测并增量写出结果
+
+用法:
+    python -m dysphagia batch cohort.csv scored.csv --model "Random Forest"
+    python -m dysphagia batch registry.csv scored.csv --workers 4 --checkpoint scored.ckpt
+    python -m dysphagia batch cohort.csv scored.csv --neighbors neighbors --k 5
+    python -m dysphagia batch cohort.csv scored.csv --drift cohort_drift.json
+    python -m dysphagia batch cohort.csv scored.csv --registry registry --threshold 0.3
+
+命令行走 pipeline.py (后台读取、并行评分、可续跑)；run_batch 是界面使用的单线程版本。
+"""
+import argparse
+import sys
+import time
+
+from .features import MODEL_FEATURES
+from .scoring import Scorer, add_model_arguments, scorer_from_args
+
+DEFAULT_CHUNKSIZE = 50_000
+
+# 模型名称 -> 结果列名
+OUTPUT_COLUMNS = {
+    'Logistic Regression': 'prob_lr',
+    'Random Forest': 'prob_rf',
+}
+
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+
+
+def detect_format(path):
+    """根据文件后缀判断格式 ('csv' 或 'parquet')"""
+    return 'parquet' if str(path).lower().endswith(PARQUET_SUFFIXES) else 'csv'
+
+
+def read_chunks(source, chunksize=DEFAULT_CHUNKSIZE, fmt=None, skip=0):
+    """按块读取输入文件，每次产出一个 DataFrame，内存占用与文件大小无关
+
+    skip 为跳过的数据行数 (续跑时已提交的行)；Parquet 整个跳过的 row group 不解码。
+    """
+    fmt = fmt or detect_format(getattr(source, 'name', source))
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(source)
+        first = 0
+        while first < parquet.num_row_groups and skip >= parquet.metadata.row_group(first).num_rows:
+            skip -= parquet.metadata.row_group(first).num_rows
+            first += 1
+        for batch in parquet.iter_batches(batch_size=chunksize, row_groups=range(first, parquet.num_row_groups)):
+            if skip >= batch.num_rows:
+                skip -= batch.num_rows
+                continue
+            yield batch.slice(skip).to_pandas()
+            skip = 0
+    else:
+        import pandas as pd
+        yield from pd.read_csv(source, chunksize=chunksize, skiprows=range(1, skip + 1) if skip else None)
+
+
+def validate_chunk(df, model_names, first_row=0, errors='coerce'):
+    """按 schema.py 整列校验一个数据块，返回 (DataFrame, {列名: 无效值个数})
+
+    别名列改为模型列名 (height -> hight)，无效取值置为 NaN (按缺失值评分)；
+    errors='raise' 时抛出 SchemaError，其中的行号为文件中的数据行号 (从 first_row 起)。
+    """
+    from .schema import SchemaError, validate_columns
+
+    try:
+        result = validate_columns(df, model_names, errors)
+    except SchemaError as exc:
+        raise SchemaError([dict(error, rows=[first_row + i for i in error['rows']]) if 'rows' in error else error
+                           for error in exc.errors]) from None
+    if result.renamed:
+        df = df.rename(columns=result.renamed)
+    counts = result.counts()
+    # 只替换有无效值或非数值类型的列，其余列保持原样写出
+    replace = {col: values for col, values in result.columns.items()
+               if col in counts or df[col].dtype.kind not in 'fiub'}
+    if replace:
+        df = df.assign(**replace)
+    return df, counts
+
+
+def merge_counts(total, counts):
+    for col, n in counts.items():
+        total[col] = total.get(col, 0) + n
+    return total
+
+
+def explain_columns(model_name):
+    """解释列名：prob_rf -> contrib_rf_base, contrib_rf_<特征> ..."""
+    prefix = OUTPUT_COLUMNS[model_name].replace('prob_', 'contrib_', 1)
+    return [f"{prefix}_base"] + [f"{prefix}_{col}" for col in MODEL_FEATURES[model_name]]
+
+
+def result_columns(model_name, kind):
+    """prob_rf -> label_rf / ci_low_rf / ci_high_rf"""
+    return OUTPUT_COLUMNS[model_name].replace('prob', kind, 1)
+
+
+def score_chunk(df, scorer, model_names, explain=False, interval=None, neighbors=None, k=5):
+    """对一个数据块每个模型评分一次，返回附加了概率列与标签列 (按 scorer.thresholds) 的 DataFrame
+
+    多个模型共用一次构建的特征矩阵并发评分 (见 Scorer.predict_models)。interval 给定时
+    随机森林附加各树投票区间列；explain=True 时再附加每个特征的贡献列 (见 explain.py；
+    随机森林为概率，逻辑回归为 logit)。neighbors 为 neighbors.NeighborIndex 时附加 k 个
+    相似患者的阳性率、平均距离与行号列 (nn_positive_rate / nn_distance / nn_rows)。
+    """
+    out = df.copy()
+    results = scorer.predict_models(df, model_names, interval=interval)
+    for name in model_names:
+        result = results[name]
+        out[OUTPUT_COLUMNS[name]] = result['probability']
+        out[result_columns(name, 'label')] = result['label']
+        if 'ci_low' in result:
+            out[result_columns(name, 'ci_low')] = result['ci_low']
+            out[result_columns(name, 'ci_high')] = result['ci_high']
+        if explain:
+            base, phi = scorer.explain_columns(df, name)
+            columns = explain_columns(name)
+            out[columns[0]] = base
+            for j, col in enumerate(columns[1:]):
+                out[col] = phi[:, j]
+    if neighbors is not None:
+        for col, values in neighbors.summarize(*neighbors.query(df, k)).items():
+            out[col] = values
+    return out
+
+
+def make_agreement(model_names):
+    """两个模型同时评分时返回 compare.Agreement，否则返回 None"""
+    if len(model_names) != 2:
+        return None
+    from .compare import Agreement
+    return Agreement(*model_names)
+
+
+def update_agreement(agreement, scored):
+    """用 score_chunk 输出的概率列与标签列更新一致性统计"""
+    if agreement is not None:
+        agreement.update({name: {'probability': scored[OUTPUT_COLUMNS[name]].to_numpy(),
+                                 'label': scored[result_columns(name, 'label')].to_numpy()}
+                          for name in (agreement.model_a, agreement.model_b)})
+
+
+def update_drift(drift, scored, model_names):
+    """用 score_chunk 输出的特征列与概率列更新 drift.DriftMonitor (为 None 时不做任何事)"""
+    if drift is not None:
+        drift.update(scored, {name: scored[OUTPUT_COLUMNS[name]].to_numpy() for name in model_names})
+
+
+class ChunkWriter:
+    """增量写出结果：CSV 逐块追加，Parquet 逐块写入 row group"""
+
+    def __init__(self, target, fmt=None, header=True):
+        self.target = target
+        self.fmt = fmt or detect_format(getattr(target, 'name', target))
+        self._parquet = None
+        # 续写已有的 CSV 时不再写表头
+        self._header = header
+
+    def write(self, df):
+        if self.fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.target, table.schema)
+            self._parquet.write_table(table)
+        else:
+            if hasattr(self.target, 'write'):
+                df.to_csv(self.target, index=False, header=self._header)
+            else:
+                df.to_csv(self.target, index=False, header=self._header,
+                          mode='w' if self._header else 'a')
+        self._header = False
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_batch(source, target, model_names=None, scorer=None,
+              chunksize=DEFAULT_CHUNKSIZE, in_fmt=None, out_fmt=None, progress=None, explain=False,
+              interval=None, neighbors=None, k=5, drift=None):
+    """流式批量评分；progress(rows, seconds) 在每块写出后回调。返回统计信息
+
+    无效取值 (见 schema.py) 置为缺失值继续评分，个数按列计入 stats['invalid']。
+    drift 为 drift.DriftMonitor 时每块评分后更新特征与概率的统计。
+    """
+    model_names = list(model_names or MODEL_FEATURES)
+    scorer = scorer or Scorer.load()
+    for name in model_names:
+        if not scorer.available(name):
+            raise RuntimeError(f"Model file for {name} not found.")
+        if explain:
+            # 在读第一块之前构建，模型不支持解释时尽早报错
+            scorer.explainer(name)
+
+    rows = 0
+    invalid = {}
+    agreement = make_agreement(model_names)
+    start = time.perf_counter()
+    with ChunkWriter(target, out_fmt) as writer:
+        for chunk in read_chunks(source, chunksize, in_fmt):
+            n = len(chunk)
+            chunk, counts = validate_chunk(chunk, model_names, rows)
+            merge_counts(invalid, counts)
+            scored = score_chunk(chunk, scorer, model_names, explain, interval, neighbors, k)
+            update_agreement(agreement, scored)
+            update_drift(drift, scored, model_names)
+            writer.write(scored)
+            rows += n
+            if progress is not None:
+                progress(rows, time.perf_counter() - start)
+    seconds = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds > 0 else 0.0,
+        'invalid': invalid,
+        'agreement': agreement.summary() if agreement is not None else None,
+    }
+
+
+def format_agreement(summary):
+    a, b = summary['models']
+    return (f"{a} vs {b}: {summary['agreement_rate']:.1%} label agreement (kappa {summary['kappa']:.3f}), "
+            f"{summary['disagree']} disagreements ({summary['only_a']} only {a}, {summary['only_b']} only {b}), "
+            f"mean |Δp| {summary['mean_abs_diff']:.3f}, r = {summary['correlation']:.3f}")
+
+
+def add_arguments(parser):
+    parser.add_argument("input", help="CSV or Parquet file with patient features")
+    parser.add_argument("output", help="CSV or Parquet file to write scores to")
+    parser.add_argument("--model", action="append", choices=list(MODEL_FEATURES),
+                        help="Model to score with (repeatable, default: all)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--explain", action="store_true",
+                        help="Add per-feature contribution columns (contrib_rf_*, contrib_lr_*)")
+    parser.add_argument("--interval", type=float, metavar="LEVEL",
+                        help="Add Random Forest tree-vote interval columns (ci_low_rf, ci_high_rf), e.g. 0.9")
+    parser.add_argument("--neighbors", metavar="DIR",
+                        help="Neighbor index from build-neighbors; adds nn_positive_rate, nn_distance, nn_rows")
+    parser.add_argument("--k", type=int, default=5, help="Similar patients per row for --neighbors (default: 5)")
+    parser.add_argument("--workers", type=int, default=1, help="Scoring threads (see pipeline.py)")
+    parser.add_argument("--queue-size", type=int, help="Chunks read ahead of scoring (default: 4)")
+    parser.add_argument("--checkpoint", metavar="PATH",
+                        help="Checkpoint file; rerun with the same arguments to resume after a crash")
+    parser.add_argument("--strict", action="store_true",
+                        help="Stop on invalid values instead of scoring them as missing")
+    parser.add_argument("--drift", metavar="PATH",
+                        help="Save feature/score drift statistics of the scored rows to this JSON file")
+    parser.add_argument("--drift-reference", metavar="FILE",
+                        help="Reference statistics from the drift command (default: STATS_CONFIG)")
+    # --table / --table-only / --threshold (label_* 列的判定阈值) / --artifacts / --registry
+    add_model_arguments(parser)
+
+
+def run(args):
+    def report(rows, seconds):
+        print(f"{rows} rows, {rows / max(seconds, 1e-9):,.0f} rows/sec", file=sys.stderr)
+
+    scorer = scorer_from_args(args)
+    index = None
+    if args.neighbors:
+        from .neighbors import NeighborIndex
+        index = NeighborIndex.load(args.neighbors)
+        if not 1 <= args.k <= index.max_k:
+            raise SystemExit(f"--k must be between 1 and {index.max_k} for {args.neighbors}")
+    monitor = None
+    if args.drift:
+        from .drift import DriftMonitor, load_reference
+        monitor = DriftMonitor(load_reference(args.drift_reference) if args.drift_reference else None)
+    from .pipeline import DEFAULT_QUEUE_SIZE, run_pipeline
+
+    stats = run_pipeline(args.input, args.output, args.model, scorer, chunksize=args.chunksize,
+                         workers=args.workers, queue_size=args.queue_size or DEFAULT_QUEUE_SIZE,
+                         checkpoint=args.checkpoint, progress=report, explain=args.explain, interval=args.interval,
+                         strict=args.strict, neighbors=index, k=args.k, drift=monitor)
+    for col, n in stats['invalid'].items():
+        print(f"{col}: {n} invalid value(s) scored as missing", file=sys.stderr)
+    if stats['agreement']:
+        print(format_agreement(stats['agreement']), file=sys.stderr)
+    if monitor is not None:
+        from .drift import format_drift_alerts
+        monitor.save(args.drift)
+        for line in format_drift_alerts(monitor.report()):
+            print(line, file=sys.stderr)
+    resumed = f", resumed after {stats['resumed_rows']} rows" if stats['resumed_rows'] else ""
+    print(f"Scored {stats['rows']} rows in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_sec']:,.0f} rows/sec{resumed})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch cohort scoring (批量队列筛查)")
+    add_arguments(parser)
+    run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""双模型对比：同一批患者上两个模型的判定一致性与概率差异
+
+    agreement = Agreement('Logistic Regression', 'Random Forest')
+    for chunk in ...:
+        results = scorer.predict_models(chunk)        # 见 Scorer.predict_models
+        agreement.update(results)
+    agreement.summary()
+
+按块累加计数与求和 (不保留逐行数据)，可在流式批量任务中逐块更新，也可合并多个
+线程/进程的结果 (merge)。summary() 给出一致率、Cohen's kappa、2×2 交叉表、
+平均/最大概率差与概率的 Pearson 相关系数；only_a / only_b 为只有 models[0] / models[1]
+判为阳性的行数。
+"""
+import math
+
+import numpy as np
+
+
+class Agreement:
+    def __init__(self, model_a, model_b):
+        self.model_a = model_a
+        self.model_b = model_b
+        # 判定交叉表 [a 的标签][b 的标签]
+        self.table = np.zeros((2, 2), dtype=np.int64)
+        self.max_abs_diff = 0.0
+        # 概率的 sum a, sum b, sum a², sum b², sum ab, sum |a - b|
+        self._sums = np.zeros(6)
+
+    def update(self, results):
+        """results 为 {模型名称: predict_columns 的结果}，只使用两个概率均有效的行"""
+        a, b = results[self.model_a], results[self.model_b]
+        p, q = np.asarray(a['probability'], dtype=np.float64), np.asarray(b['probability'], dtype=np.float64)
+        la, lb = np.asarray(a['label']), np.asarray(b['label'])
+        valid = ~(np.isnan(p) | np.isnan(q))
+        if not valid.all():
+            p, q, la, lb = p[valid], q[valid], la[valid], lb[valid]
+        self.table += np.bincount(2 * la + lb, minlength=4).reshape(2, 2)
+        if len(p):
+            diff = np.abs(p - q)
+            self.max_abs_diff = max(self.max_abs_diff, float(diff.max()))
+            self._sums += [p.sum(), q.sum(), p @ p, q @ q, p @ q, diff.sum()]
+        return self
+
+    def merge(self, other):
+        self.table += other.table
+        self.max_abs_diff = max(self.max_abs_diff, other.max_abs_diff)
+        self._sums += other._sums
+        return self
+
+    @property
+    def rows(self):
+        return int(self.table.sum())
+
+    def summary(self):
+        """JSON 可写的统计字典 (无有效行时比例为 NaN)"""
+        n = self.rows
+        (neg, only_b), (only_a, pos) = self.table.tolist()
+        agree = neg + pos
+        observed = agree / n if n else math.nan
+        # 按两个模型各自的阳性率计算的期望一致率
+        a_pos, b_pos = (only_a + pos) / n if n else 0.0, (only_b + pos) / n if n else 0.0
+        expected = a_pos * b_pos + (1 - a_pos) * (1 - b_pos)
+        kappa = (observed - expected) / (1 - expected) if n and expected < 1 else math.nan
+        sa, sb, saa, sbb, sab, sdiff = self._sums.tolist()
+        correlation = math.nan
+        if n:
+            cov = sab - sa * sb / n
+            var = (saa - sa * sa / n) * (sbb - sb * sb / n)
+            correlation = cov / math.sqrt(var) if var > 0 else math.nan
+        return {
+            'models': [self.model_a, self.model_b],
+            'rows': n,
+            'agree': agree,
+            'disagree': only_a + only_b,
+            'agreement_rate': observed,
+            'kappa': kappa,
+            'both_positive': pos,
+            'both_negative': neg,
+            'only_a': only_a,
+            'only_b': only_b,
+            'positive_rate': {self.model_a: a_pos if n else math.nan, self.model_b: b_pos if n else math.nan},
+            'mean_abs_diff': sdiff / n if n else math.nan,
+            'max_abs_diff': self.max_abs_diff,
+            'correlation': correlation,
+        }
@@ -0,0 +1,343 @@
+"""离线评估：在自己的标注数据上重新计算分析页的 ROC/AUC、混淆矩阵、校准曲线与置信区间
+
+    python -m dysphagia evaluate labelled.csv --label dysphagia --output evaluation --workers 4
+
+输入按 batch.py 的方式分块读取、按 schema.py 校验、每块用 Scorer.predict_models 评分一次，
+只保留 (标签, 概率) 两列。每个模型排序一次，得到去重阈值上的累计 TP/FP
+(Curve)：ROC 与 AUC 由累计和直接得到，任意阈值的混淆矩阵是一次二分查找，
+不需要逐阈值重新比较整列。校准曲线为等宽分箱的 bincount。
+
+bootstrap 置信区间每次重抽样只做一次 bincount 得到各行的抽中次数，再按排序后的
+同分组 (np.add.reduceat) 汇总，AUC 与阈值处的指标都在同一遍中得到，无需重新排序。
+重抽样按固定大小的块分配随机种子 (SeedSequence.spawn)，--workers > 1 时由多个进程
+并行计算，结果与进程数无关。
+
+输出目录 (分析页存在时渲染交互图表，否则显示 assets/ 中的静态图片):
+    evaluation/report.json          各模型的指标 (键与 pickle 中的 metrics_on_test 一致)、
+                                    置信区间、校准分箱、按目标灵敏度推荐的阈值
+    evaluation/<模型子目录>.npz      去重阈值与累计 TP/FP，供界面按任意阈值重算混淆矩阵
+    evaluation/report.html          ROC、校准曲线、混淆矩阵与指标对比 (Plotly，离线查看)
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from .artifact import ARTIFACT_SUBDIRS
+from .features import MODEL_FEATURES
+
+EVALUATION_DIR = "evaluation"
+REPORT_FILE = "report.json"
+FIGURES_FILE = "report.html"
+DEFAULT_LABEL = "dysphagia"
+
+DEFAULT_BOOTSTRAP = 1000
+DEFAULT_LEVEL = 0.95
+CALIBRATION_BINS = 10
+
+# 每个随机种子负责的重抽样次数 (与进程数无关，保证结果可复现)
+BOOTSTRAP_BLOCK = 50
+
+# 默认推荐阈值的目标灵敏度 (筛查场景)
+DEFAULT_SENSITIVITIES = (0.8, 0.9, 0.95)
+
+# bootstrap 给出区间的指标
+CI_METRICS = ('AUC', 'Accuracy', 'Precision', 'Recall', 'Specificity', 'F1-score')
+
+
+def _ratio(a, b):
+    return a / b if b else float('nan')
+
+
+def _metrics(tn, fp, fn, tp):
+    """由混淆矩阵计数得到指标 (标量或按重抽样的数组均可)；分母为 0 时为 NaN"""
+    tn, fp, fn, tp = (np.asarray(v, dtype=np.float64) for v in (tn, fp, fn, tp))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        precision = tp / (tp + fp)
+        recall = tp / (tp + fn)
+        return {
+            'Accuracy': (tp + tn) / (tn + fp + fn + tp),
+            'Precision': precision,
+            'Recall': recall,
+            'Specificity': tn / (tn + fp),
+            'F1-score': 2 * tp / (2 * tp + fp + fn),
+        }
+
+
+class Curve:
+    """一个模型在标注数据上的排序统计：降序的去重阈值及其以上 (含) 的累计 TP/FP
+
+    标签规则与 Scorer 一致：概率 > threshold 判为阳性。
+    """
+
+    def __init__(self, thresholds, tps, fps, calibration=None):
+        self.thresholds = thresholds
+        self.tps = tps
+        self.fps = fps
+        self.positives = int(tps[-1]) if len(tps) else 0
+        self.negatives = int(fps[-1]) if len(fps) else 0
+        self.calibration = calibration
+
+    @classmethod
+    def from_scores(cls, y, p, bins=CALIBRATION_BINS):
+        curve, _, _ = cls._build(y, p, bins)
+        return curve
+
+    @classmethod
+    def _build(cls, y, p, bins):
+        """返回 (Curve, 按分数降序排列的标签, 各同分组的起始下标)"""
+        y = np.asarray(y, dtype=np.int8)
+        p = np.asarray(p, dtype=np.float64)
+        order = np.argsort(-p, kind='stable')
+        ys, ps = y[order], p[order]
+        ends = np.r_[np.flatnonzero(np.diff(ps)), len(ps) - 1] if len(ps) else np.zeros(0, dtype=np.int64)
+        tps = np.cumsum(ys, dtype=np.int64)[ends]
+        fps = ends + 1 - tps
+        starts = np.r_[0, ends[:-1] + 1] if len(ends) else ends
+        return cls(ps[ends], tps, fps, calibration_bins(y, p, bins)), ys, starts
+
+    def _above(self, threshold):
+        """概率 > threshold 的同分组个数"""
+        return int(np.searchsorted(-self.thresholds, -threshold, side='left'))
+
+    def roc(self):
+        """(fpr, tpr, thresholds)，从 (0, 0) 开始"""
+        tpr = np.r_[0.0, self.tps / self.positives] if self.positives else np.zeros(len(self.tps) + 1)
+        fpr = np.r_[0.0, self.fps / self.negatives] if self.negatives else np.zeros(len(self.fps) + 1)
+        return fpr, tpr, np.r_[np.inf, self.thresholds]
+
+    def auc(self):
+        if not self.positives or not self.negatives:
+            return float('nan')
+        fpr, tpr, _ = self.roc()
+        # 梯形面积直接求和 (np.trapezoid 需要 numpy >= 2.0)
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+    def confusion(self, threshold):
+        """[[TN, FP], [FN, TP]] (与 metrics_on_test 中 ConfusionMatrix 的排列相同)"""
+        k = self._above(threshold)
+        tp = int(self.tps[k - 1]) if k else 0
+        fp = int(self.fps[k - 1]) if k else 0
+        return [[self.negatives - fp, fp], [self.positives - tp, tp]]
+
+    def metrics(self, threshold):
+        """与 pickle 中 metrics_on_test 相同的键，外加 Threshold"""
+        (tn, fp), (fn, tp) = self.confusion(threshold)
+        result = {name: float(value) for name, value in _metrics(tn, fp, fn, tp).items()}
+        result['AUC'] = self.auc()
+        result['ConfusionMatrix'] = [[tn, fp], [fn, tp]]
+        result['Threshold'] = threshold
+        return result
+
+    def threshold_for_sensitivity(self, target):
+        """灵敏度不低于 target 时特异度最高的判定阈值；达不到时返回 None
+
+        返回值落在两个相邻去重分数之间，作为 --threshold / Scorer.thresholds 使用。
+        """
+        if not self.positives:
+            return None
+        k = int(np.searchsorted(self.tps, target * self.positives - 1e-9, side='left'))
+        if k >= len(self.thresholds):
+            return None
+        lower = self.thresholds[k + 1] if k + 1 < len(self.thresholds) else 0.0
+        return float((self.thresholds[k] + lower) / 2)
+
+    def save(self, path):
+        np.savez(path, thresholds=self.thresholds, tps=self.tps, fps=self.fps)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['thresholds'], data['tps'], data['fps'])
+
+
+def calibration_bins(y, p, bins=CALIBRATION_BINS):
+    """等宽分箱的 {'mean_predicted', 'observed', 'count'}，空箱为 NaN"""
+    index = np.minimum((np.asarray(p) * bins).astype(np.int64), bins - 1)
+    count = np.bincount(index, minlength=bins)
+    with np.errstate(invalid='ignore'):
+        mean_p = np.bincount(index, weights=p, minlength=bins) / count
+        observed = np.bincount(index, weights=y, minlength=bins) / count
+    return {'mean_predicted': mean_p.tolist(), 'observed': observed.tolist(), 'count': count.tolist()}
+
+
+# 工作进程中的 (排序后的标签, 同分组起始下标)，由 _init_bootstrap 设置
+_SHARED = None
+
+
+def _init_bootstrap(ys, starts):
+    global _SHARED
+    _SHARED = (ys, starts)
+
+
+def _bootstrap_block(seed, reps, above):
+    """在 _SHARED 上做 reps 次重抽样，返回 {指标: 数组}"""
+    ys, starts = _SHARED
+    n = len(ys)
+    rng = np.random.default_rng(seed)
+    out = {name: np.empty(reps) for name in CI_METRICS}
+    for r in range(reps):
+        counts = np.bincount(rng.integers(0, n, n), minlength=n)
+        pos = np.add.reduceat(counts * ys, starts)
+        neg = np.add.reduceat(counts, starts) - pos
+        P, N = pos.sum(), neg.sum()
+        # Mann-Whitney：每个阴性样本排在其上方的阳性数，同分算一半
+        above_pos = np.cumsum(pos) - pos
+        out['AUC'][r] = _ratio(float(np.dot(neg, above_pos + 0.5 * pos)), float(P) * float(N))
+        tp, fp = pos[:above].sum(), neg[:above].sum()
+        for name, value in _metrics(N - fp, fp, P - tp, tp).items():
+            out[name][r] = value
+    return out
+
+
+def bootstrap(y, p, threshold, reps=DEFAULT_BOOTSTRAP, level=DEFAULT_LEVEL, workers=1, seed=0):
+    """AUC 与阈值处各指标的百分位 bootstrap 区间 {指标: [下界, 上界]}"""
+    curve, ys, starts = Curve._build(y, p, CALIBRATION_BINS)
+    return _bootstrap(ys, starts, curve._above(threshold), reps, level, workers, seed)
+
+
+def _bootstrap(ys, starts, above, reps, level, workers, seed):
+    blocks = [min(BOOTSTRAP_BLOCK, reps - i) for i in range(0, reps, BOOTSTRAP_BLOCK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    if workers > 1 and len(blocks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(workers, initializer=_init_bootstrap, initargs=(ys, starts)) as pool:
+            parts = list(pool.map(_bootstrap_block, seeds, blocks, [above] * len(blocks)))
+    else:
+        _init_bootstrap(ys, starts)
+        parts = [_bootstrap_block(s, b, above) for s, b in zip(seeds, blocks)]
+    alpha = (1 - level) / 2
+    intervals = {}
+    for name in CI_METRICS:
+        values = np.concatenate([part[name] for part in parts])
+        values = values[~np.isnan(values)]
+        intervals[name] = (np.quantile(values, [alpha, 1 - alpha]).tolist() if len(values)
+                           else [float('nan'), float('nan')])
+    return intervals
+
+
+def read_labelled(source, model_names, scorer, label=DEFAULT_LABEL, chunksize=None, progress=None):
+    """分块评分标注数据，返回 (标签数组, {模型名称: 概率数组}, 统计)
+
+    标签缺失的行跳过；标签必须为 0/1 (或 True/False)，否则抛出 ValueError。
+    """
+    from .batch import DEFAULT_CHUNKSIZE, merge_counts, read_chunks, validate_chunk
+
+    labels, scores = [], {name: [] for name in model_names}
+    stats = {'rows': 0, 'skipped': 0, 'invalid': {}}
+    for chunk in read_chunks(source, chunksize or DEFAULT_CHUNKSIZE):
+        if label not in chunk.columns:
+            raise ValueError(f"Label column {label!r} not found; columns are {list(chunk.columns)}")
+        y = chunk[label].to_numpy(dtype=np.float64, na_value=np.nan)
+        keep = ~np.isnan(y)
+        bad = keep & (y != 0) & (y != 1)
+        if bad.any():
+            rows = (stats['rows'] + np.flatnonzero(bad)[:5]).tolist()
+            raise ValueError(f"Label column {label!r} must be 0/1: {int(bad.sum())} row(s), e.g. {rows}")
+        chunk, counts = validate_chunk(chunk, model_names, stats['rows'])
+        merge_counts(stats['invalid'], counts)
+        stats['rows'] += len(chunk)
+        stats['skipped'] += int((~keep).sum())
+        if not keep.all():
+            chunk = chunk[keep]
+        labels.append(y[keep].astype(np.int8))
+        for name, result in scorer.predict_models(chunk, model_names).items():
+            scores[name].append(result['probability'])
+        if progress is not None:
+            progress(stats['rows'])
+    y = np.concatenate(labels) if labels else np.zeros(0, dtype=np.int8)
+    return y, {name: np.concatenate(parts) if parts else np.zeros(0) for name, parts in scores.items()}, stats
+
+
+def evaluate(y, scores, thresholds, reps=DEFAULT_BOOTSTRAP, level=DEFAULT_LEVEL, workers=1, seed=0,
+             sensitivities=DEFAULT_SENSITIVITIES):
+    """返回 ({模型名称: Curve}, 报告字典)"""
+    curves, models = {}, {}
+    for name, p in scores.items():
+        curve, ys, starts = Curve._build(y, p, CALIBRATION_BINS)
+        threshold = thresholds[name]
+        entry = {
+            'n': int(len(y)),
+            'positives': curve.positives,
+            'metrics': curve.metrics(threshold),
+            'calibration': curve.calibration,
+            'thresholds_for_sensitivity': {str(s): curve.threshold_for_sensitivity(s) for s in sensitivities},
+        }
+        if reps:
+            entry['ci'] = _bootstrap(ys, starts, curve._above(threshold), reps, level, workers, seed)
+        curves[name] = curve
+        models[name] = entry
+    return curves, {'level': level, 'bootstrap': reps, 'models': models}
+
+
+def write_report(directory, curves, report):
+    os.makedirs(directory, exist_ok=True)
+    for name, curve in curves.items():
+        curve.save(os.path.join(directory, ARTIFACT_SUBDIRS[name] + ".npz"))
+    tmp = os.path.join(directory, REPORT_FILE + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(report, f, indent=2, default=float)
+    os.replace(tmp, os.path.join(directory, REPORT_FILE))
+
+
+def load_report(directory=EVALUATION_DIR):
+    """读取 write_report 的结果，返回 ({模型名称: Curve}, 报告字典)；不存在时返回 None"""
+    try:
+        with open(os.path.join(directory, REPORT_FILE)) as f:
+            report = json.load(f)
+    except FileNotFoundError:
+        return None
+    curves = {}
+    for name, entry in report['models'].items():
+        curve = Curve.load(os.path.join(directory, ARTIFACT_SUBDIRS[name] + ".npz"))
+        curve.calibration = entry['calibration']
+        curves[name] = curve
+    return curves, report
+
+
+def write_figures(path, curves, report):
+    from . import figures
+
+    thresholds = {name: entry['metrics']['Threshold'] for name, entry in report['models'].items()}
+    parts = [figures.roc_figure(curves, thresholds), figures.calibration_figure(curves),
+             figures.metrics_figure(report)]
+    parts += [figures.confusion_figure(curve.confusion(thresholds[name]), name) for name, curve in curves.items()]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<html><head><meta charset='utf-8'><title>Dysphagia model evaluation</title></head><body>\n")
+        for i, fig in enumerate(parts):
+            f.write(fig.to_html(full_html=False, include_plotlyjs='cdn' if i == 0 else False))
+        f.write("</body></html>\n")
+
+
+def run(args):
+    from .scoring import scorer_from_args
+
+    scorer = scorer_from_args(args)
+    model_names = args.model or [name for name in MODEL_FEATURES if scorer.available(name)]
+    start = time.perf_counter()
+    y, scores, stats = read_labelled(args.input, model_names, scorer, args.label, args.chunksize)
+    scored = time.perf_counter()
+    curves, report = evaluate(y, scores, scorer.thresholds, args.bootstrap, args.level, args.workers, args.seed,
+                              tuple(args.sensitivity or DEFAULT_SENSITIVITIES))
+    report.update(source=os.path.abspath(args.input), label=args.label, rows=stats['rows'],
+                  skipped=stats['skipped'], invalid=stats['invalid'],
+                  versions={name: scorer.versions.get(name) for name in model_names}, created=time.time())
+    write_report(args.output, curves, report)
+    write_figures(os.path.join(args.output, FIGURES_FILE), curves, report)
+    done = time.perf_counter()
+
+    for col, n in stats['invalid'].items():
+        print(f"{col}: {n} invalid value(s) scored as missing", file=sys.stderr)
+    for name, entry in report['models'].items():
+        m = entry['metrics']
+        ci = entry.get('ci', {}).get('AUC')
+        ci_text = f" [{ci[0]:.3f}, {ci[1]:.3f}]" if ci else ""
+        print(f"{name}: AUC {m['AUC']:.3f}{ci_text}, sensitivity {m['Recall']:.3f}, "
+              f"specificity {m['Specificity']:.3f} at threshold {m['Threshold']:.2f}")
+        for target, threshold in entry['thresholds_for_sensitivity'].items():
+            print(f"    sensitivity >= {target}: threshold {'n/a' if threshold is None else f'{threshold:.4f}'}")
+    print(f"{len(y)} labelled rows (skipped {stats['skipped']}); scored in {scored - start:.2f}s, "
+          f"evaluated in {done - scored:.2f}s -> {args.output}")
@@ -0,0 +1,270 @@
+"""逐患者解释：随机森林的精确 TreeSHAP 贡献，逻辑回归的 系数 × 标准化值
+
+随机森林 (FlatForest)：采用 path-dependent TreeSHAP 的定义 (与
+shap.TreeExplainer 的 tree_path_dependent 相同)，特征子集 S 的取值
+v(S) = 在 S 中的特征按患者取值走、其余特征按训练样本比例 (left_fraction) 加权
+两个子树的期望输出，贡献为 v 的精确 Shapley 值。
+
+补齐为满二叉树后，一棵深度 D 的树对某一行的全部信息就是 2^D - 1 个内部节点上
+向左/向右的判断，只有 2^(2^D - 1) 种组合 (深度 3 时 128 种)。加载时对每棵树的每种
+组合枚举特征子集算出贡献向量，存成 (树, 组合, 特征) 表；解释一批患者时只需算出
+每行每棵树的判断组合，再查表求和，整批一次向量化完成。
+
+更深的树 (D > MAX_EXPLAIN_DEPTH) 改用 Lundberg 等人的多项式时间 path-dependent
+TreeSHAP (Algorithm 2，每棵树 O(叶子数 × D^2))：沿每条根到叶子的路径维护各子集大小
+的权重，对一批行同时遍历整棵树 (每行只在"热"分支上 one_fraction 为 1)。
+
+    base + 贡献之和 = 阳性概率               (随机森林，space='probability')
+    base + 贡献之和 = logit                  (逻辑回归，space='logit')
+"""
+import math
+
+import numpy as np
+
+from .features import MODEL_FEATURES, unwrap_model
+
+# 判断组合表的大小为 2^(2^D - 1)，只对浅树预计算；更深的树逐批走 _PathShap
+MAX_EXPLAIN_DEPTH = 3
+
+# 每次解释的行数；查表中间结果大小为 (ROW_BLOCK, 树, 特征)
+ROW_BLOCK = 512
+
+
+def _tree_table(feature, left_fraction, padded, value, n_features):
+    """一棵补齐后的树：返回 (每种判断组合的贡献 (组合, 特征), 期望输出 v(∅))"""
+    n_nodes = len(feature)
+    depth = (n_nodes + 1).bit_length() - 1
+    used = sorted({int(f) for f, pad in zip(feature, padded) if not pad})
+    m = len(used)
+
+    patterns = np.arange(2 ** n_nodes)
+    go_right = (patterns[:, None] >> np.arange(n_nodes)) & 1           # (组合, 节点)
+    subsets = np.arange(2 ** m)
+    in_subset = (subsets[:, None] >> np.arange(m)) & 1                 # (子集, 特征)
+    column = np.array([used.index(f) if not pad else 0 for f, pad in zip(feature, padded)], dtype=np.intp)
+    # 补齐节点两侧子树取值相同，按患者判断 (总是向左) 即可
+    follows = np.where(padded[None, :], 1, in_subset[:, column]).astype(bool)  # (子集, 节点)
+
+    v = np.zeros((len(patterns), len(subsets)))
+    for leaf in range(2 ** depth):
+        weight = np.ones_like(v)
+        node = 0
+        for d in range(depth):
+            bit = (leaf >> (depth - 1 - d)) & 1
+            matched = (go_right[:, node] == bit).astype(np.float64)[:, None]
+            fraction = left_fraction[node] if bit == 0 else 1 - left_fraction[node]
+            weight *= np.where(follows[None, :, node], matched, fraction)
+            node = 2 * node + 1 + bit
+        v += value[leaf] * weight
+
+    phi = np.zeros((len(patterns), n_features))
+    sizes = np.array([bin(s).count('1') for s in subsets])
+    for i, f in enumerate(used):
+        without = subsets[(subsets >> i) & 1 == 0]
+        k = sizes[without]
+        weights = np.array([math.factorial(s) * math.factorial(m - s - 1) for s in k]) / math.factorial(m)
+        phi[:, f] = ((v[:, without | (1 << i)] - v[:, without]) * weights).sum(axis=1)
+    return phi, v[0, 0]
+
+
+class _PathShap:
+    """一棵补齐后的树上的多项式时间 TreeSHAP；路径上每个元素的 one_fraction / 权重是 (行,) 向量
+
+    路径元素为 [特征, zero_fraction, one_fraction, 权重]；zero_fraction 只取决于训练样本
+    比例，对所有行相同。补齐节点 (阈值 +inf) 两侧取值相同，直接跳到左子节点，不进入路径。
+    """
+
+    def __init__(self, feature, threshold, left_fraction, value, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left_fraction = left_fraction
+        self.value = value
+        self.n_internal = len(feature)
+        self.n_features = n_features
+
+    def expected_value(self):
+        """v(∅)：各叶子按训练样本比例加权的期望输出"""
+        reach = np.ones(1)
+        for d in range((self.n_internal + 1).bit_length() - 1):
+            left = self.left_fraction[2 ** d - 1:2 ** (d + 1) - 1]
+            reach = np.column_stack([reach * left, reach * (1 - left)]).ravel()
+        return float(reach @ self.value)
+
+    def explain(self, X):
+        self._X = X
+        self._phi = np.zeros((len(X), self.n_features))
+        ones = np.ones(len(X))
+        self._recurse(self._skip_padding(0), [], 1.0, ones, -1)
+        return self._phi
+
+    def _skip_padding(self, node):
+        while node < self.n_internal and not np.isfinite(self.threshold[node]):
+            node = 2 * node + 1
+        return node
+
+    def _recurse(self, node, path, zero, one, feature):
+        path = _extend(path, zero, one, feature)
+        if node >= self.n_internal:
+            value = self.value[node - self.n_internal]
+            for i in range(1, len(path)):
+                weight = _unwound_sum(path, i)
+                self._phi[:, path[i][0]] += weight * (path[i][2] - path[i][1]) * value
+            return
+        split = int(self.feature[node])
+        go_right = self._X[:, split] > self.threshold[node]
+        zero, one = 1.0, 1.0
+        # 同一特征在路径上再次出现时先撤销上一次，合并两段的比例
+        for k in range(1, len(path)):
+            if path[k][0] == split:
+                zero, one = path[k][1], path[k][2]
+                path = _unwind(path, k)
+                break
+        fraction = self.left_fraction[node]
+        self._recurse(self._skip_padding(2 * node + 1), path, zero * fraction, one * ~go_right, split)
+        self._recurse(self._skip_padding(2 * node + 2), path, zero * (1 - fraction), one * go_right, split)
+
+
+def _extend(path, zero, one, feature):
+    """路径末尾加入一个特征，更新各子集大小的权重 (返回新列表，不修改原路径)"""
+    depth = len(path)
+    path = [list(element) for element in path]
+    path.append([feature, zero, one, np.full(np.shape(one), 1.0 if depth == 0 else 0.0)])
+    for i in range(depth - 1, -1, -1):
+        path[i + 1][3] = path[i + 1][3] + one * path[i][3] * (i + 1) / (depth + 1)
+        path[i][3] = zero * path[i][3] * (depth - i) / (depth + 1)
+    return path
+
+
+def _unwind(path, k):
+    """_extend 的逆运算：从路径中移除第 k 个特征"""
+    depth = len(path) - 1
+    zero, one = path[k][1], path[k][2]
+    path = [list(element) for element in path]
+    total = path[depth][3]
+    hot = one != 0
+    safe_one = np.where(hot, one, 1.0)
+    for i in range(depth - 1, -1, -1):
+        previous = path[i][3]
+        weight_hot = total * (depth + 1) / ((i + 1) * safe_one)
+        path[i][3] = np.where(hot, weight_hot, previous * (depth + 1) / (zero * (depth - i)))
+        total = np.where(hot, previous - weight_hot * zero * (depth - i) / (depth + 1), total)
+    for i in range(k, depth):
+        path[i][:3] = path[i + 1][:3]
+    return path[:depth]
+
+
+def _unwound_sum(path, k):
+    """移除第 k 个特征后各子集大小权重之和 (不真正修改路径)"""
+    depth = len(path) - 1
+    zero, one = path[k][1], path[k][2]
+    hot = one != 0
+    safe_one = np.where(hot, one, 1.0)
+    total = path[depth][3]
+    result = np.zeros(np.shape(one))
+    for i in range(depth - 1, -1, -1):
+        weight_hot = total * (depth + 1) / ((i + 1) * safe_one)
+        result += np.where(hot, weight_hot, path[i][3] / zero * (depth + 1) / (depth - i))
+        total = path[i][3] - weight_hot * zero * (depth - i) / (depth + 1)
+    return result
+
+
+class ForestExplainer:
+    """FlatForest 的 TreeSHAP 贡献；浅树构建时预计算全部判断组合，深树逐批走 _PathShap"""
+
+    space = 'probability'
+
+    def __init__(self, forest):
+        if forest.left_fraction is None:
+            raise ValueError("Forest has no node cover (left_fraction); re-export it to enable explanations")
+        self.forest = forest
+        self.features = MODEL_FEATURES['Random Forest']
+        self.feature = forest.tree_major(forest.feature).astype(np.intp)
+        self.threshold = forest.tree_major(forest.threshold)
+        left_fraction = forest.tree_major(forest.left_fraction)
+        padded = ~np.isfinite(self.threshold)
+
+        n_trees, n_nodes = self.feature.shape
+        if forest.max_depth > MAX_EXPLAIN_DEPTH:
+            self._table = None
+            self._trees = [_PathShap(self.feature[t], self.threshold[t], left_fraction[t], forest.value[t],
+                                     len(self.features)) for t in range(n_trees)]
+            self.expected_value = float(np.mean([tree.expected_value() for tree in self._trees]))
+            return
+        n_patterns = 2 ** n_nodes
+        table = np.empty((n_trees, n_patterns, len(self.features)))
+        base = np.empty(n_trees)
+        for t in range(n_trees):
+            table[t], base[t] = _tree_table(self.feature[t], left_fraction[t], padded[t],
+                                            forest.value[t], len(self.features))
+        # 森林输出是各树的平均
+        self._table = (table / n_trees).reshape(n_trees * n_patterns, len(self.features))
+        self._tree_offset = np.arange(n_trees, dtype=np.intp)[None, :] * n_patterns
+        self._bits = np.left_shift(1, np.arange(n_nodes))
+        self.expected_value = float(base.mean())
+
+    def explain(self, X):
+        """返回贡献矩阵 (n, 特征数)；每行之和 + expected_value 等于 predict_proba[:, 1]"""
+        X = self.forest._prepare(X)
+        if self._table is None:
+            return sum(tree.explain(X) for tree in self._trees) / len(self._trees)
+        out = np.empty((len(X), len(self.features)))
+        for start in range(0, len(X), ROW_BLOCK):
+            block = X[start:start + ROW_BLOCK]
+            decisions = block[:, self.feature] > self.threshold           # (行, 树, 节点)
+            pattern = (decisions * self._bits).sum(axis=2)
+            out[start:start + len(block)] = self._table[self._tree_offset + pattern].sum(axis=1)
+        return out
+
+
+class LinearExplainer:
+    """FusedLogistic 的 系数 × 标准化值 (logit 空间)"""
+
+    space = 'logit'
+
+    def __init__(self, model):
+        self.model = model
+        self.features = MODEL_FEATURES['Logistic Regression']
+        # 折叠前的截距：coef · (x - center) + expected_value = logit
+        self.expected_value = float(model.intercept + model.coef @ model.center)
+
+    def explain(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if self.model.fill is not None and np.isnan(X).any():
+            X = np.where(np.isnan(X), self.model.fill, X)
+        return (X - self.model.center) * self.model.coef
+
+
+def make_explainer(model):
+    """按模型类型构建解释器；不支持的模型 (如未编译的 sklearn pipeline) 抛出 ValueError"""
+    from .forest import FlatForest
+    from .linear import FusedLogistic
+
+    if isinstance(model, FlatForest):
+        return ForestExplainer(model)
+    if isinstance(model, FusedLogistic):
+        return LinearExplainer(model)
+    raise ValueError(f"No explainer for {type(model).__name__}")
+
+
+def global_importances(loaded_object):
+    """sklearn 模型的全局重要性：逻辑回归取 coef_，随机森林取 feature_importances_
+
+    返回 numpy 数组；取不到时返回 None。
+    """
+    model, _ = unwrap_model(loaded_object)
+    if model is None:
+        return None
+    # 优先取名为 'clf' 的步骤，否则取 pipeline 最后一步，非 pipeline 时就是分类器本身
+    if hasattr(model, 'named_steps') and 'clf' in model.named_steps:
+        classifier = model.named_steps['clf']
+    elif hasattr(model, 'steps'):
+        classifier = model.steps[-1][1]
+    else:
+        classifier = model
+    if hasattr(classifier, 'coef_'):
+        return np.asarray(classifier.coef_[0], dtype=np.float64)
+    if hasattr(classifier, 'feature_importances_'):
+        return np.asarray(classifier.feature_importances_, dtype=np.float64)
+    return None
@@ -0,0 +1,143 @@
+# ================= 特征定义 (严格按照提供的顺序) =================
+
+# 逻辑回归 (10个特征)
+FEATURES_LR = [
+    'chewing',               # 1. 咀嚼障碍
+    'choking',               # 2. 呛咳史
+    'number_of_teeth',       # 3. 牙齿数量
+    'eating',                # 4. 进食情况
+    'age',                   # 5. 年龄
+    'weight',                # 6. 体重
+    'number_of_drug_types',  # 7. 药物种类数
+    'MMSE',                  # 8. 认知功能
+    'BMI',                   # 9. BMI
+    'frail'                  # 10. 衰弱状态
+]
+
+# 随机森林 (14个特征)
+FEATURES_RF = [
+    'chewing',               # 1
+    'choking',               # 2
+    'number_of_teeth',       # 3
+    'eating',                # 4
+    'age',                   # 5
+    'weight',                # 6
+    'number_of_drug_types',  # 7
+    'MMSE',                  # 8
+    'BMI',                   # 9
+    'frail',                 # 10
+    'kangningyao',           # 11. 抗凝药
+    'hight',                 # 12. 身高 (注意变量名是 hight)
+    'CVD',                   # 13. 脑血管疾病
+    'number_of_diseases'     # 14. 疾病种类数
+]
+
+# 模型名称 -> 特征列表
+MODEL_FEATURES = {
+    'Logistic Regression': FEATURES_LR,
+    'Random Forest': FEATURES_RF,
+}
+
+# 侧边栏控件的取值范围: 特征 -> (min_value, max_value, step)
+FEATURE_BOUNDS = {
+    'chewing':              (0, 1, 1),
+    'choking':              (0, 1, 1),
+    'number_of_teeth':      (0, 32, 1),
+    'eating':               (0, 2, 1),
+    'age':                  (20, 120, 1),
+    'weight':               (30.0, 150.0, 0.5),
+    'number_of_drug_types': (0, 20, 1),
+    'MMSE':                 (0, 2, 1),
+    'frail':                (0, 2, 1),
+    'kangningyao':          (0, 1, 1),
+    'hight':                (100, 220, 1),
+    'CVD':                  (0, 1, 1),
+    'number_of_diseases':   (0, 20, 1),
+}
+
+# 侧边栏表单的默认值
+FEATURE_DEFAULTS = {
+    'chewing': 0, 'choking': 0, 'number_of_teeth': 20, 'eating': 0, 'age': 75, 'weight': 60.0,
+    'number_of_drug_types': 3, 'MMSE': 0, 'frail': 0, 'kangningyao': 0, 'hight': 160, 'CVD': 0,
+    'number_of_diseases': 2,
+}
+
+# 分类特征的编码: 特征 -> {取值: 显示文字}
+_YES_NO = {0: "0: 无 (No)", 1: "1: 有 (Yes)"}
+FEATURE_CODES = {
+    'chewing':     _YES_NO,
+    'choking':     _YES_NO,
+    'eating':      {0: "0: 良好", 1: "1: 一般", 2: "2: 差"},
+    'MMSE':        {0: "0: 正常", 1: "1: 轻度障碍", 2: "2: 中度障碍"},  # 无重度(3)
+    'frail':       {0: "0: 无衰弱", 1: "1: 衰弱前期", 2: "2: 衰弱"},
+    'kangningyao': _YES_NO,
+    'CVD':         _YES_NO,
+}
+
+# 取值必须为整数的特征 (分类编码与计数)
+INTEGER_FEATURES = list(FEATURE_CODES) + ['number_of_teeth', 'number_of_drug_types', 'number_of_diseases']
+
+# 输入列名的别名 -> 模型中的列名 (匹配时不区分大小写)
+FEATURE_ALIASES = {
+    'height': 'hight',
+    'anticoagulant': 'kangningyao',
+    'teeth': 'number_of_teeth',
+    'drugs': 'number_of_drug_types',
+    'diseases': 'number_of_diseases',
+}
+
+# 逻辑回归中已知连续变量的标准化参数
+# 注意：如果 number_of_drug_types 等新变量需要标准化，请在此处添加对应的 mean/std
+STATS_CONFIG = {
+    'number_of_teeth': {'mean': 18.0,  'std': 9.299115},
+    'weight':          {'mean': 60.0,  'std': 9.572267},
+    'BMI':             {'mean': 23.0,  'std': 3.310996},
+    'age':             {'mean': 75.0,  'std': 7.154127}
+    # 如果需要对 number_of_drug_types 进行标准化，请取消注释并填入数值
+    # 'number_of_drug_types': {'mean': X.X, 'std': Y.Y},
+}
+
+# pickle 字典中可能存放模型的键 ('pipeline' 放在第一个)
+MODEL_KEYS = ['pipeline', 'model', 'classifier', 'clf', 'estimator']
+
+
+def manual_standardization(df):
+    """仅对逻辑回归中已知的连续变量进行标准化"""
+    df_scaled = df.copy()
+    for col, stats in STATS_CONFIG.items():
+        if col in df_scaled.columns:
+            df_scaled[col] = (df_scaled[col] - stats['mean']) / stats['std']
+    return df_scaled
+
+
+def compute_bmi(weight, hight):
+    """由体重 (kg) 与身高 (cm) 计算 BMI，标量或整列均可"""
+    return weight / ((hight / 100) ** 2)
+
+
+def sample_patients(n, seed=0):
+    """在侧边栏控件取值范围 (FEATURE_BOUNDS) 的网格上均匀抽样 n 名患者，返回 {特征: numpy 数组}
+
+    同一 seed 总是得到同一批患者 (不含 BMI)；供查找表校验、金丝雀批次与基准脚本使用。
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, (low, high, step) in FEATURE_BOUNDS.items():
+        steps = int(round((high - low) / step))
+        columns[name] = low + step * rng.integers(0, steps + 1, n)
+    return columns
+
+
+def unwrap_model(loaded_object):
+    """从 joblib 加载的对象中取出真正的模型，返回 (model, key)
+
+    如果加载的是字典，按 MODEL_KEYS 的顺序查找；找不到时返回 (None, None)。
+    """
+    if isinstance(loaded_object, dict):
+        for key in MODEL_KEYS:
+            if key in loaded_object:
+                return loaded_object[key], key
+        return None, None
+    return loaded_object, None
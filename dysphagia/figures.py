@@ -0,0 +1,138 @@
+"""界面中的 Plotly 图表 (app.py 与 benchmarks/ 共用)；导入本模块才会导入 plotly / pandas"""
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from .features import MODEL_FEATURES
+
+
+def gauge_figure(prob_pos, threshold=0.5):
+    """诊断结果的风险仪表盘；超过判定阈值显示红色，阈值处画一条刻度线"""
+    fig = go.Figure(go.Indicator(
+        mode = "gauge+number",
+        value = prob_pos * 100,
+        number = {'suffix': "%", 'valueformat': '.1f', 'font': {'color': "#000000"}},
+        title = {'text': "Dysphagia Risk", 'font': {'color': "#000000"}},
+        gauge = {
+            'axis': {'range': [None, 100]},
+            'bar': {'color': "#ef233c" if prob_pos > threshold else "#2a9d8f"},
+            'threshold': {'line': {'color': "#000000", 'width': 3}, 'thickness': 0.8, 'value': threshold * 100},
+        }
+    ))
+    fig.update_layout(height=280, margin=dict(t=30,b=10), paper_bgcolor="rgba(0,0,0,0)")
+    return fig
+
+
+def importance_figure(importances, model_name):
+    """全局重要性柱状图 (逻辑回归系数 / 随机森林 feature_importances_)"""
+    df_imp = pd.DataFrame({'Feature': MODEL_FEATURES[model_name], 'Value': importances})
+    df_imp['AbsValue'] = df_imp['Value'].abs()
+    df_imp = df_imp.sort_values(by='AbsValue', ascending=True)
+    fig_bar = px.bar(df_imp, x='Value', y='Feature', orientation='h',
+                     title=f"Feature Contribution ({model_name})",
+                     color='Value', color_continuous_scale='Viridis' if model_name == "Random Forest" else 'RdBu_r')
+    fig_bar.update_layout(font=dict(color="black"), plot_bgcolor="rgba(0,0,0,0)")
+    return fig_bar
+
+
+def explanation_figure(explanation, model_name):
+    """单个患者的特征贡献：随机森林为概率 (TreeSHAP)，逻辑回归为 logit (系数 × 标准化值)"""
+    df_exp = pd.DataFrame({'Feature': list(explanation['contributions']),
+                           'Contribution': list(explanation['contributions'].values())})
+    df_exp = df_exp.reindex(df_exp['Contribution'].abs().sort_values().index)
+    base = explanation['base']
+    total = base + df_exp['Contribution'].sum()
+    unit = "probability" if explanation['space'] == 'probability' else "log-odds"
+    fig = px.bar(df_exp, x='Contribution', y='Feature', orientation='h',
+                 title=f"{model_name}: baseline {base:.3f} → {total:.3f} ({unit})",
+                 color='Contribution', color_continuous_scale='RdBu_r', color_continuous_midpoint=0)
+    fig.update_layout(font=dict(color="black"), plot_bgcolor="rgba(0,0,0,0)")
+    return fig
+
+
+# ROC 曲线最多绘制的点数 (连续分数的去重阈值可达数百万个)
+MAX_CURVE_POINTS = 2000
+
+
+def _thin(*arrays):
+    import numpy as np
+
+    n = len(arrays[0])
+    if n <= MAX_CURVE_POINTS:
+        return arrays
+    index = np.unique(np.linspace(0, n - 1, MAX_CURVE_POINTS).astype(int))
+    return tuple(a[index] for a in arrays)
+
+
+def roc_figure(curves, thresholds):
+    """各模型的 ROC 曲线 (evaluate.Curve)，并标出当前判定阈值处的工作点"""
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=[0, 1], y=[0, 1], mode='lines', line=dict(dash='dash', color='gray'),
+                             showlegend=False, hoverinfo='skip'))
+    for name, curve in curves.items():
+        fpr, tpr, cut = _thin(*curve.roc())
+        fig.add_trace(go.Scatter(x=fpr, y=tpr, mode='lines', name=f"{name} (AUC {curve.auc():.3f})",
+                                 customdata=cut, hovertemplate="threshold %{customdata:.3f}<br>"
+                                                               "FPR %{x:.3f}, TPR %{y:.3f}<extra></extra>"))
+        (tn, fp), (fn, tp) = curve.confusion(thresholds[name])
+        fig.add_trace(go.Scatter(x=[fp / max(tn + fp, 1)], y=[tp / max(tp + fn, 1)], mode='markers',
+                                 marker=dict(size=10, symbol='x'), name=f"{name} @ {thresholds[name]:.2f}"))
+    fig.update_layout(title="ROC Curve", xaxis_title="1 - Specificity", yaxis_title="Sensitivity",
+                      font=dict(color="black"), plot_bgcolor="rgba(0,0,0,0)", height=420)
+    return fig
+
+
+def calibration_figure(curves):
+    """校准曲线：各分箱的平均预测概率与实际阳性比例"""
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=[0, 1], y=[0, 1], mode='lines', line=dict(dash='dash', color='gray'),
+                             showlegend=False, hoverinfo='skip'))
+    for name, curve in curves.items():
+        bins = curve.calibration
+        fig.add_trace(go.Scatter(x=bins['mean_predicted'], y=bins['observed'], mode='lines+markers', name=name,
+                                 customdata=bins['count'],
+                                 hovertemplate="predicted %{x:.3f}<br>observed %{y:.3f}<br>n=%{customdata}<extra></extra>"))
+    fig.update_layout(title="Calibration", xaxis_title="Mean predicted probability",
+                      yaxis_title="Observed positive rate", font=dict(color="black"),
+                      plot_bgcolor="rgba(0,0,0,0)", height=420)
+    return fig
+
+
+def confusion_figure(matrix, model_name):
+    """混淆矩阵 [[TN, FP], [FN, TP]] 热图"""
+    fig = px.imshow(matrix, text_auto=True, color_continuous_scale='Blues',
+                    x=["Predicted 0", "Predicted 1"], y=["Actual 0", "Actual 1"],
+                    title=f"Confusion Matrix ({model_name})")
+    fig.update_layout(font=dict(color="black"), coloraxis_showscale=False, height=380)
+    return fig
+
+
+def metrics_figure(report, metrics=('AUC', 'Accuracy', 'Precision', 'Recall', 'Specificity', 'F1-score')):
+    """各模型的指标柱状图；report (evaluate.py) 含 bootstrap 区间时画误差线"""
+    fig = go.Figure()
+    for name, entry in report['models'].items():
+        values = [entry['metrics'][m] for m in metrics]
+        trace = dict(x=list(metrics), y=values, name=name, text=[f"{v:.3f}" for v in values])
+        ci = entry.get('ci')
+        if ci:
+            trace['error_y'] = dict(type='data', symmetric=False,
+                                    array=[ci[m][1] - v for m, v in zip(metrics, values)],
+                                    arrayminus=[v - ci[m][0] for m, v in zip(metrics, values)])
+        fig.add_trace(go.Bar(**trace))
+    level = f" ({report['level']:.0%} bootstrap CI)" if report.get('bootstrap') else ""
+    fig.update_layout(title=f"Metrics Comparison{level}", barmode='group', yaxis_range=[0, 1.05],
+                      font=dict(color="black"), plot_bgcolor="rgba(0,0,0,0)", height=420)
+    return fig
+
+
+def drift_figure(edges, observed, expected, name):
+    """一列的观察分布与参考分布 (drift.DriftMonitor.histogram)；比例含两端的越界箱"""
+    labels = [f"< {edges[0]:g}"] + [f"{a:g}–{b:g}" for a, b in zip(edges[:-1], edges[1:])] + [f"> {edges[-1]:g}"]
+    fig = go.Figure()
+    if observed is not None:
+        fig.add_trace(go.Bar(x=labels, y=observed, name="Observed (当前)"))
+    if expected is not None:
+        fig.add_trace(go.Scatter(x=labels, y=expected, mode='lines+markers', name="Reference (参考)"))
+    fig.update_layout(title=f"Distribution: {name}", yaxis_title="Proportion", barmode='overlay',
+                      font=dict(color="black"), plot_bgcolor="rgba(0,0,0,0)", height=360)
+    return fig
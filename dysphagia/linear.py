@@ -0,0 +1,98 @@
+"""逻辑回归快速路径：把 manual_standardization 与 pipeline 中的预处理折叠进系数
+
+加载时只做一次:
+    z_j   = (x_j - mean_j) / std_j          (STATS_CONFIG，即 manual_standardization)
+    logit = w · z + b
+  = (w / std) · x + (b - Σ w_j mean_j / std_j)
+
+之后概率只需一次矩阵乘法加 sigmoid，直接接受未标准化的原始特征。
+"""
+import numpy as np
+
+from .features import FEATURES_LR, STATS_CONFIG, unwrap_model
+
+
+class DoubleStandardizationError(ValueError):
+    """pipeline 内已有 StandardScaler，再叠加 manual_standardization 会二次标准化"""
+
+
+class FusedLogistic:
+    """折叠了标准化与缺失值填充的逻辑回归；输入为原始 (未标准化) 特征矩阵"""
+
+    # Scorer 据此跳过 feature_matrix 中的标准化
+    fused_standardization = True
+
+    def __init__(self, coef, intercept, fill=None, source=None, center=None):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.fill = None if fill is None else np.asarray(fill, dtype=np.float64)
+        # 标准化空间的原点 (原始单位)：coef * (x - center) 即 系数 × 标准化值
+        self.center = np.zeros_like(self.coef) if center is None else np.asarray(center, dtype=np.float64)
+        self.n_features_in_ = len(self.coef)
+        # 折叠前的原始参数 (coef, intercept, steps)，供 artifact.py 导出
+        self.source = source
+
+    @classmethod
+    def from_model(cls, model, features=FEATURES_LR, stats=STATS_CONFIG):
+        """从 sklearn 模型 (或 load_models() 得到的字典) 提取并折叠参数"""
+        model, _ = unwrap_model(model)
+        steps = [step for _, step in model.steps] if hasattr(model, 'steps') else [model]
+        clf = steps[-1]
+        if not hasattr(clf, 'coef_') or clf.coef_.shape[0] != 1:
+            raise ValueError(f"Not a fitted binary linear model: {type(clf).__name__}")
+        if list(clf.classes_) != [0, 1]:
+            raise ValueError(f"Expected binary classes [0, 1], got {list(clf.classes_)}")
+
+        params = []
+        for step in steps[:-1]:
+            kind = type(step).__name__
+            if kind == 'SimpleImputer' and not getattr(step, 'add_indicator', False):
+                params.append(('impute', np.asarray(step.statistics_, dtype=np.float64)))
+            elif kind == 'StandardScaler':
+                mean = step.mean_ if step.with_mean else np.zeros(len(features))
+                std = step.scale_ if step.with_std else np.ones(len(features))
+                params.append(('scale', np.asarray(mean, dtype=np.float64), np.asarray(std, dtype=np.float64)))
+            else:
+                raise ValueError(f"Unsupported pipeline step: {kind}")
+        return cls.from_params(clf.coef_[0], clf.intercept_[0], params, features, stats)
+
+    @classmethod
+    def from_params(cls, coef, intercept, steps=(), features=FEATURES_LR, stats=STATS_CONFIG):
+        """由原始参数折叠；steps 依次为 ('impute', statistics) 或 ('scale', mean, std)"""
+        # 当前空间 z = (x - shift) * scale，从 manual_standardization 开始逐步累积
+        shift = np.array([stats[col]['mean'] if col in stats else 0.0 for col in features])
+        scale = np.array([1 / stats[col]['std'] if col in stats else 1.0 for col in features])
+        fill = None
+        for step in steps:
+            if step[0] == 'impute':
+                # 填充值换算回原始空间
+                fill = step[1] / scale + shift
+            elif step[0] == 'scale':
+                if any(col in stats for col in features):
+                    raise DoubleStandardizationError(
+                        "Pipeline already contains a StandardScaler; manual_standardization "
+                        f"would standardize {[c for c in features if c in stats]} twice")
+                shift = shift + step[1] / scale
+                scale = scale / step[2]
+            else:
+                raise ValueError(f"Unsupported pipeline step: {step[0]}")
+
+        w = np.asarray(coef, dtype=np.float64)
+        source = {'coef': w, 'intercept': float(intercept), 'steps': list(steps)}
+        return cls(w * scale, intercept - np.sum(w * scale * shift), fill, source, shift)
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if self.fill is not None and np.isnan(X).any():
+            X = np.where(np.isnan(X), self.fill, X)
+        return X @ self.coef + self.intercept
+
+    def predict_proba(self, X):
+        with np.errstate(over='ignore'):
+            p = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return (self.decision_function(X) > 0).astype(np.int64)
@@ -0,0 +1,199 @@
+"""随机森林风险查找表：离线枚举输入空间，在线 O(1) 查表，无需 sklearn
+
+    python -m dysphagia build-table --output risk_table
+
+树模型的输出只取决于每个特征落在哪两个分裂阈值之间，因此把各特征在控件
+取值范围 (FEATURE_BOUNDS) 内的阈值作为分箱边界，所有分箱的笛卡尔积就是全部
+可能的输出。每个格子取一个代表点评分一次，按混合进制 (mixed-radix) 编号存成
+一维 float16 数组。体重、身高、BMI 这类连续变量同样按阈值分箱，格内输出恒定，
+查表结果与模型逐位一致 (只有 float16 的量化误差)，不需要插值。
+
+目录结构:
+    table.npy    (格子数,) 概率，np.load(mmap_mode='r') 按需映射
+    meta.json    特征顺序、每个特征的分箱边界、取值范围、缺失值填充值、模型哈希
+"""
+import json
+import os
+
+import numpy as np
+
+from .features import FEATURE_BOUNDS, FEATURES_RF, compute_bmi, sample_patients
+
+TABLE_FILE = "table.npy"
+META_FILE = "meta.json"
+FORMAT_VERSION = 1
+
+# 模型名称 -> 默认的查找表目录
+TABLE_DIRS = {
+    'Random Forest': "risk_table",
+}
+
+# 超过该格子数时拒绝构建 (float16 下约 512 MB)
+MAX_CELLS = 1 << 28
+
+# 构建时每批评分的格子数
+BUILD_CHUNK = 1 << 18
+
+
+def feature_ranges(features=FEATURES_RF):
+    """每个特征的 (最小值, 最大值)；BMI 由体重与身高的范围推导"""
+    ranges = {name: (low, high) for name, (low, high, _) in FEATURE_BOUNDS.items()}
+    w_low, w_high = ranges['weight']
+    h_low, h_high = ranges['hight']
+    ranges['BMI'] = (compute_bmi(w_low, h_high), compute_bmi(w_high, h_low))
+    return [ranges[name] for name in features]
+
+
+def _representatives(edges, low):
+    """每个分箱内的一个代表点 (float32 可精确表示)，分箱 k 为 (edges[k-1], edges[k]]"""
+    reps = []
+    for edge in edges:
+        rep = np.float32(edge)
+        if rep > edge:
+            rep = np.nextafter(rep, np.float32(-np.inf))
+        reps.append(rep)
+    last = np.float32(edges[-1]) if len(edges) else np.float32(low)
+    if len(edges) and last <= edges[-1]:
+        last = np.nextafter(last, np.float32(np.inf))
+    reps.append(last)
+    reps = np.asarray(reps, dtype=np.float64)
+    if not (np.searchsorted(edges, reps, side='left') == np.arange(len(reps))).all():
+        raise ValueError("Could not find a float32 representative inside every bin")
+    return reps
+
+
+class RiskTable:
+    def __init__(self, table, edges, ranges, features=FEATURES_RF, impute=None, model_hash=None):
+        self.table = table
+        self.edges = [np.asarray(e, dtype=np.float64) for e in edges]
+        self.ranges = np.asarray(ranges, dtype=np.float64)
+        self.features = list(features)
+        self.impute = None if impute is None else np.asarray(impute, dtype=np.float64)
+        self.model_hash = model_hash
+        self.radix = np.array([len(e) + 1 for e in self.edges], dtype=np.int64)
+        # 混合进制：最后一个特征变化最快
+        self.strides = np.concatenate([np.cumprod(self.radix[::-1])[::-1][1:], [1]]).astype(np.int64)
+
+    @property
+    def n_cells(self):
+        return int(np.prod(self.radix))
+
+    @classmethod
+    def build(cls, flat_forest, model_hash=None, dtype=np.float16):
+        """由 FlatForest 的分裂阈值构建查找表，并对每个格子的代表点评分"""
+        ranges = feature_ranges()
+        edges = []
+        for j, (low, high) in enumerate(ranges):
+            thresholds = flat_forest.threshold[flat_forest.feature == j]
+            thresholds = np.unique(thresholds[np.isfinite(thresholds)])
+            edges.append(thresholds[(thresholds >= low) & (thresholds < high)])
+
+        table = cls(None, edges, ranges, impute=flat_forest.impute, model_hash=model_hash)
+        if table.n_cells > MAX_CELLS:
+            raise ValueError(f"Lookup table would need {table.n_cells} cells (> {MAX_CELLS})")
+        reps = [_representatives(e, low) for e, (low, _) in zip(edges, ranges)]
+
+        values = np.empty(table.n_cells, dtype=dtype)
+        for start in range(0, table.n_cells, BUILD_CHUNK):
+            index = np.arange(start, min(start + BUILD_CHUNK, table.n_cells), dtype=np.int64)
+            X = np.column_stack([rep[(index // stride) % radix]
+                                 for rep, stride, radix in zip(reps, table.strides, table.radix)])
+            values[start:start + len(index)] = flat_forest.predict_proba(X)[:, 1]
+        table.table = values
+        return table
+
+    def cell_index(self, X):
+        """返回每行的格子编号；超出取值范围的行返回 -1"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if self.impute is not None and np.isnan(X).any():
+            X = np.where(np.isnan(X), self.impute, X)
+        inside = ((X >= self.ranges[:, 0]) & (X <= self.ranges[:, 1])).all(axis=1)
+        # 与 FlatForest 相同：先转为 float32 再与阈值比较
+        X32 = X.astype(np.float32).astype(np.float64)
+        index = np.zeros(len(X), dtype=np.int64)
+        for j, (edges, stride) in enumerate(zip(self.edges, self.strides)):
+            # 落在 (edges[k-1], edges[k]] 的值属于分箱 k
+            index += np.searchsorted(edges, X32[:, j], side='left') * stride
+        return np.where(inside, index, -1)
+
+    def lookup(self, X):
+        """返回阳性概率；超出取值范围的行为 NaN (由调用方退回实时模型)"""
+        index = self.cell_index(X)
+        out = np.full(len(index), np.nan)
+        valid = index >= 0
+        out[valid] = self.table[index[valid]]
+        return out
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, TABLE_FILE), self.table)
+        meta = {
+            'format_version': FORMAT_VERSION,
+            'features': self.features,
+            'edges': [e.tolist() for e in self.edges],
+            'ranges': self.ranges.tolist(),
+            'impute': None if self.impute is None else self.impute.tolist(),
+            'model_hash': self.model_hash,
+            'dtype': str(self.table.dtype),
+        }
+        with open(os.path.join(directory, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, directory):
+        """加载查找表；概率数组以只读方式内存映射"""
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        if meta['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported lookup table format: {meta['format_version']}")
+        table = np.load(os.path.join(directory, TABLE_FILE), mmap_mode='r')
+        return cls(table, meta['edges'], meta['ranges'], meta['features'], meta['impute'], meta['model_hash'])
+
+    def validate(self, model, n=100_000, seed=0):
+        """在取值范围内随机抽样，与实时模型 (sklearn pipeline 或 FlatForest) 对比"""
+        columns = sample_patients(n, seed)
+        columns['BMI'] = compute_bmi(columns['weight'], columns['hight'])
+        X = np.column_stack([columns[name] for name in self.features]).astype(np.float64)
+        live = model.predict_proba(X)[:, 1]
+        table = self.lookup(X)
+        error = np.abs(live - table)
+        return {
+            'samples': n,
+            'cells': self.n_cells,
+            'max_abs_error': float(error.max()),
+            'mean_abs_error': float(error.mean()),
+            'label_mismatches': int(((live > 0.5) != (table > 0.5)).sum()),
+        }
+
+
+def load_tables(table_dirs=None):
+    """加载存在的查找表 {模型名称: RiskTable}；目录不存在的模型跳过"""
+    tables = {}
+    for name, directory in (table_dirs or TABLE_DIRS).items():
+        if os.path.exists(os.path.join(directory, META_FILE)):
+            tables[name] = RiskTable.load(directory)
+    return tables
+
+
+def run(args):
+    import warnings
+
+    import joblib
+
+    from .features import unwrap_model
+    from .forest import FlatForest
+    from .models import file_hash
+
+    pipeline, _ = unwrap_model(joblib.load(args.model))
+    table = RiskTable.build(FlatForest.from_model(pipeline), file_hash(args.model), np.dtype(args.dtype))
+    table.save(args.output)
+    with warnings.catch_warnings():
+        # 校验直接用 numpy 矩阵调用 sklearn pipeline
+        warnings.simplefilter('ignore', UserWarning)
+        report = table.validate(pipeline, args.validate)
+    with open(os.path.join(args.output, "validation.json"), 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"{table.n_cells} cells ({table.table.nbytes / 1024:.0f} KB) -> {args.output}")
+    print(json.dumps(report))
@@ -0,0 +1,44 @@
+import hashlib
+import warnings
+
+# 模型名称 -> pickle 文件
+MODEL_FILES = {
+    'Logistic Regression': "logistic_model.pkl",
+    'Random Forest': "random_forest_model.pkl",
+}
+
+
+def load_models(model_files=None):
+    """加载全部模型；文件缺失或无法反序列化的模型记为 None (后者给出警告和原因)"""
+    import joblib
+
+    models = {}
+    for name, path in (model_files or MODEL_FILES).items():
+        try:
+            models[name] = joblib.load(path)
+        except FileNotFoundError:
+            models[name] = None
+        except Exception as exc:
+            warnings.warn(f"Could not unpickle {name} from {path}: {type(exc).__name__}: {exc}")
+            models[name] = None
+    return models
+
+
+def file_hash(path, length=12):
+    """模型文件内容的 sha256 前缀，作为缓存键中的模型版本"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+def model_hashes(model_files=None):
+    """{模型名称: 文件哈希}，文件不存在的模型记为 None"""
+    hashes = {}
+    for name, path in (model_files or MODEL_FILES).items():
+        try:
+            hashes[name] = file_hash(path)
+        except OSError:
+            hashes[name] = None
+    return hashes
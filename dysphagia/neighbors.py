@@ -0,0 +1,361 @@
+"""相似患者检索：参考队列上的 KD 树，离线构建、内存映射加载、精确 k 近邻
+
+    python -m dysphagia build-neighbors cohort.csv --label dysphagia --output neighbors
+    python -m dysphagia batch cohort.csv scored.csv --neighbors neighbors --k 5
+    python -m dysphagia serve --neighbors neighbors     # 请求中加 "neighbors": 5
+
+距离为 FEATURES_RF 标准化空间中的欧氏距离：STATS_CONFIG 中的连续变量使用
+manual_standardization 的均值/标准差，其余特征使用构建时参考队列的均值/标准差
+(记录在 meta.json 中)。缺失值按均值 (标准化后为 0) 处理。
+
+目录格式与 artifact.py 相同 (meta.json + .npy，np.load(mmap_mode='r') 只读映射):
+    points.npy     (n, 14) float32   按树的叶子顺序排列的标准化特征
+    rows.npy       (n,)    int64     在参考队列文件中的行号 (从 0 起的数据行)
+    outcome.npy    (n,)    int8      结局标签 (未给出时为 -1)
+    lo / hi.npy    (节点, 14)        各节点的包围盒，用于剪枝
+    leaf_start.npy (叶子 + 1,)       各叶子在 points 中的起止位置
+
+树是深度为 D 的满二叉树 (节点 i 的子节点为 2i+1 / 2i+2)，每次在取值跨度最大的特征上
+按中位数切分，叶子各含 leaf_size/2 ~ leaf_size 个点。查询对一批患者向量化进行：先在
+各自落入的叶子中取 k 个最近点得到半径上界，再逐层只展开包围盒下界小于该半径的
+(患者, 节点) 对，最后在剩余叶子中精确计算距离。结果与暴力扫描一致，单个患者只访问
+少数节点，批量模式没有逐患者的 Python 循环。
+"""
+import json
+import math
+import os
+
+import numpy as np
+
+from .features import FEATURES_RF, STATS_CONFIG, compute_bmi
+
+NEIGHBORS_DIR = "neighbors"
+META_FILE = "meta.json"
+FORMAT_VERSION = 1
+
+DEFAULT_LEAF_SIZE = 64
+DEFAULT_K = 5
+
+# 每次查询的患者数与逐对取点时每次处理的 (患者, 叶子) 对数，限制临时数组大小
+QUERY_BLOCK = 2048
+PAIR_BLOCK = 4096
+
+# 平均每个叶子被至少这么多患者访问时按叶子分组计算距离 (见 NeighborIndex._scan)
+GROUP_MIN_PAIRS = 4
+
+UNKNOWN_OUTCOME = -1
+
+
+def standardization(columns, features=FEATURES_RF):
+    """(均值, 标准差) 向量：STATS_CONFIG 中的特征用固定参数，其余按 columns 计算"""
+    mean = np.zeros(len(features))
+    std = np.ones(len(features))
+    for j, col in enumerate(features):
+        if col in STATS_CONFIG:
+            mean[j], std[j] = STATS_CONFIG[col]['mean'], STATS_CONFIG[col]['std']
+        else:
+            values = np.asarray(columns[col], dtype=np.float64)
+            if np.isfinite(values).any():
+                mean[j] = np.nanmean(values)
+                std[j] = np.nanstd(values) or 1.0
+    return mean, std
+
+
+def _raw(columns, features):
+    """按特征顺序的 float64 矩阵；提供 weight 与 hight 时 BMI 由二者推导 (与 feature_matrix 一致)，
+    没有的特征列 (例如只按逻辑回归的特征校验过的患者) 为 NaN"""
+    n = len(columns[next(iter(columns))])
+    X = np.full((n, len(features)), np.nan)
+    derive = 'weight' in columns and 'hight' in columns
+    for j, col in enumerate(features):
+        if col == 'BMI' and derive:
+            X[:, j] = compute_bmi(np.asarray(columns['weight'], dtype=np.float64),
+                                  np.asarray(columns['hight'], dtype=np.float64))
+        elif col in columns:
+            X[:, j] = np.asarray(columns[col], dtype=np.float64)
+    return X
+
+
+def _box_bound(Z, lo, hi):
+    """各行到对应包围盒的最小平方距离"""
+    gap = np.maximum(lo - Z, 0) + np.maximum(Z - hi, 0)
+    return np.einsum('ij,ij->i', gap, gap)
+
+
+class NeighborIndex:
+    def __init__(self, arrays, meta):
+        # np.asarray 去掉 np.memmap 子类 (仍是同一段只读映射)，查询中大量的小切片不再经过 memmap.__getitem__
+        self.points = np.asarray(arrays['points'])
+        self.rows = np.asarray(arrays['rows'])
+        self.outcome = np.asarray(arrays['outcome'])
+        self.lo = np.asarray(arrays['lo'])
+        self.hi = np.asarray(arrays['hi'])
+        self.leaf_start = np.asarray(arrays['leaf_start'])
+        self.mean = np.asarray(meta['mean'])
+        self.std = np.asarray(meta['std'])
+        self.features = meta['features']
+        self.depth = meta['depth']
+        self.meta = meta
+        # 最小的叶子决定一次查询的 k 上限
+        sizes = np.diff(self.leaf_start)
+        self.max_k = int(sizes.min()) if len(sizes) else 0
+        self._leaf_width = int(sizes.max()) if len(sizes) else 0
+
+    def __len__(self):
+        return len(self.points)
+
+    # ---------- 构建 ----------
+
+    @classmethod
+    def build(cls, columns, outcome=None, leaf_size=DEFAULT_LEAF_SIZE, source=None):
+        """由参考队列 (DataFrame 或 {特征: 数组}) 构建索引；outcome 为 0/1 数组或 None"""
+        features = list(FEATURES_RF)
+        raw = _raw(columns, features)
+        mean, std = standardization(columns, features)
+        Z = np.nan_to_num((raw - mean) / std, nan=0.0).astype(np.float32)
+        n, d = Z.shape
+        if n == 0:
+            raise ValueError("Reference cohort is empty")
+        depth = max(0, math.ceil(math.log2(n / leaf_size))) if n > leaf_size else 0
+        n_nodes = 2 ** (depth + 1) - 1
+        first_leaf = 2 ** depth - 1
+
+        order = np.arange(n)
+        start = np.zeros(n_nodes, dtype=np.int64)
+        end = np.zeros(n_nodes, dtype=np.int64)
+        end[0] = n
+        lo = np.empty((n_nodes, d), dtype=np.float32)
+        hi = np.empty((n_nodes, d), dtype=np.float32)
+        for node in range(n_nodes):
+            s, e = start[node], end[node]
+            block = Z[order[s:e]]
+            lo[node], hi[node] = block.min(axis=0), block.max(axis=0)
+            if node >= first_leaf:
+                continue
+            dim = int(np.argmax(hi[node] - lo[node]))
+            mid = (s + e) // 2
+            part = np.argpartition(block[:, dim], mid - s)
+            order[s:e] = order[s:e][part]
+            start[2 * node + 1], end[2 * node + 1] = s, mid
+            start[2 * node + 2], end[2 * node + 2] = mid, e
+
+        if outcome is None:
+            outcome = np.full(n, UNKNOWN_OUTCOME, dtype=np.int8)
+        outcome = np.asarray(outcome, dtype=np.float64)
+        arrays = {
+            'points': np.ascontiguousarray(Z[order]),
+            'rows': order.astype(np.int64),
+            'outcome': np.where(np.isnan(outcome), UNKNOWN_OUTCOME, outcome).astype(np.int8)[order],
+            'lo': lo,
+            'hi': hi,
+            'leaf_start': np.r_[start[first_leaf:], n].astype(np.int64),
+        }
+        meta = {
+            'format_version': FORMAT_VERSION,
+            'kind': 'kd_tree',
+            'features': features,
+            'mean': mean.tolist(),
+            'std': std.tolist(),
+            'depth': depth,
+            'leaf_size': leaf_size,
+            'rows': n,
+            'positives': int((arrays['outcome'] == 1).sum()),
+            'source': source,
+        }
+        return cls(arrays, meta)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        arrays = {name: getattr(self, name) for name in ('points', 'rows', 'outcome', 'lo', 'hi', 'leaf_start')}
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, name + ".npy"), np.ascontiguousarray(array))
+        meta = dict(self.meta, arrays={name: {'dtype': str(a.dtype), 'shape': list(a.shape)}
+                                       for name, a in arrays.items()})
+        # meta.json 最后写入：中断时目录不会被当作完整的索引
+        with open(os.path.join(directory, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, directory=NEIGHBORS_DIR, mmap=True):
+        from .artifact import ArtifactError, _load_arrays
+
+        try:
+            with open(os.path.join(directory, META_FILE)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as exc:
+            raise ArtifactError(f"Cannot read {directory}/{META_FILE}: {exc}") from exc
+        if meta.get('format_version') != FORMAT_VERSION or meta.get('kind') != 'kd_tree':
+            raise ArtifactError(f"Unsupported neighbor index in {directory}")
+        if meta['features'] != FEATURES_RF:
+            raise ArtifactError(f"Neighbor index features {meta['features']} do not match {FEATURES_RF}")
+        return cls(_load_arrays(directory, meta, mmap), meta)
+
+    # ---------- 查询 ----------
+
+    def transform(self, columns):
+        """标准化查询患者，返回 (m, 14) float32；缺失值置 0"""
+        Z = (_raw(columns, self.features) - self.mean) / self.std
+        return np.nan_to_num(Z, nan=0.0).astype(np.float32)
+
+    def _scan(self, Z, q, leaves, k):
+        """(患者, 叶子) 对中各叶子的 k 个最近点，返回平方距离 (对数, k) 与位置 (对数, k)
+
+        多个患者访问同一叶子时按叶子分组，每个叶子一次 float64 矩阵乘法
+        (|z|² - 2 z·p + |p|²)；访问分散时 (单个患者) 逐对取点，避免逐叶子的 Python 循环。
+        """
+        order = np.argsort(leaves, kind='stable')
+        sorted_leaves = leaves[order]
+        bounds = np.r_[0, np.flatnonzero(np.diff(sorted_leaves)) + 1, len(leaves)]
+        dist = np.empty((len(q), k))
+        pos = np.empty((len(q), k), dtype=np.int64)
+        if len(leaves) >= GROUP_MIN_PAIRS * (len(bounds) - 1):
+            Zq = Z[q].astype(np.float64)
+            zz = np.einsum('ij,ij->i', Zq, Zq)
+            for a, b in zip(bounds[:-1], bounds[1:]):
+                leaf = sorted_leaves[a]
+                start, end = self.leaf_start[leaf], self.leaf_start[leaf + 1]
+                pairs = order[a:b]
+                P = self.points[start:end].astype(np.float64)
+                d = zz[pairs, None] - 2 * (Zq[pairs] @ P.T) + np.einsum('ij,ij->i', P, P)
+                np.maximum(d, 0, out=d)
+                best = np.argpartition(d, k - 1, axis=1)[:, :k]
+                dist[pairs] = np.take_along_axis(d, best, axis=1)
+                pos[pairs] = best + start
+            return dist, pos
+        width = self._leaf_width
+        for s in range(0, len(q), PAIR_BLOCK):
+            block = slice(s, s + PAIR_BLOCK)
+            starts = self.leaf_start[leaves[block]]
+            p = starts[:, None] + np.arange(width)
+            valid = p < self.leaf_start[leaves[block] + 1][:, None]
+            p = np.where(valid, p, 0)
+            diff = self.points[p] - Z[q[block]][:, None, :]
+            d = np.einsum('ijk,ijk->ij', diff, diff, dtype=np.float64)
+            # 叶子不足 leaf_width 的位置不参与
+            d[~valid] = np.inf
+            best = np.argpartition(d, k - 1, axis=1)[:, :k]
+            dist[block] = np.take_along_axis(d, best, axis=1)
+            pos[block] = np.take_along_axis(p, best, axis=1)
+        return dist, pos
+
+    def query(self, columns, k=DEFAULT_K):
+        """k 近邻，返回 (距离 (m, k), 索引内位置 (m, k))，按距离升序；位置用于 rows / outcome"""
+        if not 1 <= k <= self.max_k:
+            raise ValueError(f"k must be between 1 and {self.max_k} for this index")
+        Z = self.transform(columns)
+        distances = np.empty((len(Z), k))
+        positions = np.empty((len(Z), k), dtype=np.int64)
+        # 分块查询，临时数组大小与批量大小无关
+        for s in range(0, len(Z), QUERY_BLOCK):
+            distances[s:s + QUERY_BLOCK], positions[s:s + QUERY_BLOCK] = self._query_block(Z[s:s + QUERY_BLOCK], k)
+        return distances, positions
+
+    def _query_block(self, Z, k):
+        m = len(Z)
+        first_leaf = 2 ** self.depth - 1
+
+        # 1. 各患者落入的叶子 (按包围盒逐层下降)，其中 k 个最近点给出半径上界
+        node = np.zeros(m, dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * node + 1
+            go_right = _box_bound(Z, self.lo[left], self.hi[left]) > _box_bound(Z, self.lo[left + 1], self.hi[left + 1])
+            node = left + go_right
+        home = node - first_leaf
+        q_home = np.arange(m)
+        home_dist, home_pos = self._scan(Z, q_home, home, k)
+        radius = home_dist.max(axis=1)
+
+        # 2. 逐层展开包围盒下界小于半径的 (患者, 节点) 对
+        q = q_home
+        node = np.zeros(m, dtype=np.int64)
+        for _ in range(self.depth):
+            q = np.repeat(q, 2)
+            node = 2 * np.repeat(node, 2) + 1 + np.tile([0, 1], len(node))
+            keep = _box_bound(Z[q], self.lo[node], self.hi[node]) < radius[q]
+            q, node = q[keep], node[keep]
+        leaves = node - first_leaf
+        other = leaves != home[q]
+        q, leaves = q[other], leaves[other]
+
+        # 3. 在剩余叶子中精确计算距离；超出半径的点不可能进入前 k 个，合并前先去掉，
+        #    再与落入叶子的结果一起按 (患者, 距离) 排序，每个患者取前 k 个
+        dist, pos = self._scan(Z, q, leaves, k)
+        inside = dist < radius[q][:, None]
+        cq = np.r_[np.repeat(q_home, k), np.broadcast_to(q[:, None], dist.shape)[inside]]
+        cd = np.r_[home_dist.ravel(), dist[inside]]
+        cp = np.r_[home_pos.ravel(), pos[inside]]
+        order = np.lexsort((cd, cq))
+        first = np.searchsorted(cq[order], np.arange(m))
+        take = order[first[:, None] + np.arange(k)]
+        return np.sqrt(cd[take]), cp[take]
+
+    def features_at(self, positions):
+        """索引内位置 -> 原始尺度的特征 (由标准化值还原，float32 精度)"""
+        return self.points[positions].astype(np.float64) * self.std + self.mean
+
+    def neighbor_records(self, columns, k=DEFAULT_K):
+        """每个患者的 k 个相似患者 [{'row', 'distance', 'outcome', 'features'}]，outcome 未知时为 None"""
+        distances, positions = self.query(columns, k)
+        raw = self.features_at(positions)
+        outcome = np.asarray(self.outcome)[positions].tolist()
+        rows = np.asarray(self.rows)[positions].tolist()
+        result = []
+        for i, distance in enumerate(distances.tolist()):
+            result.append([{
+                'row': rows[i][j],
+                'distance': distance[j],
+                'outcome': None if outcome[i][j] == UNKNOWN_OUTCOME else outcome[i][j],
+                'features': {col: round(value, 3) + 0.0 for col, value in zip(self.features, raw[i, j].tolist())},
+            } for j in range(k)])
+        return result
+
+    def neighbors(self, record, k=DEFAULT_K):
+        """单个患者 (特征字典) 的 k 个相似患者"""
+        return self.neighbor_records({col: [value] for col, value in record.items()}, k)[0]
+
+    def summarize(self, distances, positions):
+        """批量输出列：{'nn_positive_rate', 'nn_distance', 'nn_rows'}"""
+        outcome = np.asarray(self.outcome)[positions].astype(np.float64)
+        outcome[outcome == UNKNOWN_OUTCOME] = np.nan
+        with np.errstate(invalid='ignore'):
+            rate = np.nanmean(outcome, axis=1) if len(outcome) else np.zeros(0)
+        rows = np.asarray(self.rows)[positions]
+        return {
+            'nn_positive_rate': rate,
+            'nn_distance': distances.mean(axis=1),
+            'nn_rows': [";".join(map(str, r)) for r in rows.tolist()],
+        }
+
+
+def load_index(directory=NEIGHBORS_DIR):
+    """directory 存在时加载索引，否则返回 None (界面与服务的可选功能)"""
+    if not os.path.exists(os.path.join(directory, META_FILE)):
+        return None
+    return NeighborIndex.load(directory)
+
+
+def run(args):
+    import time
+
+    from .batch import read_chunks, validate_chunk
+
+    start = time.perf_counter()
+    parts, outcomes, rows = [], [], 0
+    for chunk in read_chunks(args.input):
+        if args.label and args.label not in chunk.columns:
+            raise SystemExit(f"Label column {args.label!r} not found")
+        chunk, _ = validate_chunk(chunk, ['Random Forest'])
+        rows += len(chunk)
+        parts.append({col: chunk[col].to_numpy(dtype=np.float64) for col in FEATURES_RF + ['weight', 'hight']
+                      if col in chunk.columns})
+        if args.label:
+            outcomes.append(chunk[args.label].to_numpy(dtype=np.float64, na_value=np.nan))
+    # 只有表头的 CSV 不产出数据块或只产出空块
+    if not rows:
+        raise SystemExit(f"{args.input} has no rows")
+    columns = {col: np.concatenate([part[col] for part in parts]) for col in parts[0]}
+    outcome = np.concatenate(outcomes) if args.label else None
+    index = NeighborIndex.build(columns, outcome, args.leaf_size, source=os.path.abspath(args.input))
+    index.save(args.output)
+    print(f"{len(index)} patients, depth {index.depth}, {len(index.leaf_start) - 1} leaves -> {args.output} "
+          f"in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,304 @@
+"""可续跑的流式人群筛查：读取 → 校验 → 并行评分 → 按序写出 → 检查点
+
+    python -m dysphagia batch registry.csv scored.csv --workers 4 --checkpoint scored.ckpt
+
+读取在后台线程中进行，经长度为 queue_size 的有界队列交给评分线程池；写出按输入顺序
+进行，在途数据块最多 queue_size + workers 个，内存占用与文件大小无关。每块先按
+schema.py 整列校验 (见 batch.validate_chunk)，BMI 由 weight/hight 推导、逻辑回归的
+标准化在 Scorer 中完成 (见 scoring.feature_matrix)；NumPy 的大数组运算与 pandas 的
+CSV 解析会释放 GIL，因此线程即可并行。
+
+给定检查点文件时，每写完一块先 fsync 输出，再原子地更新检查点 (已提交的行数与输出
+位置)。进程崩溃后以相同参数重跑：输出截断到最后一次提交的位置，输入跳过已提交的
+行，从下一块继续；全部完成后删除检查点。Parquet 单文件的 footer 在关闭时才写入，
+中途崩溃无法续写，因此带检查点时 Parquet 输出为目录 (每块一个 part-NNNNNN.parquet)。
+"""
+import collections
+import json
+import os
+import queue
+import threading
+import time
+
+from .batch import (
+    DEFAULT_CHUNKSIZE, ChunkWriter, detect_format, make_agreement, merge_counts, read_chunks, score_chunk,
+    update_agreement, update_drift, validate_chunk,
+)
+from .features import MODEL_FEATURES
+from .scoring import Scorer
+
+CHECKPOINT_VERSION = 1
+
+# 读取线程最多领先评分的数据块数
+DEFAULT_QUEUE_SIZE = 4
+
+# 后台线程等待队列时检查停止信号的间隔 (秒)
+_POLL = 0.1
+
+
+class CheckpointError(ValueError):
+    """检查点与本次运行的输入、输出或参数不一致，或输出文件已被改动"""
+
+
+def prefetch(iterable, size=DEFAULT_QUEUE_SIZE):
+    """在后台线程中迭代 iterable，经有界队列产出；后台异常在调用方重新抛出"""
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except BaseException as exc:
+            put((None, exc))
+
+    thread = threading.Thread(target=produce, name="dysphagia-reader", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, exc = items.get()
+            if exc is not None:
+                raise exc
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _file_identity(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class Checkpoint:
+    """检查点文件：本次运行的参数 + 已提交的行数、块数与输出位置，JSON 原子写入"""
+
+    def __init__(self, path, run):
+        self.path = path
+        self.run = run
+        self.rows = 0
+        self.chunks = 0
+        self.output_bytes = 0
+
+    @classmethod
+    def open(cls, path, run):
+        """读取已有检查点 (与 run 不一致时抛出 CheckpointError)，不存在时从头开始"""
+        checkpoint = cls(path, run)
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return checkpoint
+        except (OSError, ValueError) as exc:
+            raise CheckpointError(f"Cannot read checkpoint {path}: {exc}") from exc
+        if saved.get('version') != CHECKPOINT_VERSION or saved.get('run') != run:
+            raise CheckpointError(f"Checkpoint {path} was written for a different input, output or options; "
+                                  f"delete it to start over")
+        checkpoint.rows = saved['rows']
+        checkpoint.chunks = saved['chunks']
+        checkpoint.output_bytes = saved['output_bytes']
+        return checkpoint
+
+    def commit(self, rows, output_bytes):
+        self.rows += rows
+        self.chunks += 1
+        self.output_bytes = output_bytes
+        state = {'version': CHECKPOINT_VERSION, 'run': self.run, 'rows': self.rows,
+                 'chunks': self.chunks, 'output_bytes': self.output_bytes, 'updated': time.time()}
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _CsvSink:
+    """可续写的 CSV 输出；commit() 在 fsync 后返回当前字节位置"""
+
+    def __init__(self, path, resume_bytes):
+        if resume_bytes:
+            if not os.path.exists(path) or os.path.getsize(path) < resume_bytes:
+                raise CheckpointError(f"{path} is shorter than the checkpoint ({resume_bytes} bytes)")
+            # 丢弃最后一次提交之后写了一半的数据
+            os.truncate(path, resume_bytes)
+        self.file = open(path, 'a' if resume_bytes else 'w', newline='', encoding='utf-8')
+        self.writer = ChunkWriter(self.file, 'csv', header=not resume_bytes)
+
+    def write(self, df, index):
+        self.writer.write(df)
+
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class _PartSink:
+    """Parquet 目录输出，每块一个 part 文件；输出位置为已提交的块数"""
+
+    def __init__(self, directory, resume_chunks):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        for name in os.listdir(directory):
+            # 删除最后一次提交之后的残留 (重命名后、更新检查点前崩溃)
+            if name.startswith("part-") and (not resume_chunks or int(name[5:11]) >= resume_chunks):
+                os.remove(os.path.join(directory, name))
+        self.parts = resume_chunks
+
+    def write(self, df, index):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = os.path.join(self.directory, f"part-{index:06d}.parquet")
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path + ".tmp")
+        with open(path + ".tmp", 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self.parts = index + 1
+
+    def commit(self):
+        return self.parts
+
+    def close(self):
+        pass
+
+
+class _PlainSink:
+    """不带检查点时的普通输出 (Parquet 为单个文件)"""
+
+    def __init__(self, target, fmt):
+        self.writer = ChunkWriter(target, fmt)
+
+    def write(self, df, index):
+        self.writer.write(df)
+
+    def commit(self):
+        return None
+
+    def close(self):
+        self.writer.close()
+
+
+def run_pipeline(source, target, model_names=None, scorer=None, chunksize=DEFAULT_CHUNKSIZE, workers=1,
+                 queue_size=DEFAULT_QUEUE_SIZE, checkpoint=None, in_fmt=None, out_fmt=None,
+                 progress=None, explain=False, interval=None, strict=False, neighbors=None, k=5, drift=None):
+    """流式、并行、可续跑的批量评分；source/target 为文件路径。返回统计信息
+
+    progress(rows, seconds) 在每块提交后回调，rows 含续跑前已提交的行。无效取值置为
+    缺失值继续评分并计入 stats['invalid']；strict=True 时抛出 SchemaError。两个模型同时
+    评分时 stats['agreement'] 为 compare.Agreement 的统计 (与 'invalid' 一样只含本次运行评分的行)。
+    neighbors / k 见 batch.score_chunk；drift (drift.DriftMonitor) 按写出顺序以本次评分的行更新。
+    """
+    model_names = list(model_names or MODEL_FEATURES)
+    scorer = scorer or Scorer.load()
+    for name in model_names:
+        if not scorer.available(name):
+            raise RuntimeError(f"Model file for {name} not found.")
+        if explain:
+            scorer.explainer(name)
+    in_fmt = in_fmt or detect_format(source)
+    out_fmt = out_fmt or detect_format(target)
+
+    state = None
+    if checkpoint:
+        run = {
+            'input': _file_identity(source),
+            'output': os.path.abspath(target),
+            'format': [in_fmt, out_fmt],
+            'models': model_names,
+            'versions': {name: scorer.versions.get(name) for name in model_names},
+            'thresholds': {name: scorer.thresholds[name] for name in model_names},
+            'explain': bool(explain),
+            'interval': interval,
+        }
+        if neighbors is not None:
+            # 索引重建后相似患者列会变化，不能接着旧的输出续跑
+            run['neighbors'] = {'source': neighbors.meta.get('source'), 'rows': len(neighbors), 'k': k}
+        state = Checkpoint.open(checkpoint, run)
+        if out_fmt == 'parquet':
+            sink = _PartSink(target, state.chunks)
+        else:
+            sink = _CsvSink(target, state.output_bytes)
+    else:
+        sink = _PlainSink(target, out_fmt)
+
+    resumed = state.rows if state else 0
+    rows = resumed
+    index = state.chunks if state else 0
+    start = time.perf_counter()
+
+    def score(chunk, first_row):
+        chunk, counts = validate_chunk(chunk, model_names, first_row, 'raise' if strict else 'coerce')
+        return score_chunk(chunk, scorer, model_names, explain, interval, neighbors, k), counts
+
+    def commit(pending):
+        nonlocal rows, index
+        n, future = pending.popleft()
+        scored, counts = future.result()
+        merge_counts(invalid, counts)
+        update_agreement(agreement, scored)
+        update_drift(drift, scored, model_names)
+        sink.write(scored, index)
+        position = sink.commit()
+        rows += n
+        index += 1
+        if state is not None:
+            state.commit(n, position)
+        if progress is not None:
+            progress(rows, time.perf_counter() - start)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    invalid = {}
+    agreement = make_agreement(model_names)
+    pending = collections.deque()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dysphagia-score") as pool:
+            submitted = rows
+            for chunk in prefetch(read_chunks(source, chunksize, in_fmt, skip=resumed), queue_size):
+                pending.append((len(chunk), pool.submit(score, chunk, submitted)))
+                submitted += len(chunk)
+                if len(pending) >= workers:
+                    commit(pending)
+            while pending:
+                commit(pending)
+    finally:
+        for _, future in pending:
+            future.cancel()
+        sink.close()
+    if state is not None:
+        state.remove()
+
+    seconds = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'resumed_rows': resumed,
+        'seconds': seconds,
+        'rows_per_sec': (rows - resumed) / seconds if seconds > 0 else 0.0,
+        'invalid': invalid,
+        'agreement': agreement.summary() if agreement is not None else None,
+    }
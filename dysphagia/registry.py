@@ -0,0 +1,237 @@
+"""带版本的模型仓库与不停机热更新
+
+    python -m dysphagia registry publish --name "Random Forest" retrained_rf.pkl
+    python -m dysphagia registry list
+    python -m dysphagia registry activate --name "Random Forest" 74c92de22c2d     # 回滚
+    python -m dysphagia serve --registry registry --watch 2
+
+目录结构 (每个版本是一个 artifact.py 格式的模型目录):
+    registry/random_forest/74c92de22c2d/   meta.json + .npy
+    registry/random_forest/CURRENT         当前版本名 (一行文本)
+
+版本名为来源 pickle 的哈希 (与缓存键中的模型版本一致)。发布时先导出到临时目录再
+改名，最后原子地替换 CURRENT，读取方不会看到写了一半的版本。
+
+ModelWatcher 在后台线程中轮询各模型的 CURRENT (标准库没有 inotify，stat 一个小文件的
+开销可以忽略)。发现新版本时在后台加载 (只读内存映射)，用固定的金丝雀批次校验输出，
+通过后调用 Scorer.swap() 原子地替换：进行中的请求继续用旧模型对象完成，之后的请求
+用新模型，不丢请求、不重启进程。缓存键包含模型版本，旧版本的缓存条目自然失效。
+校验失败的版本记录在 status 中，不会反复重试，直到 CURRENT 指向另一个版本。
+"""
+import os
+import shutil
+import sys
+import threading
+import time
+
+from .artifact import ARTIFACT_SUBDIRS, ArtifactError, export_model, load_artifact
+from .features import MODEL_FEATURES, sample_patients
+
+REGISTRY_DIR = "registry"
+CURRENT_FILE = "CURRENT"
+
+# 轮询 CURRENT 的间隔 (秒)
+DEFAULT_POLL = 2.0
+
+# 金丝雀批次的行数与随机种子 (固定，不同版本在同一批患者上比较)
+CANARY_ROWS = 512
+CANARY_SEED = 20240601
+
+
+def model_dir(root, model_name):
+    return os.path.join(root, ARTIFACT_SUBDIRS[model_name])
+
+
+def list_versions(root, model_name):
+    """已发布的版本名 (按发布时间排序)"""
+    directory = model_dir(root, model_name)
+    if not os.path.isdir(directory):
+        return []
+    versions = [name for name in os.listdir(directory)
+                if not name.startswith('.') and os.path.isdir(os.path.join(directory, name))]
+    return sorted(versions, key=lambda name: os.path.getmtime(os.path.join(directory, name)))
+
+
+def current_version(root, model_name):
+    """CURRENT 中记录的版本名，尚未发布时返回 None"""
+    try:
+        with open(os.path.join(model_dir(root, model_name), CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate(root, model_name, version):
+    """原子地把 CURRENT 指向已发布的 version (发布新版本或回滚)"""
+    directory = model_dir(root, model_name)
+    if not os.path.isdir(os.path.join(directory, version)):
+        raise ArtifactError(f"{model_name} has no published version {version!r} in {root}")
+    tmp = os.path.join(directory, f".{CURRENT_FILE}.tmp")
+    with open(tmp, 'w') as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(directory, CURRENT_FILE))
+
+
+def publish(path, model_name, root=REGISTRY_DIR, make_current=True):
+    """把 pickle 模型文件导出为一个新版本，返回版本名；同一文件重复发布时复用已有版本"""
+    import joblib
+
+    from .models import file_hash
+
+    version = file_hash(path)
+    directory = model_dir(root, model_name)
+    target = os.path.join(directory, version)
+    if not os.path.isdir(target):
+        os.makedirs(directory, exist_ok=True)
+        tmp = os.path.join(directory, f".{version}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        export_model(joblib.load(path), model_name, tmp, version)
+        os.rename(tmp, target)
+    if make_current:
+        activate(root, model_name, version)
+    return version
+
+
+def load_current(root=REGISTRY_DIR):
+    """加载各模型的当前版本，返回 ({模型名称: 模型}, {模型名称: 版本名})"""
+    models, versions = {}, {}
+    for name in MODEL_FEATURES:
+        version = current_version(root, name)
+        if version is None:
+            continue
+        models[name], _ = load_artifact(os.path.join(model_dir(root, name), version))
+        versions[name] = version
+    return models, versions
+
+
+def canary_columns(rows=CANARY_ROWS, seed=CANARY_SEED):
+    """在侧边栏控件取值范围内生成固定的一批患者 {特征: 数组}"""
+    return sample_patients(rows, seed)
+
+
+def check_canary(model, model_name, columns, previous=None, threshold=0.5):
+    """在金丝雀批次上检查新模型：概率必须是 [0, 1] 内的有限值，否则抛出 ArtifactError
+
+    给定 previous (当前在用的模型) 时返回与之比较的统计，供日志与 /metrics 查看。
+    """
+    import numpy as np
+
+    from .scoring import feature_matrix
+
+    def proba(m):
+        X = feature_matrix(columns, model_name, standardize=not getattr(m, 'fused_standardization', False))
+        return np.asarray(m.predict_proba(X))[:, 1]
+
+    n = len(columns[MODEL_FEATURES[model_name][0]])
+    try:
+        p = proba(model)
+    except Exception as exc:
+        raise ArtifactError(f"Canary scoring failed: {type(exc).__name__}: {exc}") from exc
+    if p.shape != (n,):
+        raise ArtifactError(f"Canary scoring returned shape {p.shape}, expected ({n},)")
+    bad = ~(np.isfinite(p) & (p >= 0) & (p <= 1))
+    if bad.any():
+        raise ArtifactError(f"{int(bad.sum())} of {n} canary probabilities are not finite values in [0, 1]")
+    report = {'rows': n, 'mean_probability': float(p.mean())}
+    if previous is not None:
+        try:
+            old = proba(previous)
+        except Exception as exc:
+            raise ArtifactError(f"Canary comparison with the current model failed: "
+                                f"{type(exc).__name__}: {exc}") from exc
+        report['mean_abs_change'] = float(np.abs(p - old).mean())
+        report['label_agreement'] = float(((p > threshold) == (old > threshold)).mean())
+    return report
+
+
+class ModelWatcher:
+    """后台轮询模型仓库，校验通过的新版本原子地换入 scorer"""
+
+    def __init__(self, scorer, root=REGISTRY_DIR, interval=DEFAULT_POLL, log=None):
+        self.scorer = scorer
+        self.root = root
+        self.interval = interval
+        self.log = log or (lambda message: print(message, file=sys.stderr, flush=True))
+        self.reloads = 0
+        self.failures = 0
+        # 模型名称 -> 最近一次检查/换入的情况
+        self.status = {}
+        self._failed = {}
+        self._columns = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """检查一次，返回本次换入的模型名称列表"""
+        swapped = []
+        for name in MODEL_FEATURES:
+            version = current_version(self.root, name)
+            if version is None or version == self.scorer.versions.get(name) or self._failed.get(name) == version:
+                continue
+            previous = self.scorer.versions.get(name)
+            start = time.perf_counter()
+            directory = os.path.join(model_dir(self.root, name), version)
+            try:
+                model, _ = load_artifact(directory)
+                if self._columns is None:
+                    self._columns = canary_columns()
+                report = check_canary(model, name, self._columns, self.scorer.models.get(name),
+                                      self.scorer.thresholds[name])
+            except Exception as exc:
+                # 任何加载或校验错误都记为拒绝该版本，避免每次轮询重复加载
+                self.failures += 1
+                self._failed[name] = version
+                self.status[name] = {'version': previous, 'rejected': version, 'error': str(exc),
+                                     'checked_at': time.time()}
+                self.log(f"[registry] {name} {version} rejected: {exc}")
+                continue
+            self.scorer.swap(name, model, version, directory)
+            self.reloads += 1
+            self._failed.pop(name, None)
+            seconds = time.perf_counter() - start
+            self.status[name] = {'version': version, 'previous': previous, 'loaded_at': time.time(),
+                                 'load_seconds': seconds, 'canary': report}
+            self.log(f"[registry] {name}: {previous} -> {version} in {seconds * 1000:.0f} ms, canary {report}")
+            swapped.append(name)
+        return swapped
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as exc:
+                # 轮询线程不能因为一次意外错误而退出
+                self.failures += 1
+                self.log(f"[registry] check failed: {type(exc).__name__}: {exc}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="dysphagia-registry", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def snapshot(self):
+        return {'root': self.root, 'reloads': self.reloads, 'failures': self.failures,
+                'versions': dict(self.scorer.versions), 'models': dict(self.status)}
+
+
+def run(args):
+    if args.action == 'publish':
+        version = publish(args.model_file, args.name, args.registry, make_current=not args.no_activate)
+        print(f"{args.name}: published {version}" + ("" if args.no_activate else " (current)"))
+    elif args.action == 'activate':
+        activate(args.registry, args.name, args.version)
+        print(f"{args.name}: current -> {args.version}")
+    else:
+        for name in MODEL_FEATURES:
+            current = current_version(args.registry, name)
+            for version in list_versions(args.registry, name):
+                print(f"{name:<20} {version} {'*' if version == current else ''}")
@@ -0,0 +1,252 @@
+"""输入 schema：取值范围、整数约束与列名别名的声明式定义，整列向量化校验
+
+SCHEMA 由 features.py 中的 FEATURE_BOUNDS (侧边栏控件的取值范围)、INTEGER_FEATURES
+与 FEATURE_ALIASES 生成，界面控件、批量任务与推理服务共用同一份定义。
+
+    result = validate_columns(df, ['Random Forest'])      # 整列校验，无逐行 Python 循环
+    result.columns      # {列名: float64 数组}，别名已改为模型列名，无效值置为 NaN
+    result.invalid      # 按行的布尔数组：该行至少有一个无效值
+    result.errors       # [{'column', 'error', 'count', 'rows'}]，rows 为前几个出错的行号
+
+    record = validate_record({'height': 160, ...}, 'Random Forest')   # 单条记录 (服务的热路径)
+
+缺失值 (NaN / None) 不算错误，交给模型的缺失值填补处理；无法转为数值、超出范围或
+不是整数的取值才算错误。errors='coerce' 时错误值置为 NaN 继续评分，errors='raise'
+时抛出 SchemaError。缺少模型所需的列总是抛出 SchemaError。
+"""
+import math
+
+from .features import FEATURE_ALIASES, FEATURE_BOUNDS, INTEGER_FEATURES, MODEL_FEATURES
+
+# 每类错误报告的行号个数
+MAX_ERROR_ROWS = 5
+
+# 错误类型
+MISSING = 'missing'
+NOT_NUMERIC = 'not_numeric'
+OUT_OF_RANGE = 'out_of_range'
+NOT_INTEGER = 'not_integer'
+
+
+class Field:
+    """一个输入特征的约束；low/high 为 None 时不限范围 (如 BMI)"""
+
+    __slots__ = ('name', 'low', 'high', 'integer')
+
+    def __init__(self, name, low=None, high=None, integer=False):
+        self.name = name
+        self.low = low
+        self.high = high
+        self.integer = integer
+
+    def describe(self):
+        kind = "integer" if self.integer else "number"
+        if self.low is None:
+            return kind
+        return f"{kind} in [{self.low}, {self.high}]"
+
+
+SCHEMA = {name: Field(name, low, high, name in INTEGER_FEATURES)
+          for name, (low, high, _) in FEATURE_BOUNDS.items()}
+SCHEMA['BMI'] = Field('BMI')
+
+_ALIASES = {alias.lower(): name for alias, name in FEATURE_ALIASES.items()}
+_ALIASES.update({name.lower(): name for name in SCHEMA})
+
+
+class SchemaError(ValueError):
+    """输入不符合 schema；errors 与 Validation.errors 的格式相同"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        missing = [error['column'] for error in errors if error['error'] == MISSING]
+        messages = [f"missing columns {missing}"] if missing else []
+        messages += [_describe(error) for error in errors if error['error'] != MISSING]
+        super().__init__("; ".join(messages))
+
+
+def _describe(error):
+    column, kind = error['column'], error['error']
+    where = f"{error['count']} row(s), e.g. {error['rows']}" if 'rows' in error else repr(error.get('value'))
+    if kind == NOT_NUMERIC:
+        return f"'{column}' is not numeric: {where}"
+    return f"'{column}' must be {SCHEMA[column].describe()}: {where}"
+
+
+def canonical_name(name):
+    """输入列名 -> 模型中的列名 (精确匹配、别名或大小写不同)，无法识别时原样返回"""
+    if name in SCHEMA:
+        return name
+    return _ALIASES.get(str(name).lower(), name)
+
+
+def rename_columns(names):
+    """{输入列名: 模型列名}，只含需要改名的列；模型列名已存在时忽略其别名"""
+    names = list(names)
+    present = set(names)
+    renames = {}
+    for name in names:
+        target = canonical_name(name)
+        if target != name and target not in present and target not in renames.values():
+            renames[name] = target
+    return renames
+
+
+def rename_record(record):
+    """单条记录改用模型列名；同时给出模型列名与其别名时以模型列名为准"""
+    clean = {}
+    for key, value in record.items():
+        name = canonical_name(key)
+        if name in clean and name != key:
+            continue
+        clean[name] = value
+    return clean
+
+
+def required_columns(model_names):
+    """模型所需的输入列 (按模型特征顺序)，BMI 可由 weight/hight 推导时另行判断"""
+    needed = []
+    for name in model_names:
+        needed.extend(col for col in MODEL_FEATURES[name] if col not in needed)
+    return needed
+
+
+class Validation:
+    """validate_columns 的结果"""
+
+    def __init__(self, columns, invalid, errors, renamed):
+        self.columns = columns
+        self.invalid = invalid
+        self.errors = errors
+        self.renamed = renamed
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def counts(self):
+        """{列名: 无效值个数}"""
+        counts = {}
+        for error in self.errors:
+            counts[error['column']] = counts.get(error['column'], 0) + error['count']
+        return counts
+
+
+def _to_float(values):
+    """整列转为 float64 (不一定复制，可能只读)，返回 (数组, 无法转换的布尔掩码或 None, 是否整数类型)"""
+    import numpy as np
+
+    array = np.asarray(values)
+    if array.dtype.kind in 'fiub':
+        return array.astype(np.float64, copy=False), None, array.dtype.kind != 'f'
+    try:
+        return array.astype(np.float64), None, False
+    except (TypeError, ValueError):
+        pass
+    # 含字符串等非数值的对象列：只有这条慢路径需要 pandas
+    import pandas as pd
+
+    series = pd.Series(array, dtype=object)
+    converted = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64)
+    return converted, np.isnan(converted) & ~series.isna().to_numpy(), False
+
+
+def _error(column, kind, mask):
+    import numpy as np
+
+    rows = np.flatnonzero(mask)
+    return {'column': column, 'error': kind, 'count': int(len(rows)), 'rows': rows[:MAX_ERROR_ROWS].tolist()}
+
+
+def validate_columns(columns, model_names=None, errors='coerce'):
+    """校验一批输入 (DataFrame 或 {列名: 数组})，返回 Validation
+
+    只校验模型所需的列以及 weight/hight (用于推导 BMI)；其他列不返回。
+    """
+    import numpy as np
+
+    if errors not in ('coerce', 'raise'):
+        raise ValueError(f"errors must be 'coerce' or 'raise', not {errors!r}")
+    model_names = list(model_names or MODEL_FEATURES)
+    renamed = rename_columns(columns.keys())
+    source = {renamed.get(name, name): name for name in columns.keys()}
+
+    needed = required_columns(model_names)
+    derivable = 'weight' in source and 'hight' in source
+    missing = [col for col in needed if col not in source and not (col == 'BMI' and derivable)]
+    if missing:
+        raise SchemaError([{'column': col, 'error': MISSING} for col in missing])
+
+    out, found = {}, []
+    invalid = None
+    for col in needed + [c for c in ('weight', 'hight') if c not in needed]:
+        if col not in source or (col == 'BMI' and derivable):
+            continue
+        values, not_numeric, integral = _to_float(columns[source[col]])
+        field = SCHEMA[col]
+        bad = not_numeric
+        if not_numeric is not None and not_numeric.any():
+            found.append(_error(col, NOT_NUMERIC, not_numeric))
+        if field.low is not None and len(values):
+            inside = None
+            # 先比较整列的最小/最大值；有 NaN 或越界时才逐元素检查
+            if not (values.min() >= field.low and values.max() <= field.high):
+                with np.errstate(invalid='ignore'):
+                    inside = (values >= field.low) & (values <= field.high)
+                outside = ~inside & ~np.isnan(values)
+                if outside.any():
+                    found.append(_error(col, OUT_OF_RANGE, outside))
+                    bad = outside if bad is None else bad | outside
+            if field.integer and not integral:
+                fractional = values != np.floor(values)
+                if inside is not None:
+                    fractional &= inside
+                if fractional.any():
+                    found.append(_error(col, NOT_INTEGER, fractional))
+                    bad = fractional if bad is None else bad | fractional
+        if bad is not None:
+            values = np.where(bad, np.nan, values)
+            invalid = bad if invalid is None else invalid | bad
+        out[col] = values
+
+    if found and errors == 'raise':
+        raise SchemaError(found)
+    if invalid is None:
+        n_rows = len(next(iter(out.values()))) if out else 0
+        invalid = np.zeros(n_rows, dtype=bool)
+    return Validation(out, invalid, found, renamed)
+
+
+def validate_record(record, model_name):
+    """校验单条记录 {列名: 值}，返回改用模型列名、取值为 float 的新字典；有错误时抛出 SchemaError
+
+    与 validate_columns 规则相同，但不经过 numpy，供单患者请求使用。
+    """
+    clean = rename_record(record)
+    derivable = 'weight' in clean and 'hight' in clean
+    features = MODEL_FEATURES[model_name]
+    missing = [col for col in features if col not in clean and not (col == 'BMI' and derivable)]
+    if missing:
+        raise SchemaError([{'column': col, 'error': MISSING} for col in missing])
+
+    found = []
+    for col in features + [c for c in ('weight', 'hight') if c not in features]:
+        if col not in clean:
+            continue
+        value = clean[col]
+        try:
+            number = math.nan if value is None else float(value)
+        except (TypeError, ValueError):
+            found.append({'column': col, 'error': NOT_NUMERIC, 'value': value})
+            continue
+        clean[col] = number
+        field = SCHEMA[col]
+        if field.low is None or math.isnan(number):
+            continue
+        if not field.low <= number <= field.high:
+            found.append({'column': col, 'error': OUT_OF_RANGE, 'value': value})
+        elif field.integer and not number.is_integer():
+            found.append({'column': col, 'error': NOT_INTEGER, 'value': value})
+    if found:
+        raise SchemaError(found)
+    return clean
@@ -0,0 +1,492 @@
+"""无界面评分核心：特征矩阵构建 + predict_proba，只依赖 numpy / scikit-learn
+
+本模块不导入 streamlit、plotly、pandas；numpy 与 joblib 在首次使用时才导入，
+供 CLI、批量任务和工作进程快速启动。
+"""
+import copy
+import os
+
+from .features import MODEL_FEATURES, STATS_CONFIG, compute_bmi, unwrap_model
+from .models import MODEL_FILES, load_models, model_hashes
+from .telemetry import span
+
+# 默认判定阈值：阳性概率 > 阈值判为高风险 (与 sklearn predict 的 0.5 一致)
+DEFAULT_THRESHOLD = 0.5
+
+# 默认的随机森林投票区间水平
+DEFAULT_INTERVAL = 0.9
+
+# predict_models 在线程池中并发评分的最小行数 (更小的批次线程开销大于收益)
+PARALLEL_MIN_ROWS = 10_000
+
+
+def records_to_columns(records):
+    """把 [{特征: 值}, ...] 转成 {特征: [值, ...]}"""
+    keys = set()
+    for record in records:
+        keys.update(record)
+    return {key: [record.get(key) for record in records] for key in keys}
+
+
+def missing_features(columns, model_name):
+    """返回模型所需但 columns 中缺失的特征 (BMI 可由 weight/hight 推导)"""
+    derivable = 'weight' in columns and 'hight' in columns
+    return [col for col in MODEL_FEATURES[model_name]
+            if col not in columns and not (col == 'BMI' and derivable)]
+
+
+def feature_matrix(columns, model_name, standardize=True):
+    """按模型特征顺序构建 float64 矩阵
+
+    columns 可以是 DataFrame 或 {特征: 数组} 字典。若同时提供 weight 与 hight，
+    BMI 由二者重新计算；逻辑回归的连续变量按 STATS_CONFIG 标准化。
+    """
+    missing = missing_features(columns, model_name)
+    if missing:
+        raise ValueError(f"Missing columns for {model_name}: {missing}")
+    X = _raw_matrix(columns, MODEL_FEATURES[model_name])
+    if standardize and model_name == 'Logistic Regression':
+        _standardize(X, MODEL_FEATURES[model_name])
+    return X
+
+
+def _raw_matrix(columns, features):
+    import numpy as np
+
+    weight = hight = None
+    if 'weight' in columns and 'hight' in columns:
+        weight = np.asarray(columns['weight'], dtype=np.float64)
+        hight = np.asarray(columns['hight'], dtype=np.float64)
+
+    X = np.empty((len(columns[features[0]]), len(features)), dtype=np.float64)
+    for j, col in enumerate(features):
+        if col == 'BMI' and weight is not None:
+            X[:, j] = weight / ((hight / 100) ** 2)
+        else:
+            X[:, j] = np.asarray(columns[col], dtype=np.float64)
+    return X
+
+
+def _standardize(X, features):
+    """逻辑回归的连续变量按 STATS_CONFIG 原地标准化"""
+    for j, col in enumerate(features):
+        if col in STATS_CONFIG:
+            stats = STATS_CONFIG[col]
+            X[:, j] = (X[:, j] - stats['mean']) / stats['std']
+
+
+def shared_matrices(columns, model_names, standardize=None):
+    """多个模型共用一次构建的特征矩阵，返回 {模型名称: 矩阵}
+
+    按各模型特征的并集 (随机森林的 14 列已包含逻辑回归的 10 列) 只转换一次列、只算
+    一次 BMI；特征恰为并集前缀的模型得到零拷贝的列切片视图。standardize 为
+    {模型名称: 是否标准化}，需要标准化的逻辑回归在副本上进行。
+    """
+    standardize = standardize or {}
+    union = []
+    for name in model_names:
+        missing = missing_features(columns, name)
+        if missing:
+            raise ValueError(f"Missing columns for {name}: {missing}")
+        union.extend(col for col in MODEL_FEATURES[name] if col not in union)
+    X = _raw_matrix(columns, union)
+    matrices = {}
+    for name in model_names:
+        features = MODEL_FEATURES[name]
+        if union[:len(features)] == features:
+            M = X[:, :len(features)]
+        else:
+            M = X[:, [union.index(col) for col in features]]
+        if standardize.get(name, True) and name == 'Logistic Regression':
+            M = M.copy()
+            _standardize(M, features)
+        matrices[name] = M
+    return matrices
+
+
+def canonical_features(record, model_name):
+    """把一条记录规范化为按模型特征顺序排列的浮点元组，用作缓存键
+
+    BMI 与 feature_matrix 一样由 weight/hight 推导，因此 60 与 60.0 得到同一个键。
+    """
+    missing = missing_features(record, model_name)
+    if missing:
+        raise ValueError(f"Missing columns for {model_name}: {missing}")
+    derive_bmi = 'weight' in record and 'hight' in record
+    values = []
+    for col in MODEL_FEATURES[model_name]:
+        if col == 'BMI' and derive_bmi:
+            value = compute_bmi(float(record['weight']), float(record['hight']))
+        else:
+            value = record[col]
+            value = float('nan') if value is None else float(value)
+        values.append(round(value, 9))
+    return tuple(values)
+
+
+def _named_steps(model, features):
+    """校验模型训练时的特征顺序，返回带 feature_names_in_ 的各个步骤"""
+    # Pipeline 的 feature_names_in_ 只是转发第一步的属性，因此只检查各个步骤本身
+    steps = [step for _, step in model.steps] if hasattr(model, 'steps') else [model]
+    named = [step for step in steps if getattr(step, 'feature_names_in_', None) is not None]
+    for step in named:
+        if list(step.feature_names_in_) != list(features):
+            raise ValueError(f"Model feature order {list(step.feature_names_in_)} does not match {features}")
+    return named
+
+
+def _strip_feature_names(model, features):
+    """校验特征顺序后去掉 feature_names_in_，使模型直接接受 numpy 矩阵"""
+    for step in _named_steps(model, features):
+        del step.feature_names_in_
+
+
+def _compile(model, model_name):
+    """把模型换成数组化的快速实现；结构不支持时返回 None
+
+    pipeline 内已有 StandardScaler 时 DoubleStandardizationError 照常抛出 (由 Scorer
+    记入 errors 并停用该模型)，不能悄悄退回会二次标准化的 sklearn 路径。
+    """
+    from .forest import FlatForest
+    from .linear import DoubleStandardizationError, FusedLogistic
+
+    compiled = {'Random Forest': FlatForest, 'Logistic Regression': FusedLogistic}.get(model_name)
+    if compiled is None:
+        return None
+    if isinstance(model, compiled):
+        # 已是数组化模型 (如 artifact.py 映射的文件)，不再拷贝
+        return model
+    try:
+        return compiled.from_model(model)
+    except DoubleStandardizationError:
+        raise
+    except ValueError:
+        return None
+
+
+class Scorer:
+    """对 load_models() 的结果做一次性解包与校验，之后只做矩阵运算
+
+    compile=True 时随机森林被展平为 FlatForest (见 forest.py)，逻辑回归被折叠为
+    FusedLogistic (见 linear.py)，二者与 sklearn 概率一致。
+
+    tables ({模型名称: RiskTable}，见 lookup.py) 中的模型优先查表，超出查找表取值
+    范围的行退回实时模型；模型哈希与查找表不一致的表不会启用，记录在 stale_tables。
+    只有查找表、没有模型文件时也可以评分，完全不需要 sklearn。
+
+    结构有误的模型 (如 pipeline 已含 StandardScaler，见 DoubleStandardizationError)
+    只停用该模型并记录在 errors 中，其余模型照常可用。
+
+    load() 优先使用 artifact.py 导出的非 pickle 模型文件 (与 pickle 哈希一致时)，
+    只有缺少或过期的模型才反序列化 pickle。给定 registry (见 registry.py) 时，仓库中
+    已发布的当前版本优先于以上两者。
+    """
+
+    def __init__(self, loaded_models, compile=True, versions=None, tables=None, thresholds=None, sources=None):
+        from .explain import global_importances
+        from .linear import DoubleStandardizationError
+
+        self.models = {}
+        self.keys = {}
+        self.tables = {}
+        self.stale_tables = []
+        # 模型名称 -> 无法启用的原因
+        self.errors = {}
+        # 模型名称 -> 全局重要性 (编译前从 sklearn 模型提取；导出的模型目录记录在 meta.json 中)
+        self.importances = {}
+        # 模型名称 -> 解释器 (explain.py)，首次使用时构建
+        self._explainers = {}
+        # 模型名称 -> 判定阈值 (可按 ROC 曲线选定的筛查灵敏度配置)
+        self.thresholds = {name: DEFAULT_THRESHOLD for name in MODEL_FEATURES}
+        self.thresholds.update(thresholds or {})
+        # 模型名称 -> 文件哈希，进入缓存键
+        self.versions = dict(versions or {})
+        # 模型名称 -> 加载来源 (模型目录或 pickle 路径)；模型目录的 meta.json 记录了测试集指标等
+        self.sources = dict(sources or {})
+        for name, loaded_object in loaded_models.items():
+            model, key = unwrap_model(loaded_object)
+            if model is None:
+                continue
+            _named_steps(model, MODEL_FEATURES[name])
+            self.importances[name] = global_importances(model)
+            try:
+                compiled = _compile(model, name) if compile else None
+            except DoubleStandardizationError as exc:
+                self.errors[name] = str(exc)
+                continue
+            if compiled is not None:
+                model = compiled
+            else:
+                # 拷贝后再修改，避免影响调用方 (如 Streamlit 缓存) 持有的对象
+                model = copy.deepcopy(model)
+                _strip_feature_names(model, MODEL_FEATURES[name])
+            self.models[name] = model
+            self.keys[name] = key
+
+        for name, table in (tables or {}).items():
+            if name in self.errors:
+                continue
+            if list(table.features) != MODEL_FEATURES[name]:
+                raise ValueError(f"Lookup table features {table.features} do not match {name}")
+            if self.versions.get(name) not in (None, table.model_hash):
+                self.stale_tables.append(name)
+                continue
+            self.tables[name] = table
+            self.versions.setdefault(name, table.model_hash)
+
+    @classmethod
+    def load(cls, model_files=None, compile=True, tables=None, artifact_dir=None, thresholds=None, registry=None):
+        model_files = model_files or MODEL_FILES
+        versions = model_hashes(model_files)
+        loaded, sources = {}, {}
+        if compile:
+            from .artifact import ARTIFACT_DIR, ARTIFACT_SUBDIRS, load_artifacts
+
+            if registry:
+                from .registry import load_current, model_dir
+
+                loaded, current = load_current(registry)
+                versions.update(current)
+                sources = {name: os.path.join(model_dir(registry, name), version) for name, version in current.items()}
+            artifact_dir = artifact_dir or ARTIFACT_DIR
+            exported, hashes = load_artifacts(artifact_dir, versions)
+            for name, model in exported.items():
+                if name not in loaded:
+                    loaded[name] = model
+                    sources[name] = os.path.join(artifact_dir, ARTIFACT_SUBDIRS[name])
+                    # 只有导出文件、没有 pickle 时，以导出来源的哈希作为模型版本
+                    if versions.get(name) is None:
+                        versions[name] = hashes[name]
+        pickles = {name: path for name, path in model_files.items() if name not in loaded}
+        if pickles:
+            loaded.update(load_models(pickles))
+            sources.update(pickles)
+        return cls(loaded, compile, versions, tables, thresholds, sources)
+
+    def swap(self, model_name, model, version, source=None):
+        """换入已编译的新模型 (如 load_artifact 的结果)，供热更新在后台线程中调用
+
+        进行中的评分继续使用已取得的旧模型对象。版本先换成过渡值、再换模型、最后换成
+        新版本：缓存键中的新版本只会对应新模型的概率；评分前后版本不一致的结果不写入
+        缓存 (见 score_records)，回滚后旧版本的缓存条目也不会混入新模型的概率。
+        """
+        self.versions[model_name] = f"swapping:{version}"
+        table = self.tables.get(model_name)
+        if table is not None and table.model_hash != version:
+            # 查找表按旧模型生成，先停用再换模型
+            self.tables.pop(model_name, None)
+            self.stale_tables.append(model_name)
+        self.models[model_name] = model
+        self.keys[model_name] = None
+        # 加载时结构有误而停用的模型，换入校验通过的新版本后恢复可用
+        self.errors.pop(model_name, None)
+        self.sources[model_name] = source
+        self.importances.pop(model_name, None)
+        self._explainers.pop(model_name, None)
+        self.versions[model_name] = version
+
+    def available(self, model_name):
+        return model_name in self.models or model_name in self.tables
+
+    def model(self, model_name):
+        if model_name in self.errors:
+            raise RuntimeError(f"{model_name} is unavailable: {self.errors[model_name]}")
+        if model_name not in self.models:
+            raise RuntimeError(f"Model file for {model_name} not found.")
+        return self.models[model_name]
+
+    def matrix(self, columns, model_name):
+        """构建该模型所需的输入矩阵 (FusedLogistic 直接接受未标准化的特征)"""
+        fused = getattr(self.models.get(model_name), 'fused_standardization', False)
+        return feature_matrix(columns, model_name, standardize=not fused)
+
+    def predict_proba(self, model_name, X):
+        """对 matrix() 构建的矩阵评分，返回阳性概率向量"""
+        import numpy as np
+
+        table = self.tables.get(model_name)
+        if table is not None:
+            p = table.lookup(X)
+            outside = np.isnan(p)
+            if outside.any():
+                if model_name not in self.models:
+                    raise ValueError(f"{int(outside.sum())} rows are outside the {model_name} lookup table ranges")
+                p[outside] = self._predict_model(model_name, np.asarray(X)[outside])
+            return p
+        return self._predict_model(model_name, X)
+
+    def _predict_model(self, model_name, X):
+        import numpy as np
+
+        model = self.model(model_name)
+        if hasattr(model, 'predict_proba'):
+            return model.predict_proba(X)[:, 1]
+        return np.asarray(model.predict(X), dtype=np.float64)
+
+    def score_columns(self, columns, model_name):
+        with span('matrix'):
+            X = self.matrix(columns, model_name)
+        with span('predict'):
+            return self.predict_proba(model_name, X)
+
+    def predict_columns(self, columns, model_name, threshold=None, interval=None):
+        """一次评分返回 {'probability', 'label', 'threshold'}，均为按行的数组 (threshold 为标量)
+
+        interval (如 0.9) 给定且模型支持时 (FlatForest) 在同一次遍历中附加 'ci_low' / 'ci_high'
+        (各树概率的经验分位数)；此时经 model() 取实时模型 (停用的模型抛出 RuntimeError)，不查表。
+        只有查找表、没有实时模型时不附加区间。
+        """
+        with span('matrix'):
+            X = self.matrix(columns, model_name)
+        return self._predict_matrix(X, model_name, threshold, interval)
+
+    def _predict_matrix(self, X, model_name, threshold=None, interval=None):
+        import numpy as np
+
+        threshold = self.thresholds[model_name] if threshold is None else threshold
+        with span('predict'):
+            # 区间需要逐树的概率，只能由实时模型给出；只有查找表时按普通评分处理
+            live = interval and (model_name in self.models or model_name not in self.tables)
+            model = self.model(model_name) if live else None
+            if live and hasattr(model, 'predict_proba_interval'):
+                p, low, high = model.predict_proba_interval(X, interval)
+                result = {'probability': p, 'ci_low': low, 'ci_high': high}
+            else:
+                result = {'probability': self.predict_proba(model_name, X)}
+        result['label'] = (result['probability'] > threshold).astype(np.int64)
+        result['threshold'] = threshold
+        return result
+
+    def predict_models(self, columns, model_names=None, thresholds=None, interval=None):
+        """同一批输入同时用多个模型评分，返回 {模型名称: predict_columns 的结果}
+
+        特征矩阵只构建一次 (见 shared_matrices)；行数不少于 PARALLEL_MIN_ROWS 时各模型在
+        线程池中并发评分 (大数组的 NumPy 运算会释放 GIL)，单个患者则依次评分，省去线程开销。
+        thresholds 为 {模型名称: 阈值}，缺省用 self.thresholds。
+        """
+        model_names = list(model_names or [name for name in MODEL_FEATURES if self.available(name)])
+        for name in model_names:
+            if not self.available(name):
+                raise RuntimeError(f"Model file for {name} not found.")
+        thresholds = thresholds or {}
+        fused = {name: not getattr(self.models.get(name), 'fused_standardization', False) for name in model_names}
+        with span('matrix'):
+            matrices = shared_matrices(columns, model_names, fused)
+        rows = len(next(iter(matrices.values()))) if matrices else 0
+        if len(model_names) < 2 or rows < PARALLEL_MIN_ROWS:
+            return {name: self._predict_matrix(matrices[name], name, thresholds.get(name), interval)
+                    for name in model_names}
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=len(model_names), thread_name_prefix="dysphagia-model") as pool:
+            futures = {name: pool.submit(self._predict_matrix, matrices[name], name, thresholds.get(name), interval)
+                       for name in model_names}
+            return {name: future.result() for name, future in futures.items()}
+
+    def predict_records(self, records, model_name, threshold=None, interval=None, cache=None):
+        """[{'probability', 'label', 'threshold', 'ci'}, ...]；ci 为 [下界, 上界] 或 None
+
+        给定 cache 时先查缓存：不需要区间时缓存概率 (与 score_records 共用条目)，需要区间时
+        键中附加区间水平、缓存 (概率, 下界, 上界)。标签按阈值现算，因此阈值变化不影响缓存。
+        模型不支持区间时 (逻辑回归) 忽略 interval。
+        """
+        threshold = self.thresholds[model_name] if threshold is None else threshold
+        if interval and not hasattr(self.models.get(model_name), 'predict_proba_interval'):
+            interval = None
+        if interval:
+            def score(batch):
+                result = self.predict_columns(records_to_columns(batch), model_name, threshold, interval)
+                return list(zip(result['probability'].tolist(), result['ci_low'].tolist(),
+                                result['ci_high'].tolist()))
+
+            if cache is None:
+                scored = score(records)
+            else:
+                scored = self._cached(records, model_name, cache, score, (interval,))
+            return [{'probability': p, 'label': int(p > threshold), 'threshold': threshold, 'ci': [low, high]}
+                    for p, low, high in scored]
+        probabilities = self.score_records(records, model_name, cache)
+        return [{'probability': p, 'label': int(p > threshold), 'threshold': threshold, 'ci': None}
+                for p in probabilities]
+
+    def explainer(self, model_name):
+        """该模型的解释器 (构建一次后缓存)；模型不支持解释时抛出 ValueError"""
+        if model_name not in self._explainers:
+            from .explain import make_explainer
+            self._explainers[model_name] = make_explainer(self.model(model_name))
+        return self._explainers[model_name]
+
+    def explain_columns(self, columns, model_name):
+        """返回 (基准值, 贡献矩阵 (n, 特征数))，见 explain.py"""
+        explainer = self.explainer(model_name)
+        return explainer.expected_value, explainer.explain(self.matrix(columns, model_name))
+
+    def explain_records(self, records, model_name):
+        """[{'space', 'base', 'contributions': {特征: 贡献}}, ...]"""
+        explainer = self.explainer(model_name)
+        base, phi = self.explain_columns(records_to_columns(records), model_name)
+        return [{'space': explainer.space, 'base': base, 'contributions': dict(zip(explainer.features, row))}
+                for row in phi.tolist()]
+
+    def cache_key(self, record, model_name):
+        return (model_name, self.versions.get(model_name), canonical_features(record, model_name))
+
+    def score_records(self, records, model_name, cache=None):
+        """对若干条患者记录评分，返回概率列表
+
+        给定 cache (PredictionCache) 时先查缓存，未命中的记录合并为一次矩阵评分。
+        """
+        def score(batch):
+            return self.score_columns(records_to_columns(batch), model_name).tolist()
+
+        if cache is None:
+            return score(records)
+        return self._cached(records, model_name, cache, score)
+
+    def _cached(self, records, model_name, cache, score, suffix=()):
+        """先查缓存 (键为 cache_key + suffix)，未命中的记录合并为一次 score(记录列表) 调用"""
+        version = self.versions.get(model_name)
+        with span('cache'):
+            keys = [self.cache_key(record, model_name) + suffix for record in records]
+            results = [cache.get(key) for key in keys]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            scored = score([records[i] for i in misses])
+            # 评分期间模型被换掉 (swap) 时结果不入缓存，以免挂在旧版本的键下
+            current = self.versions.get(model_name) == version
+            for i, value in zip(misses, scored):
+                results[i] = value
+                if current:
+                    cache.put(keys[i], value)
+        return results
+
+
+def add_model_arguments(parser):
+    """命令行中选择模型来源的公共参数"""
+    parser.add_argument("--table", metavar="DIR",
+                        help="Random Forest lookup table directory (see build-table)")
+    parser.add_argument("--table-only", action="store_true",
+                        help="Score from the lookup table only, without loading the pickled models")
+    parser.add_argument("--threshold", type=float,
+                        help=f"Decision threshold for the label, all models (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--artifacts", metavar="DIR",
+                        help="Exported model directory (see export, default: artifacts)")
+    parser.add_argument("--registry", metavar="DIR",
+                        help="Versioned model registry; its current versions take precedence (see registry)")
+
+
+def scorer_from_args(args):
+    thresholds = None if args.threshold is None else {name: args.threshold for name in MODEL_FEATURES}
+    tables = None
+    if args.table:
+        from .lookup import RiskTable
+        tables = {'Random Forest': RiskTable.load(args.table)}
+    if args.table_only:
+        if not tables:
+            raise SystemExit("--table-only requires --table")
+        return Scorer({}, tables=tables, thresholds=thresholds)
+    scorer = Scorer.load(tables=tables, artifact_dir=args.artifacts, thresholds=thresholds,
+                         registry=args.registry)
+    if scorer.stale_tables:
+        raise SystemExit(f"Lookup table does not match the current model file: {scorer.stale_tables}")
+    return scorer
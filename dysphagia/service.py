@@ -0,0 +1,672 @@
+"""本地 HTTP 推理服务 (asyncio)，对并发的单患者请求做微批处理
+
+    python -m dysphagia serve --port 8600
+    python -m dysphagia serve --port 8600 --workers 4
+
+接口:
+    POST /predict        {"model": "Random Forest", "features": {...}}
+                         -> {"model", "probability", "label", "threshold"}
+    POST /predict/batch  {"model": "Random Forest", "patients": [...]}
+                         -> {"model", "probabilities", "labels", "threshold"}
+                         两者加 "explain": true 时附带逐特征贡献 ("explanation" / "explanations")
+
+响应中的 label 按判定阈值 (--threshold，或请求中的 "threshold") 给出；请求加
+"interval": 0.9 时随机森林在同一次遍历中返回各树投票区间 "ci": [下界, 上界] (批量为 "cis")。
+特征按 schema.py 校验 (接受 height 等别名)，超出范围或非数值时返回 400 与逐列的
+"errors"；批量请求整批一次向量化校验，errors 中的 rows 为患者序号。
+    GET  /metrics        延迟 p50/p99、批大小直方图与缓存命中率
+    GET  /metrics/prometheus  同上以及各评分阶段的耗时直方图、特征漂移指标 (Prometheus 文本格式)
+    GET  /metrics/drift  各特征与预测概率的流式统计及相对参考分布的 PSI (见 drift.py)；"state" 为
+                         可跨工作进程合并的原始统计量
+    GET  /health
+
+几毫秒内到达的单患者请求被合并为一次 predict_proba 矩阵调用；重复的特征向量
+直接由 PredictionCache 返回，不进入批处理。
+
+--workers N (仅 POSIX) 为预派生 (prefork) 模式：父进程只加载一次模型并监听端口，
+然后 fork 出 N 个工作进程共享同一个监听套接字，各自运行事件循环和微批处理。
+模型数组 (FlatForest / FusedLogistic / 查找表) 在 fork 前已就绪，只读访问不会触发
+写时复制；artifacts/ 或查找表的内存映射本身就在页缓存中共享。缓存与 /metrics
+按工作进程分别统计。
+
+--neighbors DIR 时加载相似患者索引 (见 neighbors.py，fork 前内存映射、各进程共享)，
+请求加 "neighbors": k 时返回 k 个最相似的参考患者 ("neighbors" / 批量为逐患者的列表)。
+
+--audit DIR 时每个预测请求 (特征、模型版本、概率、标签、耗时) 记入审计日志 (见 audit.py)：
+请求路径只入队，每个工作进程的后台线程批量写入各自的段文件。
+
+每个评分的患者都计入工作进程内的漂移监测 (drift.DriftMonitor，内存与请求数无关)；参考分布
+默认取自 STATS_CONFIG，--drift-reference FILE 时使用 drift 子命令保存的参考队列统计。
+
+--registry DIR --watch SECONDS 时每个工作进程各自轮询模型仓库 (见 registry.py)，
+新发布的版本经金丝雀校验后原子地换入，不重启进程、不中断请求；/health 与 /metrics
+给出各模型当前的版本。
+"""
+import asyncio
+import bisect
+import collections
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+from .cache import DEFAULT_MAXSIZE, DEFAULT_TTL, PredictionCache
+from .features import MODEL_FEATURES
+from .schema import SchemaError, canonical_name, rename_record, validate_columns, validate_record
+from .scoring import DEFAULT_INTERVAL, add_model_arguments, records_to_columns, scorer_from_args
+from .telemetry import PROFILE_ENV, TELEMETRY, trace
+
+DEFAULT_MODEL = 'Random Forest'
+DEFAULT_MAX_BATCH = 256
+DEFAULT_MAX_WAIT_MS = 2.0
+
+# 批大小直方图的上界
+BATCH_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+HTTP_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}
+
+
+class ServiceMetrics:
+    """请求延迟 (最近 window 个，毫秒) 与批大小直方图"""
+
+    def __init__(self, window=10_000):
+        self.latencies = collections.deque(maxlen=window)
+        self.batch_counts = [0] * (len(BATCH_BUCKETS) + 1)
+        self.requests = 0
+        self.errors = 0
+        self.rows = 0
+
+    def observe_request(self, seconds, error=False):
+        self.requests += 1
+        self.errors += error
+        self.latencies.append(seconds * 1000)
+
+    def observe_batch(self, size):
+        self.rows += size
+        self.batch_counts[bisect.bisect_left(BATCH_BUCKETS, size)] += 1
+
+    def percentile(self, q):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def snapshot(self):
+        labels = [f"<={b}" for b in BATCH_BUCKETS] + [f">{BATCH_BUCKETS[-1]}"]
+        batches = sum(self.batch_counts)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'rows_scored': self.rows,
+            'latency_ms': {'p50': self.percentile(50), 'p99': self.percentile(99)},
+            'batches': batches,
+            'mean_batch_size': self.rows / batches if batches else 0.0,
+            'batch_size_histogram': dict(zip(labels, self.batch_counts)),
+        }
+
+    def prometheus(self, prefix='dysphagia'):
+        lines = [
+            f"# TYPE {prefix}_requests_total counter",
+            f"{prefix}_requests_total {self.requests}",
+            f"# TYPE {prefix}_request_errors_total counter",
+            f"{prefix}_request_errors_total {self.errors}",
+            f"# TYPE {prefix}_rows_scored_total counter",
+            f"{prefix}_rows_scored_total {self.rows}",
+            f"# HELP {prefix}_request_latency_seconds Latency of the last {self.latencies.maxlen} requests.",
+            f"# TYPE {prefix}_request_latency_seconds summary",
+        ]
+        for q in (0.5, 0.9, 0.99):
+            lines.append(f'{prefix}_request_latency_seconds{{quantile="{q}"}} {self.percentile(q * 100) / 1000!r}')
+        lines.append(f"{prefix}_request_latency_seconds_sum {sum(self.latencies) / 1000!r}")
+        lines.append(f"{prefix}_request_latency_seconds_count {len(self.latencies)}")
+        lines.append(f"# TYPE {prefix}_batch_size histogram")
+        cumulative = 0
+        for bound, count in zip(BATCH_BUCKETS + ['+Inf'], self.batch_counts):
+            cumulative += count
+            lines.append(f'{prefix}_batch_size_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{prefix}_batch_size_sum {self.rows}")
+        lines.append(f"{prefix}_batch_size_count {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+class MicroBatcher:
+    """收集 max_wait 秒内到达的单患者请求，合并成一次矩阵评分"""
+
+    def __init__(self, scorer, model_name, metrics, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait=DEFAULT_MAX_WAIT_MS / 1000):
+        self.scorer = scorer
+        self.model_name = model_name
+        self.metrics = metrics
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, record):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((record, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _score(self, records):
+        with trace('batch', model=self.model_name):
+            return self.scorer.score_columns(records_to_columns(records), self.model_name)
+
+    def _score_each(self, records):
+        """逐条评分，返回 [(概率, None) 或 (None, 异常)]"""
+        results = []
+        for record in records:
+            try:
+                results.append((float(self._score([record])[0]), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+    @staticmethod
+    def _resolve(future, result=None, error=None):
+        # 客户端断开时请求的 future 已被取消，不能再设置结果
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            records = [record for record, _ in batch]
+            self.metrics.observe_batch(len(batch))
+            try:
+                # sklearn 调用放到线程池，事件循环可以继续接收下一批请求
+                probabilities = await loop.run_in_executor(None, self._score, records)
+            except Exception as e:
+                if len(batch) == 1:
+                    self._resolve(batch[0][1], error=e)
+                    continue
+                # 整批失败时逐条重试 (同样在线程池中)，只让有问题的请求报错
+                results = await loop.run_in_executor(None, self._score_each, records)
+                for (_, future), (p, error) in zip(batch, results):
+                    self._resolve(future, p, error)
+                continue
+            for (_, future), p in zip(batch, probabilities):
+                self._resolve(future, float(p))
+
+
+class BadRequest(Exception):
+    status = 400
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        # schema.py 的逐列错误 (列名、错误类型、出错的患者序号)
+        self.errors = errors
+
+
+class InferenceService:
+    def __init__(self, scorer, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS, cache=None,
+                 watcher=None, neighbors=None, audit=None, drift=None):
+        self.scorer = scorer
+        self.cache = cache
+        if drift is None:
+            from .drift import DriftMonitor
+            drift = DriftMonitor()
+        # drift.DriftMonitor，统计每个评分患者的特征与概率
+        self.drift = drift
+        # audit.AuditLog，记录每个预测请求
+        self.audit = audit
+        # neighbors.NeighborIndex，未加载时请求中的 "neighbors" 返回 400
+        self.neighbors = neighbors
+        # registry.ModelWatcher，热更新模型时给出 /metrics 中的版本与换入记录
+        self.watcher = watcher
+        self.metrics = ServiceMetrics()
+        self.batchers = {name: MicroBatcher(scorer, name, self.metrics, max_batch, max_wait_ms / 1000)
+                         for name in MODEL_FEATURES if scorer.available(name)}
+
+    def _model_name(self, payload):
+        name = payload.get('model', DEFAULT_MODEL)
+        if name not in self.batchers:
+            raise BadRequest(f"Unknown or unavailable model: {name}")
+        return name
+
+    def _options(self, payload, name):
+        """请求中的判定阈值与投票区间水平 (缺省为 scorer.thresholds[name] 与不计算区间)"""
+        threshold = payload.get('threshold', self.scorer.thresholds[name])
+        if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 <= threshold <= 1:
+            raise BadRequest("'threshold' must be a number between 0 and 1")
+        interval = payload.get('interval')
+        if interval is True:
+            interval = DEFAULT_INTERVAL
+        elif interval in (None, False):
+            interval = None
+        elif isinstance(interval, bool) or not isinstance(interval, (int, float)) or not 0 < interval < 1:
+            raise BadRequest("'interval' must be true or a level between 0 and 1")
+        return float(threshold), interval
+
+    def _neighbor_count(self, payload):
+        """请求中的相似患者个数 k (未请求时为 None)"""
+        k = payload.get('neighbors')
+        if k in (None, False, 0):
+            return None
+        if self.neighbors is None:
+            raise BadRequest("Similar-patient lookup is not enabled (start the service with --neighbors)")
+        if k is True:
+            from .neighbors import DEFAULT_K
+            k = DEFAULT_K
+        if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= self.neighbors.max_k:
+            raise BadRequest(f"'neighbors' must be an integer between 1 and {self.neighbors.max_k}")
+        return k
+
+    async def _similar(self, patients, k):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.neighbors.neighbor_records, records_to_columns(patients), k)
+
+    async def predict(self, payload):
+        start = time.perf_counter()
+        name = self._model_name(payload)
+        features = payload.get('features')
+        if not isinstance(features, dict):
+            raise BadRequest("'features' must be an object")
+        threshold, interval = self._options(payload, name)
+        k = self._neighbor_count(payload)
+        try:
+            features = validate_record(features, name)
+        except SchemaError as e:
+            raise BadRequest(str(e), e.errors)
+        ci = None
+        if interval:
+            # 区间需要逐树的概率，不走微批；缓存键附加区间水平 (见 Scorer.predict_records)
+            record = (await self._predict_records([features], name, threshold, interval))[0]
+            probability, ci = record['probability'], record['ci']
+        else:
+            try:
+                key = self.scorer.cache_key(features, name)
+            except (ValueError, TypeError) as e:
+                raise BadRequest(str(e))
+            probability = self.cache.get(key) if self.cache is not None else None
+            if probability is None:
+                try:
+                    probability = await self.batchers[name].submit(features)
+                except (ValueError, TypeError) as e:
+                    raise BadRequest(str(e))
+                # 等待期间模型被换掉时不写入缓存 (见 Scorer.swap)
+                if self.cache is not None and self.scorer.versions.get(name) == key[1]:
+                    self.cache.put(key, probability)
+        result = {'model': name, 'probability': probability, 'label': int(probability > threshold),
+                  'threshold': threshold}
+        if ci is not None:
+            result['ci'] = ci
+        if payload.get('explain'):
+            result['explanation'] = (await self._explain([features], name))[0]
+        if k:
+            result['neighbors'] = (await self._similar([features], k))[0]
+        self.drift.observe(features, {name: probability})
+        if self.audit is not None:
+            self.audit.log(name, self.scorer.versions.get(name), features, probability, result['label'], threshold,
+                           time.perf_counter() - start)
+        return result
+
+    async def _explain(self, patients, name):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self.scorer.explain_records, patients, name)
+        except (ValueError, TypeError, RuntimeError) as e:
+            raise BadRequest(str(e))
+
+    async def predict_batch(self, payload):
+        start = time.perf_counter()
+        name = self._model_name(payload)
+        patients = payload.get('patients')
+        if not isinstance(patients, list) or not all(isinstance(p, dict) for p in patients):
+            raise BadRequest("'patients' must be a list of objects")
+        threshold, interval = self._options(payload, name)
+        k = self._neighbor_count(payload)
+        patients = self._validate_patients(patients, name)
+        records = []
+        if patients:
+            records = await self._predict_records(patients, name, threshold, interval)
+            self.metrics.observe_batch(len(patients))
+        result = {'model': name, 'probabilities': [r['probability'] for r in records],
+                  'labels': [r['label'] for r in records], 'threshold': threshold}
+        if interval:
+            result['cis'] = [r['ci'] for r in records]
+        if payload.get('explain') and patients:
+            result['explanations'] = await self._explain(patients, name)
+        if k:
+            result['neighbors'] = await self._similar(patients, k) if patients else []
+        if patients:
+            columns = records_to_columns(patients)
+            self.drift.update(columns, {name: result['probabilities']})
+            if self.audit is not None:
+                self.audit.log_columns(name, self.scorer.versions.get(name), columns, result['probabilities'],
+                                       result['labels'], threshold, time.perf_counter() - start)
+        return result
+
+    def _validate_patients(self, patients, name):
+        """整批按 schema 一次向量化校验；有患者使用别名时先逐条改用模型列名"""
+        if not patients:
+            return patients
+        if any(canonical_name(key) != key for key in set().union(*patients)):
+            patients = [rename_record(patient) for patient in patients]
+        try:
+            validate_columns(records_to_columns(patients), [name], errors='raise')
+        except SchemaError as e:
+            raise BadRequest(str(e), e.errors)
+        return patients
+
+    async def _predict_records(self, patients, name, threshold, interval):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self._traced_predict, patients, name, threshold, interval)
+        except (ValueError, TypeError) as e:
+            raise BadRequest(str(e))
+
+    def _traced_predict(self, patients, name, threshold, interval):
+        with trace('predict_batch', model=name):
+            return self.scorer.predict_records(patients, name, threshold, interval, self.cache)
+
+    async def dispatch(self, method, path, body):
+        """返回 (状态码, JSON 对象或 Prometheus 文本)"""
+        routes = {
+            ('POST', '/predict'): self.predict,
+            ('POST', '/predict/batch'): self.predict_batch,
+        }
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'models': list(self.batchers), 'versions': dict(self.scorer.versions),
+                         'pid': os.getpid()}
+        if method == 'GET' and path == '/metrics':
+            snapshot = self.metrics.snapshot()
+            snapshot['pid'] = os.getpid()
+            if self.cache is not None:
+                snapshot['cache'] = self.cache.stats()
+            if self.watcher is not None:
+                snapshot['registry'] = self.watcher.snapshot()
+            if self.audit is not None:
+                snapshot['audit'] = self.audit.stats()
+            return 200, snapshot
+        if method == 'GET' and path == '/metrics/prometheus':
+            return 200, self.metrics.prometheus() + TELEMETRY.prometheus() + self.drift.prometheus()
+        if method == 'GET' and path == '/metrics/drift':
+            return 200, {**self.drift.report(), 'pid': os.getpid(), 'state': self.drift.to_dict()}
+        handler = routes.get((method, path))
+        if handler is None:
+            known = {p for _, p in routes} | {'/health', '/metrics', '/metrics/prometheus', '/metrics/drift'}
+            return (405 if path in known else 404), {'error': f"{method} {path}"}
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'error': "Invalid JSON body"}
+        if not isinstance(payload, dict):
+            return 400, {'error': "JSON body must be an object"}
+        try:
+            return 200, await handler(payload)
+        except BadRequest as e:
+            if e.errors:
+                return e.status, {'error': str(e), 'errors': e.errors}
+            return e.status, {'error': str(e)}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                    if not request_line:
+                        break
+                    start = time.perf_counter()
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b'\r\n', b'\n', b''):
+                            break
+                        key, _, value = line.decode('latin-1').partition(':')
+                        headers[key.strip().lower()] = value.strip()
+                except ValueError:
+                    # 请求行或某个头部超过 StreamReader 的行长度上限
+                    await self._respond(writer, 431, {'error': "Request line or header too long"}, False)
+                    break
+                try:
+                    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    # 请求行无法解析，也就无法确定请求体的边界：回复后关闭连接
+                    await self._respond(writer, 400, {'error': "Malformed request line"}, False)
+                    break
+
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # 无法确定请求体的边界，回复后关闭连接
+                    status, result = 400, {'error': "Invalid Content-Length header"}
+                elif length > MAX_BODY_BYTES:
+                    status, result = 413, {'error': "Request body too large"}
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    try:
+                        status, result = await self.dispatch(method.upper(), target.split('?', 1)[0], body)
+                    except Exception as e:
+                        status, result = 500, {'error': str(e)}
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and 0 <= length <= MAX_BODY_BYTES
+                await self._respond(writer, status, result, keep_alive)
+                if target.startswith('/predict'):
+                    self.metrics.observe_request(time.perf_counter() - start, error=status != 200)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, result, keep_alive):
+        if isinstance(result, str):
+            data, content_type = result.encode(), "text/plain; version=0.0.4"
+        else:
+            data, content_type = json.dumps(result).encode(), "application/json"
+        writer.write(
+            f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8600, ready=None, sock=None):
+        """监听 host:port；给定 sock 时改为接受该 (已绑定的) 套接字上的连接"""
+        for batcher in self.batchers.values():
+            batcher.start()
+        if sock is not None:
+            server = await asyncio.start_server(self.handle_connection, sock=sock)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for batcher in self.batchers.values():
+                await batcher.stop()
+            if self.audit is not None:
+                # 写完积压的审计记录
+                self.audit.close()
+
+
+# 工作进程启动后这么快就退出视为启动失败，不再重启 (避免无限重启循环)
+MIN_WORKER_UPTIME = 1.0
+
+
+def listen(host='127.0.0.1', port=8600, backlog=1024):
+    """创建由所有工作进程共享的监听套接字"""
+    sock = socket.create_server((host, port), backlog=backlog)
+    sock.setblocking(False)
+    return sock
+
+
+def _worker(make_service, sock):
+    """子进程入口：新建事件循环与服务，永不返回"""
+    # SIGTERM 与 SIGINT 一样结束事件循环，serve() 的清理 (停止微批、写完审计日志) 得以执行
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    code = 0
+    try:
+        asyncio.run(make_service().serve(sock=sock))
+    except KeyboardInterrupt:
+        pass
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def serve_workers(make_service, sock, workers, on_start=None):
+    """预派生 workers 个工作进程并监督它们，直到收到 SIGINT/SIGTERM
+
+    make_service 在子进程中调用，应只引用父进程已加载好的 Scorer。
+    工作进程异常退出时自动重启；on_start(pids) 在首批工作进程启动后调用。
+    """
+    if not hasattr(os, 'fork'):
+        raise RuntimeError("--workers requires os.fork (POSIX)")
+    # 把已加载的对象移出 GC 跟踪，子进程的垃圾回收不会写这些对象头而复制页面
+    gc.collect()
+    gc.freeze()
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _worker(make_service, sock)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(workers):
+        spawn()
+    previous = {sig: signal.signal(sig, stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+    if on_start is not None:
+        on_start(list(children))
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = children.pop(pid, None)
+            if stopping or started is None:
+                continue
+            if time.monotonic() - started < MIN_WORKER_UPTIME:
+                print(f"Worker {pid} failed on startup (status {status}), shutting down", file=sys.stderr)
+                stop(None, None)
+                continue
+            print(f"Worker {pid} exited (status {status}), restarting", file=sys.stderr)
+            spawn()
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        sock.close()
+
+
+def add_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                        help="Largest micro-batch per predict_proba call")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="How long to wait for more requests before scoring a batch")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAXSIZE,
+                        help="Prediction cache entries (0 disables the cache)")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL, help="Prediction cache TTL in seconds")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Prefork this many worker processes sharing the models loaded once in the parent")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="Poll --registry this often and hot-swap newly published model versions")
+    parser.add_argument("--audit", metavar="DIR",
+                        help="Append every prediction (features, model version, probability, latency) to this audit log")
+    parser.add_argument("--neighbors", metavar="DIR",
+                        help="Neighbor index from build-neighbors; enables \"neighbors\": k in requests")
+    parser.add_argument("--drift-reference", metavar="FILE",
+                        help="Reference statistics from the drift command for /metrics/drift (default: STATS_CONFIG)")
+    parser.add_argument("--profile", metavar="DIR",
+                        help=f"cProfile every scoring call into DIR (same as {PROFILE_ENV}=DIR)")
+    add_model_arguments(parser)
+
+
+def run(args):
+    if args.profile:
+        os.environ[PROFILE_ENV] = args.profile
+    if args.watch and not args.registry:
+        raise SystemExit("--watch requires --registry")
+    scorer = scorer_from_args(args)
+    index = None
+    if args.neighbors:
+        from .neighbors import NeighborIndex
+        index = NeighborIndex.load(args.neighbors)
+    from .drift import DriftMonitor, load_reference
+    reference = load_reference(args.drift_reference) if args.drift_reference else None
+
+    def make_service():
+        # 在工作进程中调用：轮询线程不能跨 fork 存活，每个进程各自启动
+        cache = PredictionCache(args.cache_size, args.cache_ttl) if args.cache_size > 0 else None
+        watcher = None
+        if args.watch:
+            from .registry import ModelWatcher
+            watcher = ModelWatcher(scorer, args.registry, args.watch).start()
+        audit = None
+        if args.audit:
+            from .audit import AuditLog
+            audit = AuditLog(args.audit, 'service').start()
+        return InferenceService(scorer, args.max_batch, args.max_wait_ms, cache, watcher, index, audit,
+                                DriftMonitor(reference))
+
+    models = [name for name in MODEL_FEATURES if scorer.available(name)]
+    if args.workers > 1:
+        sock = listen(args.host, args.port)
+        print(f"Serving {models} on http://{args.host}:{args.port} with {args.workers} workers", flush=True)
+        serve_workers(make_service, sock, args.workers)
+        return
+    print(f"Serving {models} on http://{args.host}:{args.port}", flush=True)
+    try:
+        asyncio.run(make_service().serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
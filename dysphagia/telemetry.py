@@ -0,0 +1,199 @@
+"""预测路径的分段计时、按请求的 cProfile 剖析与 Prometheus 文本导出
+
+    with trace('diagnosis', model='Random Forest'):   # 一次请求
+        with span('matrix'):                          # 请求中的一个阶段
+            ...
+
+span() 记入当前线程/协程上下文中活动的 trace，没有活动 trace 时什么也不做，因此
+Scorer 内部的 cache / matrix / predict 阶段可以常驻埋点。trace 结束时把各阶段耗时
+汇总进 TELEMETRY (进程内共享)，并保留最近的若干条请求供诊断页查看。
+
+设置环境变量 DYSPHAGIA_PROFILE=<目录> (或 trace(profile_dir=...)) 后，每个 trace
+都在 cProfile 下运行，结果写成 <目录>/<时间>-<名称>.prof 与按累计耗时排序的 .txt。
+"""
+import bisect
+import collections
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+# 直方图桶上界 (秒)
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+PROFILE_ENV = "DYSPHAGIA_PROFILE"
+
+# .txt 剖析摘要中保留的函数行数
+PROFILE_TOP = 30
+
+# 整个 trace 的耗时记为该阶段
+TOTAL = 'total'
+
+_current = contextvars.ContextVar('dysphagia_trace', default=None)
+
+
+class Trace:
+    """一次请求：名称、标签 (如 model) 与按发生顺序记录的 [(阶段, 秒)]"""
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.stages = []
+        self.started = time.time()
+        self.seconds = None
+        self.profile_path = None
+
+    def as_dict(self):
+        return {
+            'trace': self.name,
+            **self.labels,
+            'started': self.started,
+            'total_ms': None if self.seconds is None else self.seconds * 1000,
+            'stages_ms': {stage: seconds * 1000 for stage, seconds in self.stages},
+            'profile': self.profile_path,
+        }
+
+
+class _StageStats:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self, n_buckets):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (n_buckets + 1)
+
+
+class Telemetry:
+    """按 (trace 名称, 标签, 阶段) 聚合的计数、耗时和直方图；线程安全"""
+
+    def __init__(self, recent=200, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.recent = collections.deque(maxlen=recent)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, stage, seconds):
+        key = (name, tuple(sorted(labels.items())), stage)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _StageStats(len(self.buckets))
+            stats.count += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            stats.buckets[bisect.bisect_left(self.buckets, seconds)] += 1
+
+    def record(self, trace):
+        # 同一阶段在一次请求中出现多次时合并计入
+        merged = collections.defaultdict(float)
+        for stage, seconds in trace.stages:
+            merged[stage] += seconds
+        merged[TOTAL] = trace.seconds
+        for stage, seconds in merged.items():
+            self.observe(trace.name, trace.labels, stage, seconds)
+        with self._lock:
+            self.recent.append(trace)
+
+    def recent_traces(self, n=None):
+        with self._lock:
+            traces = list(self.recent)
+        if n:
+            traces = traces[-n:]
+        return [t.as_dict() for t in traces]
+
+    def snapshot(self):
+        """[{trace, 标签..., stage, count, mean_ms, max_ms}]，按 trace 与阶段排序"""
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] == TOTAL))
+            return [{'trace': name, **dict(labels), 'stage': stage, 'count': s.count,
+                     'mean_ms': s.total / s.count * 1000, 'max_ms': s.max * 1000}
+                    for (name, labels, stage), s in items]
+
+    def prometheus(self, prefix='dysphagia'):
+        """Prometheus 文本格式 (0.0.4) 的阶段耗时直方图"""
+        metric = f"{prefix}_stage_seconds"
+        lines = [f"# HELP {metric} Time spent in each stage of a traced prediction request.",
+                 f"# TYPE {metric} histogram"]
+        with self._lock:
+            for (name, labels, stage), s in sorted(self._stats.items()):
+                label_text = format_labels({'trace': name, **dict(labels), 'stage': stage})
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), s.buckets):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket{label_text[:-1]},le="{le}"}} {cumulative}')
+                lines.append(f"{metric}_sum{label_text} {s.total!r}")
+                lines.append(f"{metric}_count{label_text} {s.count}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+            self.recent.clear()
+
+
+def format_labels(labels):
+    """{'a': 'x'} -> '{a="x"}'，按 Prometheus 规则转义"""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+# 进程内共享的默认注册表
+TELEMETRY = Telemetry()
+
+
+@contextlib.contextmanager
+def span(stage):
+    """把代码块的耗时记为当前 trace 的一个阶段；没有活动 trace 时不计时"""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.stages.append((stage, time.perf_counter() - start))
+
+
+def _dump_profile(profiler, directory, name):
+    import io
+    import pstats
+
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 1_000_000_000:09d}"
+    path = os.path.join(directory, f"{stamp}-{name}")
+    profiler.dump_stats(path + ".prof")
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+    with open(path + ".txt", 'w') as f:
+        f.write(out.getvalue())
+    return path + ".txt"
+
+
+@contextlib.contextmanager
+def trace(name, registry=None, profile_dir=None, **labels):
+    """一次请求的计时上下文；结束时汇总进 registry (默认 TELEMETRY)
+
+    profile_dir 为空时读取环境变量 DYSPHAGIA_PROFILE；给定目录则对本次请求做 cProfile 剖析。
+    """
+    current = Trace(name, labels)
+    token = _current.set(current)
+    profile_dir = profile_dir or os.environ.get(PROFILE_ENV)
+    profiler = None
+    if profile_dir:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            current.profile_path = _dump_profile(profiler, profile_dir, name)
+        _current.reset(token)
+        (registry or TELEMETRY).record(current)
@@ -0,0 +1,49 @@
+"""测试共用的夹具：模型文件按仓库根目录的相对路径加载，因此先切换到根目录"""
+import os
+import sys
+import warnings
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from dysphagia.features import sample_patients, unwrap_model  # noqa: E402
+from dysphagia.models import load_models  # noqa: E402
+
+
+def pytest_configure(config):
+    # pickle 中的模型带特征名，测试按 numpy 矩阵评分 (与 Scorer 一致)
+    config.addinivalue_line('filterwarnings', 'ignore:X does not have valid feature names:UserWarning')
+
+
+@pytest.fixture(scope='session')
+def pipelines():
+    """{模型名称: 仓库自带 pickle 中的 sklearn 模型}"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        loaded = load_models()
+    return {name: unwrap_model(obj)[0] for name, obj in loaded.items()}
+
+
+@pytest.fixture(scope='session')
+def patients():
+    """侧边栏取值范围内的一批固定患者 {特征: 数组}；行数不是遍历块大小的整数倍"""
+    return sample_patients(1000, seed=1)
+
+
+@pytest.fixture(scope='session')
+def scaled_logistic(patients):
+    """pipeline 内含 StandardScaler 的逻辑回归 (与 manual_standardization 叠加会二次标准化)"""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    from dysphagia.features import FEATURES_LR
+    from dysphagia.scoring import feature_matrix
+
+    X = feature_matrix(patients, 'Logistic Regression', standardize=False)
+    y = (X[:, FEATURES_LR.index('age')] > 75).astype(int)
+    return Pipeline([('scaler', StandardScaler()), ('clf', LogisticRegression(solver='liblinear'))]).fit(X, y)
@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from dysphagia.artifact import (
+    ARTIFACT_SUBDIRS, META_FILE, ArtifactError, export_model, load_artifact, load_artifacts, read_meta,
+)
+from dysphagia.models import MODEL_FILES, file_hash
+from dysphagia.scoring import feature_matrix
+
+RF = 'Random Forest'
+LR = 'Logistic Regression'
+
+
+@pytest.fixture(scope='module')
+def root(pipelines, tmp_path_factory):
+    """按 export 命令的目录结构导出仓库自带的两个模型"""
+    root = str(tmp_path_factory.mktemp("artifacts"))
+    for name, subdir in ARTIFACT_SUBDIRS.items():
+        export_model(pipelines[name], name, os.path.join(root, subdir), file_hash(MODEL_FILES[name]))
+    return root
+
+
+@pytest.mark.parametrize('name', [RF, LR])
+def test_mmap_load_matches_pickle(pipelines, patients, root, name):
+    model, meta = load_artifact(os.path.join(root, ARTIFACT_SUBDIRS[name]))
+    assert meta['model_name'] == name and meta['source_hash'] == file_hash(MODEL_FILES[name])
+    assert meta['feature_importances']
+    # 逻辑回归的标准化已折叠进系数，输入原始单位
+    raw = feature_matrix(patients, name, standardize=False)
+    raw[::7, 0] = np.nan
+    expected = feature_matrix(patients, name)
+    expected[::7, 0] = np.nan
+    np.testing.assert_allclose(model.predict_proba(raw), pipelines[name].predict_proba(expected),
+                               rtol=0, atol=1e-12)
+
+
+def test_arrays_are_memory_mapped(root):
+    # FlatForest 直接引用只读映射 (np.asarray 不复制)
+    model, _ = load_artifact(os.path.join(root, ARTIFACT_SUBDIRS[RF]))
+    assert isinstance(model.value.base, np.memmap) and not model.value.flags.writeable
+    model, _ = load_artifact(os.path.join(root, ARTIFACT_SUBDIRS[RF]), mmap=False)
+    assert model.value.flags.writeable
+
+
+def tamper(root, tmp_path, edit):
+    """复制随机森林的模型目录并改写其 meta.json"""
+    directory = str(tmp_path / ARTIFACT_SUBDIRS[RF])
+    shutil.copytree(os.path.join(root, ARTIFACT_SUBDIRS[RF]), directory)
+    meta = read_meta(directory)
+    edit(meta)
+    with open(os.path.join(directory, META_FILE), 'w') as f:
+        json.dump(meta, f)
+    return directory
+
+
+@pytest.mark.parametrize('key, value', [('dtype', 'float32'), ('shape', [1, 2, 3])])
+def test_tampered_meta_is_rejected(root, tmp_path, key, value):
+    directory = tamper(root, tmp_path, lambda meta: meta['arrays']['value'].update({key: value}))
+    with pytest.raises(ArtifactError, match="value.npy"):
+        load_artifact(directory)
+
+
+def test_unsupported_format(root, tmp_path):
+    directory = tamper(root, tmp_path, lambda meta: meta.update(format_version=99))
+    with pytest.raises(ArtifactError, match="Unsupported"):
+        load_artifact(directory)
+
+
+def test_stale_artifact_is_skipped(root):
+    versions = {name: file_hash(path) for name, path in MODEL_FILES.items()}
+    models, hashes = load_artifacts(root, versions)
+    assert set(models) == {RF, LR} and hashes == versions
+
+    # pickle 已更新 (哈希不同)：对应目录过期，由调用方退回 pickle
+    models, hashes = load_artifacts(root, {**versions, RF: 'other'})
+    assert set(models) == {LR} and hashes == {LR: versions[LR]}
+    # 未提供版本时不做比对
+    assert set(load_artifacts(root)[0]) == {RF, LR}
@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dysphagia import audit
+from dysphagia.__main__ import main
+from dysphagia.features import FEATURE_DEFAULTS, compute_bmi
+
+RF = 'Random Forest'
+LR = 'Logistic Regression'
+
+
+@pytest.fixture
+def directory(tmp_path):
+    """两个来源各写一批记录；segment_rows 很小，覆盖段文件轮转"""
+    path = str(tmp_path / "audit")
+    log = audit.AuditLog(path, 'service', segment_rows=3)
+    log.log(RF, 'a' * 20, FEATURE_DEFAULTS, 0.7, 1, 0.5, 0.002)
+    log.log_columns(LR, 'v1', {col: [value] * 4 for col, value in FEATURE_DEFAULTS.items()},
+                    np.array([0.1, 0.2, 0.6, 0.9]), np.array([0, 0, 1, 1]), 0.5, 0.01)
+    log.close()
+    assert log.stats()['written'] == 5 and log.errors == 0
+    cli = audit.AuditLog(path, 'cli')
+    cli.log(RF, 'a' * 20, dict(FEATURE_DEFAULTS, age=90), 0.4, 0, 0.5, 0.001)
+    cli.close()
+    return path
+
+
+def test_round_trip(directory):
+    assert len(audit.segments(directory)) == 3
+    records = audit.load_records(directory, source='service')
+    assert len(records) == 5
+    first = records[0]
+    assert first['probability'] == 0.7 and first['label'] == 1
+    assert first['version'] == b'a' * 16  # 版本截断为 16 字节
+    assert first['age'] == FEATURE_DEFAULTS['age']
+    assert first['BMI'] == pytest.approx(compute_bmi(FEATURE_DEFAULTS['weight'], FEATURE_DEFAULTS['hight']), rel=1e-6)
+    assert first['latency_ms'] == pytest.approx(2.0)
+    lr = records[1:]
+    assert lr['probability'].tolist() == [0.1, 0.2, 0.6, 0.9]
+    # 逻辑回归不使用的特征不记录
+    assert np.isnan(lr['CVD']).all() and not np.isnan(lr['age']).any()
+
+    # 段按文件名 (来源、开始时间) 读出
+    frame = audit.to_frame(audit.load_records(directory, model=RF))
+    assert frame['source'].tolist() == ['cli', 'service']
+    assert frame['age'].tolist() == [90, 75]
+
+
+def test_summary(directory):
+    rows = {row['model']: row for row in audit.summarize(directory, by='model')}
+    assert rows[RF]['rows'] == 2 and rows[RF]['positive_rate'] == 0.5
+    assert rows[LR]['rows'] == 4 and rows[LR]['mean_probability'] == pytest.approx(0.45)
+    versions = audit.summarize(directory, by='version')
+    assert [(row['model'], row['version'], row['rows']) for row in versions] == [(LR, 'v1', 4), (RF, 'a' * 16, 2)]
+    assert audit.summarize(directory, since=2 ** 40) == []
+
+
+def test_export(directory, tmp_path, capsys):
+    output = tmp_path / "audit.csv"
+    main(["audit", "--dir", directory, "export", str(output), "--model", LR])
+    df = pd.read_csv(output)
+    assert len(df) == 4 and set(df['model']) == {LR}
+    assert "Exported 4 audit records" in capsys.readouterr().out
+
+
+def test_write_errors_count_lost_records(tmp_path):
+    blocked = tmp_path / "not-a-directory"
+    blocked.write_text("")
+    log = audit.AuditLog(str(blocked), 'cli', log=lambda message: None)
+    log.log_columns(RF, 'v1', {col: [value] * 3 for col, value in FEATURE_DEFAULTS.items()},
+                    [0.1, 0.2, 0.3], [0, 0, 0], 0.5, 0.01)
+    with pytest.raises(OSError):
+        log.flush()
+    assert log.errors == 3 and log.written == 0
+
+
+def test_backlog_limit_drops(tmp_path):
+    log = audit.AuditLog(str(tmp_path / "audit"), 'app', max_pending=2)
+    for _ in range(3):
+        log.log(RF, 'v1', FEATURE_DEFAULTS, 0.5, 0, 0.5, 0.001)
+    log.close()
+    assert log.dropped == 1 and log.written == 2
+    assert not math.isnan(audit.load_records(str(tmp_path / "audit"))['age'][0])
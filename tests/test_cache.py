@@ -0,0 +1,90 @@
+import pytest
+
+from dysphagia.cache import PredictionCache
+from dysphagia.features import FEATURE_DEFAULTS
+from dysphagia.scoring import Scorer
+
+MODEL = 'Random Forest'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    cache = PredictionCache(maxsize=2, ttl=None)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # a 变为最近使用
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+    assert len(cache) == 2
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = PredictionCache(maxsize=10, ttl=5.0, clock=clock)
+    cache.put('a', 1)
+    clock.now = 4.9
+    assert cache.get('a') == 1
+    clock.now = 5.0
+    assert cache.get('a') is None
+    assert len(cache) == 0
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+@pytest.fixture
+def scorer(pipelines):
+    return Scorer(pipelines, versions={MODEL: 'v1'})
+
+
+def test_cache_key_is_canonical(scorer):
+    record = dict(FEATURE_DEFAULTS)
+    same = {k: float(v) for k, v in record.items()}
+    same['BMI'] = 99.0  # BMI 由 weight/hight 推导，传入值不进入键
+    assert scorer.cache_key(record, MODEL) == scorer.cache_key(same, MODEL)
+    heavier = dict(record, weight=record['weight'] + 1)
+    assert scorer.cache_key(record, MODEL) != scorer.cache_key(heavier, MODEL)
+    assert scorer.cache_key(record, MODEL)[:2] == (MODEL, 'v1')
+
+
+def test_cached_scores_match_and_hit(scorer):
+    cache = PredictionCache()
+    records = [dict(FEATURE_DEFAULTS, age=age) for age in (60, 70, 80)]
+    first = scorer.score_records(records, MODEL, cache)
+    assert first == scorer.score_records(records, MODEL)
+    assert cache.stats()['misses'] == 3
+    assert scorer.score_records(records, MODEL, cache) == first
+    assert cache.stats()['hits'] == 3
+    # 带区间的结果使用附加了区间水平的键，与概率条目分开
+    scorer.predict_records(records, MODEL, interval=0.9, cache=cache)
+    assert len(cache) == 6
+
+
+def test_swap_invalidates_entries(scorer):
+    cache = PredictionCache()
+    record = dict(FEATURE_DEFAULTS)
+    scorer.score_records([record], MODEL, cache)
+    scorer.swap(MODEL, scorer.model(MODEL), 'v2')
+    scorer.score_records([record], MODEL, cache)
+    assert cache.stats()['hits'] == 0
+    assert len(cache) == 2
+
+
+def test_swap_during_scoring_is_not_cached(scorer):
+    cache = PredictionCache()
+    record = dict(FEATURE_DEFAULTS)
+
+    def score(batch):
+        # 评分期间模型被换掉
+        scorer.swap(MODEL, scorer.model(MODEL), 'v2')
+        return [0.5] * len(batch)
+
+    assert scorer._cached([record], MODEL, cache, score) == [0.5]
+    assert len(cache) == 0
@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+import pytest
+from sklearn.metrics import cohen_kappa_score, confusion_matrix
+
+from dysphagia.compare import Agreement
+from dysphagia.scoring import Scorer
+
+RF = 'Random Forest'
+LR = 'Logistic Regression'
+
+
+@pytest.fixture(scope='module')
+def results(pipelines, patients):
+    # 两个模型用不同阈值，使交叉表四格都有行
+    return Scorer(pipelines).predict_models(patients, [LR, RF], thresholds={LR: 0.5, RF: 0.45})
+
+
+def part(results, rows):
+    return {name: {key: value[rows] for key, value in result.items() if key in ('probability', 'label')}
+            for name, result in results.items()}
+
+
+def test_summary_matches_sklearn(results):
+    summary = Agreement(LR, RF).update(results).summary()
+    a, b = results[LR], results[RF]
+    assert summary['rows'] == len(a['label'])
+    assert summary['kappa'] == pytest.approx(cohen_kappa_score(a['label'], b['label']), abs=1e-12)
+    (neg, only_b), (only_a, pos) = confusion_matrix(a['label'], b['label'], labels=[0, 1]).tolist()
+    assert (summary['both_negative'], summary['only_b'], summary['only_a'], summary['both_positive']) \
+        == (neg, only_b, only_a, pos)
+    assert min(neg, only_b, only_a, pos) > 0
+    assert summary['agreement_rate'] == pytest.approx(np.mean(a['label'] == b['label']))
+    p, q = a['probability'], b['probability']
+    assert summary['correlation'] == pytest.approx(np.corrcoef(p, q)[0, 1], abs=1e-9)
+    assert summary['mean_abs_diff'] == pytest.approx(np.abs(p - q).mean(), rel=1e-12)
+    assert summary['max_abs_diff'] == np.abs(p - q).max()
+
+
+def test_merged_halves_equal_full_batch(results):
+    n = len(results[LR]['label'])
+    full = Agreement(LR, RF).update(results)
+    merged = Agreement(LR, RF).update(part(results, slice(0, n // 3)))
+    merged.merge(Agreement(LR, RF).update(part(results, slice(n // 3, n))))
+    np.testing.assert_array_equal(merged.table, full.table)
+    for key, value in full.summary().items():
+        assert merged.summary()[key] == (pytest.approx(value, rel=1e-12) if isinstance(value, float) else value)
+
+
+def test_nan_rows_are_skipped(results):
+    partial = part(results, slice(None))
+    partial[RF]['probability'] = partial[RF]['probability'].copy()
+    partial[RF]['probability'][::4] = np.nan
+    keep = np.arange(len(partial[LR]['label'])) % 4 != 0
+    summary = Agreement(LR, RF).update(partial).summary()
+    expected = Agreement(LR, RF).update(part(results, keep)).summary()
+    assert summary['rows'] == keep.sum()
+    assert summary['kappa'] == expected['kappa']
+    assert summary['correlation'] == pytest.approx(expected['correlation'], rel=1e-12)
+
+
+def test_degenerate_inputs():
+    empty = Agreement(LR, RF).summary()
+    assert empty['rows'] == 0 and math.isnan(empty['kappa']) and math.isnan(empty['correlation'])
+    # 概率恒定时相关系数无定义；两个模型全部判为阳性时 kappa 无定义
+    constant = {LR: {'probability': np.full(4, 0.7), 'label': np.ones(4, dtype=int)},
+                RF: {'probability': np.array([0.6, 0.7, 0.8, 0.9]), 'label': np.ones(4, dtype=int)}}
+    summary = Agreement(LR, RF).update(constant).summary()
+    assert summary['agreement_rate'] == 1.0
+    assert math.isnan(summary['kappa']) and math.isnan(summary['correlation'])
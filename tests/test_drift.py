@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from dysphagia.drift import (
+    DRIFT_BINS, SCALAR_UPDATE, DriftMonitor, StreamingStats, bin_edges, load_reference, psi, psi_status,
+)
+from dysphagia.features import sample_patients
+
+RF = 'Random Forest'
+
+
+@pytest.fixture(scope='module')
+def values():
+    rng = np.random.default_rng(0)
+    x = rng.normal(70, 25, 1000)  # 两端都有越界值 (体重范围 30–150)
+    x[::17] = np.nan
+    return x
+
+
+def expected_counts(x, bins):
+    x = x[~np.isnan(x)]
+    low, high, _ = bins
+    inside, _ = np.histogram(x, bin_edges(bins))
+    return [int((x < low).sum()), *inside.tolist(), int((x > high).sum())]
+
+
+def check(stats, x):
+    ok = x[~np.isnan(x)]
+    assert stats.count == len(ok) and stats.missing == len(x) - len(ok)
+    assert stats.mean == pytest.approx(ok.mean(), rel=1e-12)
+    assert stats.std == pytest.approx(ok.std(ddof=1), rel=1e-9)
+    assert (stats.min, stats.max) == (ok.min(), ok.max())
+    assert stats.counts == expected_counts(x, stats.bins)
+
+
+def test_scalar_vector_and_merged_agree(values):
+    bins = DRIFT_BINS['weight']
+    scalar = StreamingStats(bins)
+    for value in values.tolist():
+        scalar.add(value)
+    check(scalar, values)
+
+    vector = StreamingStats(bins)
+    vector.update(values)
+    check(vector, values)
+
+    # 小块走逐个累加，大块走整列运算，再合并两份统计
+    merged, other = StreamingStats(bins), StreamingStats(bins)
+    for start in range(0, 300, SCALAR_UPDATE // 2):
+        merged.update(values[start:min(start + SCALAR_UPDATE // 2, 300)])
+    other.update(values[300:])
+    merged.merge(other)
+    check(merged, values)
+
+    restored = StreamingStats.from_dict(merged.to_dict())
+    check(restored, values)
+    with pytest.raises(ValueError):
+        merged.merge(StreamingStats(DRIFT_BINS['age']))
+
+
+def test_psi():
+    assert psi([10, 20, 30], [1, 2, 3]) == pytest.approx(0.0, abs=1e-12)
+    assert psi([0, 0], [1, 1]) is None
+    assert psi_status(0.05) == 'stable' and psi_status(0.2) == 'moderate' and psi_status(0.3) == 'major'
+
+
+def cohort(seed, age_shift=0):
+    columns = sample_patients(5000, seed)
+    columns['age'] = np.clip(columns['age'] + age_shift, 20, 120)
+    return columns
+
+
+def test_reference_round_trip_and_shift(tmp_path):
+    reference = DriftMonitor()
+    reference.update(cohort(0), {RF: np.linspace(0, 1, 5000)})
+    path = str(tmp_path / "drift_reference.json")
+    reference.save(path)
+    loaded = load_reference(path)
+    np.testing.assert_allclose(loaded['features']['age']['proportions'], reference.features['age'].proportions())
+    assert loaded['features']['age']['mean'] == pytest.approx(reference.features['age'].mean)
+    assert set(loaded['scores']) == {RF}
+
+    same = DriftMonitor(loaded)
+    same.update(cohort(1))
+    shifted = DriftMonitor(loaded)
+    shifted.update(cohort(1, age_shift=40))
+    status = {row['feature']: row['status'] for row in same.report()['features']}
+    assert status['age'] == 'stable' and status['weight'] == 'stable'
+    rows = {row['feature']: row for row in shifted.report()['features']}
+    assert rows['age']['status'] == 'major' and rows['age']['shift'] > 1
+    assert rows['weight']['status'] == 'stable'
+
+
+def test_monitor_merge_matches_single_update():
+    columns = cohort(2)
+    whole = DriftMonitor()
+    whole.update(columns)
+    first, second = DriftMonitor(), DriftMonitor()
+    first.update({name: values[:2000] for name, values in columns.items()})
+    for i in range(2000, 2050):
+        second.observe({name: values[i] for name, values in columns.items()})
+    second.update({name: values[2050:] for name, values in columns.items()})
+    first.merge(second)
+    assert first.rows == whole.rows == 5000
+    for name, stats in whole.features.items():
+        assert first.features[name].counts == stats.counts
+        assert first.features[name].mean == pytest.approx(stats.mean, rel=1e-12)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from sklearn.metrics import confusion_matrix, roc_auc_score, roc_curve
+
+from dysphagia.evaluate import Curve, bootstrap
+
+
+@pytest.fixture(scope='module')
+def scores():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 2000)
+    # 保留两位小数，制造大量同分
+    p = np.round(np.clip(0.3 * y + rng.normal(0.35, 0.2, len(y)), 0, 1), 2)
+    return y, p
+
+
+def test_roc_and_auc_match_sklearn(scores):
+    y, p = scores
+    curve = Curve.from_scores(y, p)
+    assert curve.auc() == pytest.approx(roc_auc_score(y, p), abs=1e-12)
+    fpr, tpr, thresholds = curve.roc()
+    expected_fpr, expected_tpr, expected_thresholds = roc_curve(y, p, drop_intermediate=False)
+    np.testing.assert_allclose(fpr, expected_fpr)
+    np.testing.assert_allclose(tpr, expected_tpr)
+    np.testing.assert_array_equal(thresholds[1:], expected_thresholds[1:])
+
+
+@pytest.mark.parametrize('threshold', [0.0, 0.25, 0.5, 0.5 - 1e-9, 0.73, 1.0])
+def test_confusion_matches_sklearn(scores, threshold):
+    y, p = scores
+    curve = Curve.from_scores(y, p)
+    # 分数正好等于阈值的行判为阴性 (与 Scorer 的 p > threshold 一致)
+    assert curve.confusion(threshold) == confusion_matrix(y, p > threshold, labels=[0, 1]).tolist()
+
+
+@pytest.mark.parametrize('target', [0.5, 0.8, 0.9, 0.95, 1.0])
+def test_threshold_for_sensitivity(scores, target):
+    y, p = scores
+    curve = Curve.from_scores(y, p)
+    threshold = curve.threshold_for_sensitivity(target)
+    (tn, fp), (fn, tp) = curve.confusion(threshold)
+    assert tp / (tp + fn) >= target
+    # 再提高到下一个去重分数时灵敏度就达不到 target (特异度已是最高)
+    higher = curve.thresholds[curve.thresholds > threshold].min(initial=1.0)
+    (_, _), (fn2, tp2) = curve.confusion(higher)
+    assert tp2 / (tp2 + fn2) < target or higher >= p.max()
+
+
+def test_degenerate_labels():
+    curve = Curve.from_scores([1, 1, 1], [0.2, 0.4, 0.9])
+    assert np.isnan(curve.auc())
+    assert curve.confusion(0.3) == [[0, 0], [1, 2]]
+    assert Curve.from_scores([0, 0], [0.1, 0.2]).threshold_for_sensitivity(0.9) is None
+
+
+def test_save_load(scores, tmp_path):
+    curve = Curve.from_scores(*scores)
+    curve.save(tmp_path / "curve.npz")
+    loaded = Curve.load(tmp_path / "curve.npz")
+    assert loaded.auc() == curve.auc()
+    assert loaded.confusion(0.5) == curve.confusion(0.5)
+
+
+def test_bootstrap_interval_contains_estimate(scores):
+    y, p = scores
+    intervals = bootstrap(y, p, 0.5, reps=100, seed=1)
+    low, high = intervals['AUC']
+    assert low < roc_auc_score(y, p) < high
+    assert bootstrap(y, p, 0.5, reps=100, seed=1) == intervals
@@ -0,0 +1,79 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from dysphagia import explain
+from dysphagia.features import FEATURE_DEFAULTS, FEATURES_RF
+from dysphagia.forest import FlatForest
+from dysphagia.scoring import Scorer, feature_matrix
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from explain import brute_force_shap  # noqa: E402  (benchmarks/explain.py)
+
+RF = 'Random Forest'
+LR = 'Logistic Regression'
+
+
+@pytest.fixture(scope='module')
+def scorer(pipelines):
+    return Scorer(pipelines)
+
+
+@pytest.fixture(scope='module')
+def X(patients):
+    X = feature_matrix(patients, RF)[:300]
+    X[::9, 4] = np.nan
+    return X
+
+
+def test_forest_additivity(scorer, X):
+    explainer = scorer.explainer(RF)
+    phi = explainer.explain(X)
+    assert phi.shape == (len(X), len(FEATURES_RF))
+    p = scorer.model(RF).predict_proba(X)[:, 1]
+    np.testing.assert_allclose(explainer.expected_value + phi.sum(axis=1), p, rtol=0, atol=1e-12)
+
+
+def test_table_and_path_agree(scorer, X, monkeypatch):
+    forest = scorer.model(RF)
+    table = explain.ForestExplainer(forest)
+    monkeypatch.setattr(explain, 'MAX_EXPLAIN_DEPTH', forest.max_depth - 1)
+    path = explain.ForestExplainer(forest)
+    assert table._table is not None and path._table is None
+    np.testing.assert_allclose(path.explain(X), table.explain(X), rtol=0, atol=1e-12)
+    assert path.expected_value == pytest.approx(table.expected_value, abs=1e-12)
+
+
+def test_deep_forest_matches_brute_force(X):
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(0)
+    train = np.nan_to_num(X, nan=75.0)
+    y = (train[:, 4] + rng.normal(scale=10, size=len(train)) > 75).astype(int)
+    forest = RandomForestClassifier(n_estimators=3, max_depth=4, random_state=0).fit(train, y)
+    flat = FlatForest.from_model(forest)
+    assert flat.max_depth > explain.MAX_EXPLAIN_DEPTH
+    explainer = explain.ForestExplainer(flat)
+    phi = explainer.explain(train)
+    np.testing.assert_allclose(explainer.expected_value + phi.sum(axis=1), forest.predict_proba(train)[:, 1],
+                               rtol=0, atol=1e-12)
+    expected = np.array([brute_force_shap(forest, x) for x in train[:2].astype(np.float32)])
+    np.testing.assert_allclose(phi[:2], expected, rtol=0, atol=1e-12)
+
+
+def test_linear_additivity(scorer, patients):
+    X = scorer.matrix(patients, LR)
+    explainer = scorer.explainer(LR)
+    phi = explainer.explain(X)
+    logit = scorer.model(LR).decision_function(X)
+    np.testing.assert_allclose(explainer.expected_value + phi.sum(axis=1), logit, rtol=0, atol=1e-9)
+
+
+def test_explain_records(scorer):
+    [result] = scorer.explain_records([FEATURE_DEFAULTS], RF)
+    assert result['space'] == 'probability'
+    assert list(result['contributions']) == FEATURES_RF
+    p = scorer.score_records([FEATURE_DEFAULTS], RF)[0]
+    assert result['base'] + sum(result['contributions'].values()) == pytest.approx(p, abs=1e-12)
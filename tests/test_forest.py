@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from dysphagia.forest import FlatForest
+from dysphagia.scoring import feature_matrix
+
+MODEL = 'Random Forest'
+
+
+@pytest.fixture(scope='module')
+def pipeline(pipelines):
+    return pipelines[MODEL]
+
+
+@pytest.fixture(scope='module')
+def flat(pipeline):
+    return FlatForest.from_model(pipeline)
+
+
+@pytest.fixture(scope='module')
+def X(patients):
+    X = feature_matrix(patients, MODEL)
+    X[::7, 3] = np.nan  # 覆盖 SimpleImputer 的填充路径
+    X[::11, 5] = np.nan
+    return X
+
+
+def test_predict_proba_matches_sklearn(pipeline, flat, X):
+    np.testing.assert_allclose(flat.predict_proba(X), pipeline.predict_proba(X), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(flat.predict(X), pipeline.predict(X))
+
+
+def test_single_row(pipeline, flat, X):
+    np.testing.assert_allclose(flat.predict_proba(X[0]), pipeline.predict_proba(X[:1]), rtol=0, atol=1e-12)
+
+
+def test_leaf_values_match_each_tree(pipeline, flat, X):
+    imputed = pipeline[:-1].transform(X)
+    expected = np.column_stack([tree.predict_proba(imputed)[:, 1] for tree in pipeline[-1].estimators_])
+    np.testing.assert_allclose(flat.leaf_values(X), expected, rtol=0, atol=1e-12)
+    leaves = flat.leaf_index(X)
+    assert leaves.shape == (len(X), flat.n_trees)
+    np.testing.assert_array_equal(flat.value[np.arange(flat.n_trees), leaves], flat.leaf_values(X))
+
+
+def test_interval_brackets_probability(flat, X):
+    p, low, high = flat.predict_proba_interval(X, level=0.8)
+    np.testing.assert_allclose(p, flat.predict_proba(X)[:, 1], rtol=0, atol=1e-15)
+    votes = flat.leaf_values(X)
+    np.testing.assert_allclose(low, np.quantile(votes, 0.1, axis=1))
+    np.testing.assert_allclose(high, np.quantile(votes, 0.9, axis=1))
+    assert (low <= p + 1e-12).all() and (p <= high + 1e-12).all()
+
+
+def test_save_load_round_trip(flat, X, tmp_path):
+    path = tmp_path / "forest.npz"
+    flat.save(path)
+    loaded = FlatForest.load(path)
+    np.testing.assert_array_equal(loaded.predict_proba(X), flat.predict_proba(X))
+    np.testing.assert_array_equal(loaded.left_fraction, flat.left_fraction)
+
+
+def test_root_only_trees():
+    from sklearn.ensemble import RandomForestClassifier
+
+    X = np.zeros((20, 14))
+    y = np.arange(20) % 2
+    forest = RandomForestClassifier(n_estimators=3, random_state=0).fit(X, y)
+    flat = FlatForest.from_model(forest)
+    assert flat.max_depth == 0
+    np.testing.assert_allclose(flat.predict_proba(X), forest.predict_proba(X), rtol=0, atol=1e-12)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from dysphagia.linear import DoubleStandardizationError, FusedLogistic
+from dysphagia.scoring import Scorer, feature_matrix
+
+MODEL = 'Logistic Regression'
+
+
+@pytest.fixture(scope='module')
+def pipeline(pipelines):
+    return pipelines[MODEL]
+
+
+def test_fused_matches_sklearn(pipeline, patients):
+    raw = feature_matrix(patients, MODEL, standardize=False)
+    raw[::5, 2] = np.nan  # 填充值要在原始单位中换算正确
+    standardized = feature_matrix(patients, MODEL)
+    standardized[::5, 2] = np.nan
+    fused = FusedLogistic.from_model(pipeline)
+    np.testing.assert_allclose(fused.predict_proba(raw), pipeline.predict_proba(standardized), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(fused.predict(raw), pipeline.predict(standardized))
+
+
+def test_scorer_compiled_matches_sklearn(pipelines, patients):
+    compiled = Scorer(pipelines)
+    plain = Scorer(pipelines, compile=False)
+    assert isinstance(compiled.model(MODEL), FusedLogistic)
+    np.testing.assert_allclose(compiled.score_columns(patients, MODEL), plain.score_columns(patients, MODEL),
+                               rtol=0, atol=1e-12)
+
+
+def test_double_standardization_is_rejected(scaled_logistic):
+    with pytest.raises(DoubleStandardizationError):
+        FusedLogistic.from_model(scaled_logistic)
+
+
+def test_double_standardization_disables_only_that_model(pipelines, patients, scaled_logistic):
+    scorer = Scorer({MODEL: scaled_logistic, 'Random Forest': pipelines['Random Forest']})
+    assert MODEL in scorer.errors
+    assert not scorer.available(MODEL)
+    with pytest.raises(RuntimeError, match="unavailable"):
+        scorer.score_columns(patients, MODEL)
+    p = scorer.score_columns(patients, 'Random Forest')
+    assert p.shape == (len(patients['age']),)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from dysphagia.features import FEATURES_RF
+from dysphagia.forest import FlatForest
+from dysphagia.lookup import RiskTable, load_tables
+from dysphagia.scoring import Scorer, feature_matrix
+
+RF = 'Random Forest'
+
+
+@pytest.fixture(scope='module')
+def flat(pipelines):
+    return FlatForest.from_model(pipelines[RF])
+
+
+@pytest.fixture(scope='module')
+def exact(flat):
+    return RiskTable.build(flat, model_hash='v1', dtype=np.float64)
+
+
+@pytest.fixture(scope='module')
+def quantized(flat):
+    return RiskTable.build(flat, model_hash='v1')
+
+
+@pytest.fixture(scope='module')
+def X(patients):
+    X = feature_matrix(patients, RF)
+    # 缺失值按 pipeline 的填充值查表 (chewing 的填充值 0.64 在取值范围内)
+    X[::13, FEATURES_RF.index('chewing')] = np.nan
+    return X
+
+
+def out_of_range(X):
+    X = X[:20].copy()
+    X[::2, FEATURES_RF.index('age')] = 130
+    X[1::4, FEATURES_RF.index('weight')] = 10
+    # 填充值越界 (number_of_teeth 的填充值略小于 0) 同样视为表外
+    X[3::4, FEATURES_RF.index('number_of_teeth')] = np.nan
+    return X
+
+
+def test_lookup_matches_model_in_range(flat, exact, quantized, X):
+    assert (exact.cell_index(X) >= 0).all()
+    np.testing.assert_allclose(exact.lookup(X), flat.predict_proba(X)[:, 1], rtol=0, atol=1e-15)
+    # float16 只有量化误差
+    np.testing.assert_allclose(quantized.lookup(X), flat.predict_proba(X)[:, 1], rtol=0, atol=5e-4)
+    report = quantized.validate(flat, n=5000)
+    assert report['max_abs_error'] < 5e-4 and report['cells'] == quantized.n_cells
+
+
+def test_out_of_range_rows(exact, X):
+    outside = out_of_range(X)
+    assert (exact.cell_index(outside) == -1).all()
+    assert np.isnan(exact.lookup(outside)).all()
+
+
+def test_scorer_falls_back_to_live_model(pipelines, flat, quantized, X):
+    scorer = Scorer(pipelines, versions={RF: 'v1'}, tables={RF: quantized})
+    assert RF in scorer.tables
+    # 范围内取查表值 (float16)，范围外退回实时模型
+    mixed = np.vstack([X[:20], out_of_range(X)])
+    p = scorer.predict_proba(RF, mixed)
+    np.testing.assert_array_equal(p[:20], quantized.lookup(X[:20]))
+    np.testing.assert_allclose(p[20:], flat.predict_proba(mixed[20:])[:, 1], rtol=0, atol=1e-15)
+
+    table_only = Scorer({}, tables={RF: quantized})
+    assert table_only.versions[RF] == 'v1'
+    np.testing.assert_array_equal(table_only.predict_proba(RF, X[:20]), p[:20])
+    with pytest.raises(ValueError, match="outside"):
+        table_only.predict_proba(RF, mixed)
+
+
+def test_stale_table_is_not_used(pipelines, quantized):
+    scorer = Scorer(pipelines, versions={RF: 'v2'}, tables={RF: quantized})
+    assert RF not in scorer.tables and scorer.stale_tables == [RF]
+
+
+def test_save_load(exact, X, tmp_path):
+    directory = str(tmp_path / "risk_table")
+    exact.save(directory)
+    tables = load_tables({RF: directory, 'Logistic Regression': str(tmp_path / "missing")})
+    assert list(tables) == [RF]
+    np.testing.assert_array_equal(tables[RF].lookup(X), exact.lookup(X))
+    assert tables[RF].model_hash == 'v1'
@@ -0,0 +1,85 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dysphagia.features import sample_patients
+from dysphagia.neighbors import NeighborIndex, load_index, run
+
+
+@pytest.fixture(scope='module')
+def cohort():
+    columns = sample_patients(3000, seed=2)
+    columns['weight'][::13] = np.nan  # 缺失值按均值处理
+    return columns
+
+
+@pytest.fixture(scope='module')
+def outcome(cohort):
+    return (np.asarray(cohort['age']) > 80).astype(int)
+
+
+@pytest.fixture(scope='module')
+def index(cohort, outcome):
+    # 叶子较小，树更深，剪枝路径都会走到
+    return NeighborIndex.build(cohort, outcome, leaf_size=16)
+
+
+def brute_force(index, columns):
+    Z = index.transform(columns).astype(np.float64)
+    points = np.asarray(index.points, dtype=np.float64)
+    return np.sqrt(((Z[:, None, :] - points[None, :, :]) ** 2).sum(axis=2))
+
+
+@pytest.mark.parametrize('k', [1, 5, 10])
+def test_query_matches_brute_force(index, k):
+    queries = sample_patients(300, seed=3)
+    distances, positions = index.query(queries, k)
+    exact = brute_force(index, queries)
+    # 网格上的患者有大量等距的点，因此比较距离，并检查返回的点确实在这些距离上
+    np.testing.assert_allclose(distances, np.sort(exact, axis=1)[:, :k], rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(np.take_along_axis(exact, positions, axis=1), distances, rtol=1e-5, atol=1e-5)
+    assert (np.diff(distances, axis=1) >= 0).all()
+    assert all(len(set(row)) == k for row in positions.tolist())
+
+
+def test_cohort_members_find_themselves(index, cohort):
+    queries = {col: np.asarray(values)[:50] for col, values in cohort.items()}
+    distances, positions = index.query(queries, 1)
+    np.testing.assert_allclose(distances[:, 0], 0, atol=1e-5)
+
+
+def test_save_load_round_trip(index, outcome, tmp_path):
+    index.save(tmp_path / "neighbors")
+    loaded = NeighborIndex.load(tmp_path / "neighbors")
+    queries = sample_patients(50, seed=4)
+    for a, b in zip(index.query(queries, 5), loaded.query(queries, 5)):
+        np.testing.assert_array_equal(a, b)
+    _, positions = loaded.query(queries, 5)
+    np.testing.assert_array_equal(np.asarray(loaded.outcome)[positions], outcome[np.asarray(loaded.rows)[positions]])
+
+
+def test_k_limited_by_leaf_size(index):
+    with pytest.raises(ValueError):
+        index.query(sample_patients(1), index.max_k + 1)
+
+
+def build_args(tmp_path, frame):
+    path = tmp_path / "cohort.csv"
+    frame.to_csv(path, index=False)
+    return argparse.Namespace(input=str(path), label='dysphagia', leaf_size=16, output=str(tmp_path / "neighbors"))
+
+
+def test_run_builds_index(cohort, outcome, tmp_path):
+    frame = pd.DataFrame(cohort).head(200).assign(dysphagia=outcome[:200])
+    run(build_args(tmp_path, frame))
+    index = load_index(str(tmp_path / "neighbors"))
+    assert len(index) == 200
+    np.testing.assert_array_equal(np.sort(np.asarray(index.outcome)), np.sort(outcome[:200]))
+
+
+def test_run_rejects_empty_input(cohort, tmp_path):
+    header_only = pd.DataFrame(cohort).head(0).assign(dysphagia=[])
+    with pytest.raises(SystemExit, match="no rows"):
+        run(build_args(tmp_path, header_only))
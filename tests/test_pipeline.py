@@ -0,0 +1,64 @@
+import json
+
+import pandas as pd
+import pytest
+
+from dysphagia.pipeline import CheckpointError, run_pipeline
+from dysphagia.scoring import Scorer
+
+CHUNK = 100
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture(scope='module')
+def scorer(pipelines):
+    return Scorer(pipelines)
+
+
+@pytest.fixture
+def source(patients, tmp_path):
+    path = tmp_path / "patients.csv"
+    pd.DataFrame(patients).iloc[:950].to_csv(path, index=False)
+    return str(path)
+
+
+def crash_after(chunks):
+    def progress(rows, seconds):
+        if rows >= chunks * CHUNK:
+            raise Crash
+    return progress
+
+
+def test_resume_after_crash(scorer, source, tmp_path):
+    expected = tmp_path / "expected.csv"
+    run_pipeline(source, str(expected), scorer=scorer, chunksize=CHUNK)
+
+    target, checkpoint = tmp_path / "scored.csv", tmp_path / "scored.ckpt"
+    with pytest.raises(Crash):
+        run_pipeline(source, str(target), scorer=scorer, chunksize=CHUNK, workers=2,
+                     checkpoint=str(checkpoint), progress=crash_after(3))
+    state = json.loads(checkpoint.read_text())
+    assert state['rows'] == 3 * CHUNK
+    assert state['output_bytes'] == target.stat().st_size
+    # 模拟崩溃时写了一半的下一块
+    with open(target, 'a') as f:
+        f.write("0.1,0.2,partial")
+
+    stats = run_pipeline(source, str(target), scorer=scorer, chunksize=CHUNK, workers=2,
+                         checkpoint=str(checkpoint))
+    assert stats['resumed_rows'] == 3 * CHUNK and stats['rows'] == 950
+    assert not checkpoint.exists()
+    assert target.read_bytes() == expected.read_bytes()
+
+
+def test_checkpoint_rejects_different_options(scorer, source, tmp_path):
+    target, checkpoint = tmp_path / "scored.csv", tmp_path / "scored.ckpt"
+    with pytest.raises(Crash):
+        run_pipeline(source, str(target), scorer=scorer, chunksize=CHUNK,
+                     checkpoint=str(checkpoint), progress=crash_after(1))
+    with pytest.raises(CheckpointError):
+        run_pipeline(source, str(target), ['Random Forest'], scorer=scorer, chunksize=CHUNK,
+                     checkpoint=str(checkpoint))
@@ -0,0 +1,97 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from dysphagia import registry
+from dysphagia.cache import PredictionCache
+from dysphagia.features import FEATURE_DEFAULTS
+from dysphagia.models import MODEL_FILES, file_hash
+from dysphagia.scoring import Scorer
+
+RF = 'Random Forest'
+LR = 'Logistic Regression'
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path / "registry")
+
+
+def watcher_for(scorer, root):
+    messages = []
+    return registry.ModelWatcher(scorer, root, log=messages.append), messages
+
+
+def test_publish_activate_and_swap(pipelines, patients, root):
+    scorer = Scorer(pipelines, versions={RF: 'old', LR: 'old'})
+    before = scorer.score_columns(patients, RF)
+    version = registry.publish(MODEL_FILES[RF], RF, root)
+    assert version == file_hash(MODEL_FILES[RF])
+    assert registry.current_version(root, RF) == version
+    assert registry.publish(MODEL_FILES[RF], RF, root) == version  # 重复发布复用已有版本
+    assert registry.list_versions(root, RF) == [version]
+
+    watcher, _ = watcher_for(scorer, root)
+    assert watcher.check() == [RF]
+    assert scorer.versions[RF] == version
+    assert scorer.sources[RF] == os.path.join(registry.model_dir(root, RF), version)
+    assert watcher.status[RF]['canary']['label_agreement'] == 1.0
+    np.testing.assert_allclose(scorer.score_columns(patients, RF), before, rtol=0, atol=1e-12)
+    assert watcher.check() == []  # 版本未变时不重新加载
+
+    with pytest.raises(registry.ArtifactError):
+        registry.activate(root, RF, 'missing')
+
+
+def test_bad_version_is_rejected_once(pipelines, root):
+    scorer = Scorer(pipelines, versions={RF: 'old'})
+    version = registry.publish(MODEL_FILES[RF], RF, root, make_current=False)
+    directory = registry.model_dir(root, RF)
+    shutil.copytree(os.path.join(directory, version), os.path.join(directory, 'bad'))
+    value = np.load(os.path.join(directory, 'bad', 'value.npy'))
+    np.save(os.path.join(directory, 'bad', 'value.npy'), np.full_like(value, np.nan))
+    registry.activate(root, RF, 'bad')
+
+    watcher, messages = watcher_for(scorer, root)
+    assert watcher.check() == []
+    assert watcher._failed[RF] == 'bad'
+    assert watcher.status[RF]['rejected'] == 'bad' and 'not finite' in watcher.status[RF]['error']
+    assert scorer.versions[RF] == 'old'
+    assert watcher.check() == [] and watcher.failures == 1 and len(messages) == 1
+
+    # 回滚到好的版本后照常换入
+    registry.activate(root, RF, version)
+    assert watcher.check() == [RF]
+    assert RF not in watcher._failed
+
+
+def test_failed_model_recovers_after_swap(pipelines, scaled_logistic, root):
+    scorer = Scorer({LR: scaled_logistic, RF: pipelines[RF]})
+    assert LR in scorer.errors
+    with pytest.raises(RuntimeError):
+        scorer.predict_records([FEATURE_DEFAULTS], LR)
+
+    registry.publish(MODEL_FILES[LR], LR, root)
+    watcher, _ = watcher_for(scorer, root)
+    assert watcher.check() == [LR]
+    assert LR not in scorer.errors
+    [result] = scorer.predict_records([FEATURE_DEFAULTS], LR)
+    assert result['probability'] == pytest.approx(Scorer(pipelines).score_records([FEATURE_DEFAULTS], LR)[0],
+                                                  abs=1e-12)
+
+
+def test_cache_keys_follow_version(pipelines, root):
+    scorer = Scorer(pipelines, versions={RF: 'old'})
+    cache = PredictionCache()
+    old_key = scorer.cache_key(FEATURE_DEFAULTS, RF)
+    scorer.score_records([FEATURE_DEFAULTS], RF, cache)
+
+    version = registry.publish(MODEL_FILES[RF], RF, root)
+    watcher, _ = watcher_for(scorer, root)
+    watcher.check()
+    new_key = scorer.cache_key(FEATURE_DEFAULTS, RF)
+    assert old_key[1] == 'old' and new_key[1] == version
+    scorer.score_records([FEATURE_DEFAULTS], RF, cache)
+    assert cache.stats()['hits'] == 0 and len(cache) == 2
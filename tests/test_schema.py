@@ -0,0 +1,89 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dysphagia.features import FEATURE_DEFAULTS
+from dysphagia.schema import (
+    MISSING, NOT_INTEGER, NOT_NUMERIC, OUT_OF_RANGE, SchemaError, validate_columns, validate_record,
+)
+
+MODEL = 'Random Forest'
+
+
+def frame(n=6, **overrides):
+    df = pd.DataFrame({col: [value] * n for col, value in FEATURE_DEFAULTS.items()})
+    for col, values in overrides.items():
+        df[col] = values
+    return df
+
+
+def kinds(result):
+    return {(error['column'], error['error']): error['rows'] for error in result.errors}
+
+
+def test_valid_batch():
+    result = validate_columns(frame(), [MODEL])
+    assert result.ok
+    assert not result.invalid.any()
+    assert 'BMI' not in result.columns  # 由 weight/hight 推导
+    assert all(values.dtype == np.float64 for values in result.columns.values())
+
+
+def test_coerce_sets_invalid_values_to_nan():
+    df = frame(age=[75, 10, 80, 75, 75, 75],
+               number_of_teeth=[20, 20, 20.5, 20, 20, 20],
+               weight=['60', '60', '60', 'heavy', None, '61.5'])
+    result = validate_columns(df, [MODEL])
+    assert kinds(result) == {('age', OUT_OF_RANGE): [1], ('number_of_teeth', NOT_INTEGER): [2],
+                             ('weight', NOT_NUMERIC): [3]}
+    assert result.invalid.tolist() == [False, True, True, True, False, False]
+    assert math.isnan(result.columns['age'][1])
+    assert math.isnan(result.columns['number_of_teeth'][2])
+    # 缺失值不是错误，字符串数字照常转换
+    assert math.isnan(result.columns['weight'][4])
+    assert result.columns['weight'][5] == 61.5
+    assert result.counts() == {'age': 1, 'number_of_teeth': 1, 'weight': 1}
+
+
+def test_raise_mode():
+    with pytest.raises(SchemaError) as info:
+        validate_columns(frame(age=[75, 75, 200, 75, 75, 75]), [MODEL], errors='raise')
+    assert info.value.errors[0]['column'] == 'age' and info.value.errors[0]['error'] == OUT_OF_RANGE
+
+
+def test_aliases_and_missing_columns():
+    df = frame().rename(columns={'hight': 'Height', 'kangningyao': 'anticoagulant', 'number_of_teeth': 'TEETH'})
+    result = validate_columns(df, [MODEL])
+    assert result.ok
+    assert result.renamed == {'Height': 'hight', 'anticoagulant': 'kangningyao', 'TEETH': 'number_of_teeth'}
+    assert {'hight', 'kangningyao', 'number_of_teeth'} <= set(result.columns)
+
+    with pytest.raises(SchemaError) as info:
+        validate_columns(frame().drop(columns=['age']), [MODEL])
+    assert info.value.errors == [{'column': 'age', 'error': MISSING}]
+
+
+def test_validate_record():
+    record = dict(FEATURE_DEFAULTS, height=FEATURE_DEFAULTS['hight'], age='80')
+    del record['hight']
+    clean = validate_record(record, MODEL)
+    assert clean['hight'] == 160.0 and clean['age'] == 80.0
+    assert math.isnan(validate_record(dict(FEATURE_DEFAULTS, CVD=None), MODEL)['CVD'])
+
+    with pytest.raises(SchemaError) as info:
+        validate_record(dict(FEATURE_DEFAULTS, frail=1.5, weight='x'), MODEL)
+    assert {(e['column'], e['error']) for e in info.value.errors} == {('frail', NOT_INTEGER), ('weight', NOT_NUMERIC)}
+
+
+def test_record_and_columns_agree():
+    df = frame(age=[75, 10, 80, 75, 75, 75], frail=[0, 1, 2, 3, 0.5, None])
+    result = validate_columns(df, [MODEL])
+    for i, row in enumerate(df.to_dict('records')):
+        try:
+            validate_record(row, MODEL)
+            valid = True
+        except SchemaError:
+            valid = False
+        assert valid == (not result.invalid[i])
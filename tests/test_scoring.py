@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from dysphagia.features import FEATURE_DEFAULTS, MODEL_FEATURES
+from dysphagia.scoring import Scorer, records_to_columns
+
+RF = 'Random Forest'
+LR = 'Logistic Regression'
+
+
+@pytest.fixture(scope='module')
+def scorer(pipelines):
+    return Scorer(pipelines, thresholds={LR: 0.3})
+
+
+def test_label_follows_threshold(scorer, patients):
+    p = scorer.score_columns(patients, RF)
+    threshold = float(np.median(p))
+    result = scorer.predict_columns(patients, RF, threshold=threshold)
+    np.testing.assert_array_equal(result['probability'], p)
+    np.testing.assert_array_equal(result['label'], (p > threshold).astype(int))
+    assert result['threshold'] == threshold
+    assert 0 < result['label'].sum() < len(p)
+
+    # 配置的阈值是缺省值，调用时给出的阈值优先
+    lr = scorer.predict_columns(patients, LR)
+    assert lr['threshold'] == 0.3
+    np.testing.assert_array_equal(lr['label'], (lr['probability'] > 0.3).astype(int))
+    assert scorer.predict_columns(patients, LR, threshold=0.9)['threshold'] == 0.9
+
+
+def test_records_and_models_agree(scorer, patients):
+    records = [{col: values[i] for col, values in patients.items()} for i in range(50)]
+    columns = records_to_columns(records)
+    both = scorer.predict_models(columns, [RF, LR], thresholds={RF: 0.2})
+    for name, threshold in ((RF, 0.2), (LR, 0.3)):
+        single = scorer.predict_records(records, name, threshold)
+        assert [r['label'] for r in single] == both[name]['label'].tolist()
+        np.testing.assert_allclose([r['probability'] for r in single], both[name]['probability'], rtol=0, atol=1e-15)
+        assert all(r['threshold'] == threshold for r in single)
+
+
+def test_interval_brackets_probability(scorer, patients):
+    result = scorer.predict_columns(patients, RF, interval=0.9)
+    assert (result['ci_low'] <= result['probability']).all()
+    assert (result['probability'] <= result['ci_high']).all()
+    assert (result['ci_low'] < result['ci_high']).any()
+    np.testing.assert_allclose(result['probability'], scorer.score_columns(patients, RF), rtol=0, atol=1e-15)
+
+    [record] = scorer.predict_records([FEATURE_DEFAULTS], RF, interval=0.9)
+    low, high = record['ci']
+    assert low <= record['probability'] <= high
+    # 逻辑回归没有投票区间
+    assert 'ci_low' not in scorer.predict_columns(patients, LR, interval=0.9)
+    assert scorer.predict_records([FEATURE_DEFAULTS], LR, interval=0.9)[0]['ci'] is None
+
+
+def test_interval_respects_disabled_model(pipelines, patients):
+    scorer = Scorer(pipelines)
+    scorer.errors[RF] = "broken"
+    with pytest.raises(RuntimeError, match="unavailable"):
+        scorer.predict_columns(patients, RF, interval=0.9)
+
+
+def test_missing_columns(scorer):
+    record = {col: FEATURE_DEFAULTS[col] for col in MODEL_FEATURES[LR] if col not in ('age', 'BMI')}
+    with pytest.raises(ValueError, match="age"):
+        scorer.predict_records([record], LR)
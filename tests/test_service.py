@@ -0,0 +1,173 @@
+import asyncio
+import json
+
+import pytest
+
+from dysphagia.cache import PredictionCache
+from dysphagia.features import FEATURE_DEFAULTS
+from dysphagia.scoring import Scorer
+from dysphagia.service import MAX_BODY_BYTES, InferenceService, MicroBatcher, ServiceMetrics
+
+RF = 'Random Forest'
+LR = 'Logistic Regression'
+
+
+@pytest.fixture(scope='module')
+def scorer(pipelines):
+    return Scorer(pipelines)
+
+
+async def send(port, raw):
+    """发送原始请求字节，读回 [(状态码, 响应头, JSON)]，直到服务端关闭连接"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(raw)
+    await writer.drain()
+    responses = []
+    while True:
+        status_line = await reader.readline()
+        if not status_line:
+            break
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            key, _, value = line.decode().partition(':')
+            headers[key.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers['content-length']))
+        responses.append((int(status_line.split()[1]), headers, json.loads(body)))
+        if headers['connection'] == 'close':
+            break
+    writer.close()
+    return responses
+
+
+def post(path, payload, close=True):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    return (f"POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n").encode() + body
+
+
+async def call(port, path, payload):
+    [response] = await send(port, post(path, payload))
+    return response[0], response[2]
+
+
+def run_service(service, scenario):
+    """在事件循环中启动服务 (端口由系统分配)，运行 scenario(port) 后停止"""
+    async def main():
+        ready = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(service.serve('127.0.0.1', 0, ready=ready.set_result))
+        server = await ready
+        try:
+            return await scenario(server.sockets[0].getsockname()[1])
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    return asyncio.run(main())
+
+
+def test_concurrent_predicts_are_coalesced(scorer):
+    service = InferenceService(scorer, max_wait_ms=500)
+    batcher = service.batchers[RF]
+    sizes = []
+    score = batcher._score
+    batcher._score = lambda records: sizes.append(len(records)) or score(records)
+    patients = [dict(FEATURE_DEFAULTS, age=60 + i) for i in range(16)]
+
+    async def scenario(port):
+        return await asyncio.gather(*[call(port, '/predict', {'model': RF, 'features': p, 'threshold': 0.3})
+                                      for p in patients])
+
+    responses = run_service(service, scenario)
+    assert sizes == [16]
+    expected = scorer.predict_records(patients, RF, threshold=0.3)
+    for (status, result), record in zip(responses, expected):
+        assert status == 200
+        assert result['probability'] == pytest.approx(record['probability'], abs=1e-12)
+        assert result['label'] == record['label'] and result['threshold'] == 0.3
+
+
+def test_predict_batch(scorer):
+    service = InferenceService(scorer, cache=PredictionCache())
+    patients = [dict(FEATURE_DEFAULTS, weight=50 + i) for i in range(5)]
+
+    async def scenario(port):
+        return [await call(port, '/predict/batch', {'model': model, 'patients': patients, 'interval': 0.8})
+                for model in (RF, LR)]
+
+    (rf_status, rf), (lr_status, lr) = run_service(service, scenario)
+    assert rf_status == lr_status == 200
+    for result, model in ((rf, RF), (lr, LR)):
+        expected = scorer.predict_records(patients, model, interval=0.8)
+        assert result['probabilities'] == pytest.approx([r['probability'] for r in expected], abs=1e-12)
+        assert result['labels'] == [r['label'] for r in expected]
+    assert all(low <= p <= high for p, (low, high) in zip(rf['probabilities'], rf['cis']))
+    assert lr['cis'] == [None] * 5  # 逻辑回归没有投票区间
+
+
+def test_bad_requests_get_4xx(scorer):
+    service = InferenceService(scorer)
+    bad_age = dict(FEATURE_DEFAULTS, age=500)
+
+    async def scenario(port):
+        return {
+            'json': await send(port, post('/predict', b'{"model": ')),
+            'array': await send(port, post('/predict', [1, 2])),
+            'features': await send(port, post('/predict', {'features': 'x'})),
+            'model': await send(port, post('/predict', {'model': 'SVM', 'features': FEATURE_DEFAULTS})),
+            'schema': await send(port, post('/predict/batch', {'patients': [FEATURE_DEFAULTS, bad_age]})),
+            'threshold': await send(port, post('/predict', {'features': FEATURE_DEFAULTS, 'threshold': 2})),
+            'length': await send(port, b"POST /predict HTTP/1.1\r\nContent-Length: abc\r\n\r\n"),
+            'too_large': await send(port, f"POST /predict HTTP/1.1\r\nContent-Length: {MAX_BODY_BYTES + 1}"
+                                          f"\r\n\r\n".encode()),
+            'request_line': await send(port, b"GARBAGE\r\n\r\n"),
+            'header': await send(port, b"GET /health HTTP/1.1\r\nX-Long: " + b"a" * 100_000 + b"\r\n\r\n"),
+            'path': await send(port, b"GET /nope HTTP/1.1\r\nConnection: close\r\n\r\n"),
+            'method': await send(port, b"GET /predict HTTP/1.1\r\nConnection: close\r\n\r\n"),
+        }
+
+    results = run_service(service, scenario)
+    statuses = {name: [status for status, _, _ in responses] for name, responses in results.items()}
+    assert statuses == {'json': [400], 'array': [400], 'features': [400], 'model': [400], 'schema': [400],
+                        'threshold': [400], 'length': [400], 'too_large': [413], 'request_line': [400],
+                        'header': [431], 'path': [404], 'method': [405]}
+    [(_, _, schema)] = results['schema']
+    assert schema['errors'][0]['column'] == 'age' and schema['errors'][0]['rows'] == [1]
+
+
+def test_keep_alive(scorer):
+    service = InferenceService(scorer)
+
+    async def scenario(port):
+        request = post('/predict', {'features': FEATURE_DEFAULTS}, close=False)
+        return await send(port, request + request + b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+
+    responses = run_service(service, scenario)
+    assert [status for status, _, _ in responses] == [200, 200, 200]
+    assert responses[0][2] == responses[1][2]
+    assert service.metrics.requests == 2
+
+
+class PoisonScorer:
+    """整批中含 age < 0 的行时整批失败，单独评分时只有该行失败"""
+
+    def score_columns(self, columns, model_name):
+        if min(columns['age']) < 0:
+            raise ValueError("negative age")
+        return [age / 100 for age in columns['age']]
+
+
+def test_batch_failure_retries_each_row():
+    async def main():
+        batcher = MicroBatcher(PoisonScorer(), RF, ServiceMetrics(), max_wait=0.2)
+        batcher.start()
+        try:
+            return await asyncio.gather(*[batcher.submit({'age': age}) for age in (70, -1, 80)],
+                                        return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    good, bad, other = asyncio.run(main())
+    assert good == 0.7 and other == 0.8
+    assert isinstance(bad, ValueError)